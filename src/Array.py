@@ -0,0 +1,94 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+from HDD import HDD
+from Schedule import makeScheduler
+
+# The disks of the box.  Every disk is an HDD with its own scheduler and
+# cache; the requesters hand their requests to the array, which routes them
+# to the disks' schedulers:
+#   "stripe" (RAID 0) the array's addresses are cut into stripeSize kB
+#            chunks, chunk c being chunk c // numDisks of disk
+#            c % numDisks; a request goes to every disk its chunks are on,
+#            as one part at the disk's address of its first chunk there
+#            (its later chunks on the disk follow it), and completes once
+#            every disk has done its part
+#   "mirror" (RAID 1) a write goes to every disk and completes once all have
+#            written it, a read goes to the disk with the fewest requests
+#            queued
+# With one disk, requests go to it unchanged.
+class DiskArray():
+    def __init__(self, params):
+        if params.raidMode not in ("stripe", "mirror"):
+            raise ValueError("Unknown RAID mode: %s"%params.raidMode)
+        if params.numDisks < 1:
+            raise ValueError("The array needs at least one disk")
+        self.mode = params.raidMode
+        self.stripeSize = params.stripeSize
+        # kBs the requesters can address
+        self.capacity = params.geometry.capacity
+        if self.mode == "stripe":
+            self.capacity = params.geometry.capacity//self.stripeSize*self.stripeSize*params.numDisks
+        self.hdds = []
+        for i in range(params.numDisks):
+            if params.numDisks == 1:
+                self.hdds.append(HDD("HDD", params, makeScheduler(params)))
+            else:
+                name = "HDD #%i"%i
+                self.hdds.append(HDD(name, params, makeScheduler(params, "Scheduler of %s"%name)))
+
+    # Called by IO request creators
+    def add(self, IOReq):
+        if len(self.hdds) == 1:
+            self.hdds[0].cache.sched.add(IOReq)
+        elif self.mode == "stripe":
+            self.stripe(IOReq)
+        elif IOReq.write:
+            parts = [IOReq.split(IOReq.size, IOReq.diskAddress) for hdd in self.hdds]
+            for hdd, part in zip(self.hdds, parts):
+                hdd.cache.sched.add(part)
+        else:
+            min(self.hdds, key=self.load).cache.sched.add(IOReq)
+
+    # Returns the disk and the address on it of the array's address
+    def locate(self, address):
+        chunk, within = divmod(address, self.stripeSize)
+        return chunk % len(self.hdds), (chunk//len(self.hdds))*self.stripeSize + within
+
+    def stripe(self, IOReq):
+        if not IOReq.size:
+            i, address = self.locate(IOReq.diskAddress)
+            self.hdds[i].cache.sched.add(IOReq.split(0, address))
+            return
+        sizes = [0]*len(self.hdds)
+        addresses = [None]*len(self.hdds)
+        offset = 0
+        while offset < IOReq.size:
+            i, address = self.locate(IOReq.diskAddress + offset)
+            size = min(self.stripeSize - address % self.stripeSize, IOReq.size - offset)
+            if addresses[i] is None:
+                addresses[i] = address
+            sizes[i] += size
+            offset += size
+
+        # Every part is made before any is queued, so the request can not
+        # complete before all of its parts exist
+        parts = [(hdd, IOReq.split(size, address))
+                 for hdd, size, address in zip(self.hdds, sizes, addresses) if size]
+        for hdd, part in parts:
+            hdd.cache.sched.add(part)
+
+    # Returns the number of requests waiting for hdd
+    def load(self, hdd):
+        return len(hdd.cache.sched) + len(hdd.cache.openReqs)
+
+    def schedulers(self):
+        return [hdd.cache.sched for hdd in self.hdds]
@@ -0,0 +1,139 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import json
+import os
+import sys
+from argparse import ArgumentParser
+
+# Runs the simulation without the GUI, e.g. from the directory of this file:
+#   python -m Batch config.json -s numTuners=12 -s schedType=clook -f csv
+# The config file (JSON, or YAML with PyYAML) holds Parameters overrides,
+# {"maxSimTime": 100000, "seed": 1, ...}, and -s overrides are applied on top
+# of it.  With --runs, every line of a JSON lines file is one more set of
+# overrides run in the same process, so the cost of starting the
+# interpreter is paid once for all of them.  One summary is written per run.
+#
+# The simulation modules (SimPy or the built-in kernel, NumPy) are only
+# imported once the arguments have been read, so a bad command line fails
+# fast, and PyQt is never imported.
+
+# Reads a JSON or YAML file of Parameters overrides
+def loadConfig(path):
+    with open(path) as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Reading %s needs PyYAML"%path)
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError("%s is not a mapping of parameter names to values"%path)
+    return config
+
+# Turns NAME=VALUE into (NAME, value), the value read as JSON when it can be
+# so numTuners=12 is a number and schedType=clook a string
+def parseOverride(text):
+    name, sep, val = text.partition("=")
+    if not sep or not name:
+        raise ValueError("Overrides are NAME=VALUE, not %s"%text)
+    try:
+        return name, json.loads(val)
+    except ValueError:
+        return name, val
+
+# Flattens a summary into {"buffers.Tuner 1.mean": value, ...} for CSV
+def flatten(summary, prefix=""):
+    row = {}
+    if isinstance(summary, dict):
+        items = summary.items()
+    elif isinstance(summary, list):
+        items = enumerate(summary)
+    else:
+        return {prefix: summary}
+    for key, val in items:
+        row.update(flatten(val, "%s%s%s"%(prefix, "." if prefix else "", key)))
+    return row
+
+def writeCSV(out, summaries):
+    import csv
+    rows = [flatten(summary) for summary in summaries]
+    columns = sorted(set(column for row in rows for column in row))
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(["" if row.get(column) is None else row[column] for column in columns])
+
+def main(argv=None):
+    parser = ArgumentParser(prog="python -m Batch", description="Run the set-top box simulator without the GUI")
+    parser.add_argument("config", nargs="?", default=None,
+                        help="JSON or YAML file of Parameters overrides")
+    parser.add_argument("-s", "--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override one parameter, after the config file")
+    parser.add_argument("--runs", default=None,
+                        help="JSON lines file, one set of overrides per run")
+    parser.add_argument("-f", "--format", choices=("json", "csv"), default="json",
+                        help="json: one summary per line (default), csv: one row per run")
+    parser.add_argument("-o", "--output", default=None,
+                        help="file to write the summaries to (default: stdout)")
+    parser.add_argument("--profile", default=None, metavar="FILE",
+                        help="time every simulated component, write collapsed stacks to FILE (see Profile.py)")
+    args = parser.parse_args(argv)
+
+    try:
+        base = loadConfig(args.config) if args.config is not None else {}
+        base.update(parseOverride(text) for text in args.set)
+        runs = [{}]
+        if args.runs is not None:
+            with open(args.runs) as f:
+                runs = [json.loads(line) for line in f if line.strip()]
+    except (IOError, ValueError) as e:
+        parser.error(str(e))
+
+    # Engine reads SIM_PROFILE when it is first imported, by Simulation
+    if args.profile is not None:
+        os.environ["SIM_PROFILE"] = args.profile
+
+    # Every run's parameters are checked before any of them is started
+    from Simulation import Sim
+    sims = []
+    for overrides in runs:
+        sim = Sim()
+        try:
+            sim.params.update(base)
+            sim.params.update(overrides)
+        except ValueError as e:
+            parser.error(str(e))
+        sims.append(sim)
+    out = sys.stdout if args.output is None else open(args.output, "w")
+
+    # Keeps the simulation's chatter off of the summaries
+    sys.stdout = open(os.devnull, "w")
+    summaries = []
+    try:
+        for sim in sims:
+            summary = sim.run()
+            if args.format == "json":
+                out.write(json.dumps(summary, sort_keys=True) + "\n")
+                out.flush()
+            else:
+                summaries.append(summary)
+        if args.format == "csv":
+            writeCSV(out, summaries)
+    finally:
+        sys.stdout = sys.__stdout__
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import json
+import os
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser, SUPPRESS
+
+# Benchmark suite of the simulator.  Every scenario is run in its own
+# process, so its peak memory is its own, on the kernel in SIM_KERNEL:
+#   python Bench.py -o results.json
+#   python Bench.py --baseline results.json
+# reports, for each scenario, the kernel events processed (the process
+# resumptions, counted the same way on both kernels), wall ms per simulated
+# second and peak RSS, then the microbenchmarks of the hot functions in us
+# per call.  With --baseline, every figure is compared with the saved
+# results and the ones more than --threshold worse are flagged; the exit
+# status is 1 if any are.
+# Any change in a scenario's events means the simulation itself changed, and
+# is noted even when it is not flagged.
+
+# Scenario name: Parameters overrides, all seeded
+scenarios = [
+    ("default", {}),
+    # The sort scheduler waits for 5 queued requests, more than 1 tuner and 2
+    # outputs ever have outstanding, so it would never reach the disk
+    ("tuners1", {"numTuners":1, "schedType":"clook"}),
+    ("tuners10", {"numTuners":10}),
+    ("tuners32", {"numTuners":32}),
+    ("tuners64", {"numTuners":64}),
+    ("sort", {"schedType":"sort", "numTuners":12}),
+    ("deadline", {"schedType":"deadline", "numTuners":12}),
+    ("atr", {"baseChanceATR":20}),
+]
+
+# Returns the peak resident memory of this process in kBs
+def peakRSS():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss //= 1024
+    return rss
+
+# Runs one scenario and returns its figures
+def runScenario(overrides, maxSimTime, seed):
+    from Simulation import Sim
+    import Engine
+    sim = Sim()
+    sim.params.update(overrides)
+    sim.params.seed = seed
+    sim.params.maxSimTime = maxSimTime
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        start = time.time()
+        sim.run()
+        wallTime = time.time() - start
+    finally:
+        sys.stdout = stdout
+    events = Engine.events()
+    return {"kernel":Engine.kernelName, "events":events, "wallTime":wallTime,
+            "wallMsPerSimSecond":1000*wallTime/(maxSimTime/1000.0),
+            "peakRSSkB":peakRSS()}
+
+# Returns the best us per call of fn() over repeat runs of calls calls
+def timeCalls(fn, calls, repeat=5):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        for j in range(calls):
+            fn()
+        perCall = 1e6*(time.time() - start)/calls
+        if best is None or perCall < best:
+            best = perCall
+    return best
+
+def benchScheduler(sched, reqs):
+    def schedule():
+        sched.newReqsQ = list(reqs)
+        sched.sortedReqsQ = []
+        sched.schedule()
+    return schedule
+
+def benchDisk(disk, reqs):
+    it = [iter(reqs)]
+    def processReq():
+        try:
+            disk.processReq(next(it[0]))
+        except StopIteration:
+            it[0] = iter(reqs)
+    return processReq
+
+# Returns the us each packet of a tuner takes.  The tuner runs on its own,
+# its requests are never served and its buffer never fills.
+def benchStream(simTime):
+    from Simulation import Sim
+    from Engine import initialize, simulate
+    sim = Sim()
+    sim.params.update({"numTuners":1, "numOutputs":0, "iBSize":1e12, "seed":1, "monitorType":"stats"})
+    initialize()
+    sim.prepare()
+    initialize()
+    stream = sim.streams[0]
+    sim.startStream(stream)
+    start = time.time()
+    simulate(until=simTime)
+    packets = len(stream.requester.buffer.bufferMon) - 1
+    return 1e6*(time.time() - start)/packets
+
+# Runs every microbenchmark and returns {name: us per call}
+def runMicro():
+    import random
+    from Engine import initialize
+    from Schedule import Scheduler, DLScheduler
+    from Simulation import Parameters
+    from HDD import DiskGeometry, Disk
+    from SchedBench import makeRequests
+    initialize()
+    reqs = makeRequests(100)
+    params = Parameters()
+    disk = Disk("Bench", DiskGeometry.load(params))
+    rand = random.Random(1)
+    for req in reqs:
+        req.diskAddress = rand.randint(0, params.hddCapacity - req.size)
+    return {"Scheduler.schedule (100 queued)":timeCalls(benchScheduler(Scheduler(), reqs), 10000),
+            "DLScheduler.schedule (100 queued)":timeCalls(benchScheduler(DLScheduler(), reqs), 10000),
+            "Disk.processReq":timeCalls(benchDisk(disk, reqs), 100000),
+            "stream packet loop":benchStream(1000000)}
+
+# Runs this file as a child on one scenario (or "micro") and returns what
+# it printed last
+def runChild(name, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", name,
+           "-t", str(args.maxSimTime), "-s", str(args.seed)]
+    best = None
+    for i in range(args.repeat if name != "micro" else 1):
+        out = subprocess.check_output(cmd, env=dict(os.environ, SIM_COUNT_EVENTS="1"))
+        result = json.loads(out.decode("utf-8").strip().splitlines()[-1])
+        if best is None or result.get("wallTime") < best.get("wallTime"):
+            best = result
+    return best
+
+# Returns "" or why new is worse than old by more than threshold
+def flag(new, old, threshold, what):
+    if old and new > old*(1 + threshold):
+        return "%s +%.0f%%"%(what, 100*(new/float(old) - 1))
+    return ""
+
+def main(argv=None):
+    parser = ArgumentParser(description="Benchmark suite of the set-top box simulator")
+    parser.add_argument("-t", "--maxSimTime", type=float, default=100000,
+                        help="simulated ms of every scenario (default: 100000)")
+    parser.add_argument("-s", "--seed", type=int, default=1)
+    parser.add_argument("-n", "--repeat", type=int, default=3,
+                        help="runs of each scenario, the fastest is kept")
+    parser.add_argument("-k", "--scenarios", nargs="+", default=None,
+                        help="scenarios to run (default: all)")
+    parser.add_argument("-o", "--output", default=None, help="file to save the results to as JSON")
+    parser.add_argument("--baseline", default=None, help="saved results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="part a figure may worsen by before it is flagged (default: 0.2)")
+    parser.add_argument("--child", default=None, help=SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child is not None:
+        if args.child == "micro":
+            result = runMicro()
+        else:
+            result = runScenario(dict(scenarios)[args.child], args.maxSimTime, args.seed)
+        sys.stdout.write("\n" + json.dumps(result) + "\n")
+        return
+
+    names = args.scenarios or [name for name, overrides in scenarios]
+    for name in names:
+        if name not in dict(scenarios):
+            parser.error("Unknown scenario: %s"%name)
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {"kernel":None, "maxSimTime":args.maxSimTime,
+               "seed":args.seed, "python":sys.version.split()[0], "scenarios":{}}
+    out = sys.stdout
+    flags = []
+    out.write("%-10s %10s %16s %10s  %s\n"%("scenario", "events", "wall ms/sim s", "RSS MB", "vs baseline"))
+    for name in names:
+        result = runChild(name, args)
+        results["scenarios"][name] = result
+        results["kernel"] = result.pop("kernel")
+        notes = []
+        old = baseline and baseline["scenarios"].get(name)
+        if old:
+            notes.append(flag(result["wallMsPerSimSecond"], old["wallMsPerSimSecond"], args.threshold, "time"))
+            notes.append(flag(result["peakRSSkB"], old["peakRSSkB"], args.threshold, "memory"))
+            if result["events"] is not None and old["events"] is not None:
+                notes.append(flag(result["events"], old["events"], args.threshold, "events"))
+            flags.extend("%s %s"%(name, note) for note in notes if note)
+            if result["events"] is not None and old["events"] is not None and result["events"] != old["events"]:
+                notes.append("events %i -> %i"%(old["events"], result["events"]))
+        out.write("%-10s %10s %16.1f %10.1f  %s\n"%(name, result["events"] if result["events"] is not None else "-",
+                  result["wallMsPerSimSecond"], result["peakRSSkB"]/1024.0, " ".join(note for note in notes if note)))
+
+    results["micro"] = runChild("micro", args)
+    out.write("\n%-36s %12s  %s\n"%("microbenchmark", "us/call", "vs baseline"))
+    for name in sorted(results["micro"]):
+        usPerCall = results["micro"][name]
+        note = ""
+        if baseline and name in baseline.get("micro", {}):
+            note = flag(usPerCall, baseline["micro"][name], args.threshold, "time")
+            if note:
+                flags.append("%s %s"%(name, note))
+        out.write("%-36s %12.2f  %s\n"%(name, usPerCall, note))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if baseline is not None:
+        if baseline.get("kernel") != results["kernel"] or baseline.get("maxSimTime") != results["maxSimTime"]:
+            out.write("\nWARNING: the baseline was run on another kernel or maxSimTime\n")
+        out.write("\n%i regressions over %.0f%%\n"%(len(flags), 100*args.threshold))
+        for note in flags:
+            out.write("  %s\n"%note)
+        if flags:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
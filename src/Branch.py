@@ -0,0 +1,175 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import json
+import os
+import sys
+import time
+import traceback
+from argparse import ArgumentParser
+from multiprocessing import cpu_count
+from Engine import *
+from Simulation import Sim
+
+# What-if runs from a warmed up state.  One simulation is run up to the
+# warm-up time, then it is forked once for every variant: each child process
+# starts from a copy-on-write copy of the whole simulation (buffers,
+# scheduler and cache queues, disk head, ATR chance, random number streams
+# and the processes themselves), changes it with Sim.applyVariant and runs
+# on to maxSimTime.  A branch only reports what happened after the warm-up.
+#
+# Needs os.fork (Linux, OS X).  A branch file is JSON of the form:
+#   {"base": {"maxSimTime": 500000, "seed": 1},
+#    "warmUp": 100000,
+#    "variants": [{}, {"baseChanceATR": 5}, {"numTuners": 11}, {"schedType": "edf"}],
+#    "seeds": [1, 2, 3]}
+# "base" configures the warm-up run.  Every variant is branched once for
+# each of "seeds", when given, with its random number streams reseeded.
+
+# Forks the branches at the warm-up time.  In the parent it waits for every
+# branch and then stops the simulation; in a child it records which branch
+# the child is and returns, so the simulation carries on from there.
+class Brancher(Process):
+    def __init__(self, sim, variants, processes):
+        Process.__init__(self, name="Brancher")
+        self.simData = sim
+        self.variants = variants
+        self.processes = processes
+        self.results = []
+
+        # (index, overrides, pipe to write the result to) in a branch
+        self.branch = None
+
+    def forkBranches(self):
+        running = []
+        for index, overrides in enumerate(self.variants):
+            if len(running) >= self.processes:
+                self.collect(running.pop(0))
+            rfd, wfd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(rfd)
+                for other in running:
+                    os.close(other[1])
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(devnull, 1)
+                self.branch = (index, overrides, wfd, time.time())
+                self.simData.applyVariant(overrides)
+                self.simData.resetStats()
+                return
+            os.close(wfd)
+            running.append((pid, rfd))
+        while running:
+            self.collect(running.pop(0))
+        stopSimulation()
+        yield passivate, self
+
+    def collect(self, child):
+        pid, rfd = child
+        with os.fdopen(rfd) as f:
+            data = f.read()
+        os.waitpid(pid, 0)
+        if not data:
+            raise RuntimeError("Branch process %i died without a result"%pid)
+        self.results.append(json.loads(data))
+
+    # Called in a branch once the simulation is over
+    def report(self, result):
+        index, overrides, wfd, start = self.branch
+        result["index"] = index
+        result["overrides"] = overrides
+        result["wallTime"] = time.time() - start
+        data = json.dumps(result).encode("utf-8")
+        while data:
+            data = data[os.write(wfd, data):]
+        os.close(wfd)
+
+# Runs params up to warmUp ms, then every variant from there to maxSimTime
+# in up to processes branches at a time.  Returns the branches' summaries
+# in variant order.
+def runBranches(params, warmUp, variants, processes=None):
+    if params.traceFile is not None or params.monitorType == "mapped" or params.liveFile is not None:
+        raise ValueError("Branches can not share a trace file, mapped monitor files or a live view")
+    if warmUp >= params.maxSimTime:
+        raise ValueError("The warm-up must end before maxSimTime")
+    if processes is None:
+        processes = cpu_count()
+
+    sim = Sim(params)
+    sim.prepare()
+    initialize()
+    sim.activate()
+    brancher = Brancher(sim, variants, processes)
+    activate(brancher, brancher.forkBranches(), at=warmUp, prior=True)
+    try:
+        sim.simulate()
+        if brancher.branch is not None:
+            result = sim.summary()
+            result["warmUp"] = warmUp
+            brancher.report(result)
+    except:
+        if brancher.branch is None:
+            raise
+        brancher.report({"error":traceback.format_exc()})
+    finally:
+        if brancher.branch is not None:
+            os._exit(0)
+
+    for result in brancher.results:
+        if "error" in result:
+            raise RuntimeError("Branch %i failed:\n%s"%(result["index"], result["error"]))
+    return sorted(brancher.results, key=lambda result: result["index"])
+
+# Reads a branch definition file, returns its base Parameters overrides,
+# warm-up time and list of variants
+def loadBranches(path):
+    with open(path) as f:
+        spec = json.load(f)
+    variants = spec.get("variants", [{}])
+    if "seeds" in spec:
+        seeded = []
+        for variant in variants:
+            for seed in spec["seeds"]:
+                overrides = dict(variant)
+                overrides["seed"] = seed
+                seeded.append(overrides)
+        variants = seeded
+    return spec.get("base", {}), spec["warmUp"], variants
+
+def main(argv=None):
+    parser = ArgumentParser(description="Branch what-if runs of the set-top box simulator from one warm-up")
+    parser.add_argument("branchFile", help="JSON branch definition")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of branches run at once (default: all cores)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="file to write one JSON result per line to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    base, warmUp, variants = loadBranches(args.branchFile)
+    sim = Sim()
+    sim.params.update(base)
+    out = sys.stdout if args.output is None else open(args.output, "w")
+
+    # Keeps the simulation's chatter off of the results
+    sys.stdout = open(os.devnull, "w")
+    start = time.time()
+    try:
+        results = runBranches(sim.params, warmUp, variants, args.jobs)
+        for result in results:
+            out.write(json.dumps(result, sort_keys=True) + "\n")
+        sys.stderr.write("%i branches done, %.1fs elapsed\n"%(len(results), time.time() - start))
+    finally:
+        sys.stdout = sys.__stdout__
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -9,33 +9,158 @@ __email__ = "ptyler@calpoly.edu"
 __status__ = "Developement"
 
 # Imports------------------
-from SimPy.Simulation import *
-from random import randint, expovariate
+from Engine import *
+from itertools import count
+from operator import attrgetter
+from RNG import RandomStream
+from Monitors import ListMonitor, StatsMonitor, Histogram
+import Trace
+
+# Levels within fluidSlack kBs of a threshhold count as having reached it,
+# so rounding in a fluid stream's wake up time can not make it miss one.
+fluidSlack = 1e-6
 
 # This module acts as a data container for the simulation.  Data is either
-# streamed into or out of the buffer via packets of random sizes.
+# streamed into or out of the buffer via packets of random sizes, or, when a
+# fluid stream is attached, flows in or out continuously at a fixed rate.
+# The buffer's level is recorded by a monitor of type monitorType (see
+# Monitors.py), its put and get queues only by running statistics.
 class Buffer(Level):
-    def __init__(self, bName, capacity, initAmount):
-        Level.__init__(self, name=bName, monitored=True, monitorType=Monitor, initialBuffered=initAmount)
+    def __init__(self, bName, capacity, initAmount, monitorType=ListMonitor):
+        # Rate, in kB per ms, data flows into (positive) or out of (negative)
+        # the buffer, the time the flow was last folded into nrBuffered and
+        # the fluid stream process driving it.
+        self.rate = 0.0
+        self.rateSince = 0.0
+        self.flowProc = None
+
+        Level.__init__(self, name=bName, monitored=True, monitorType=StatsMonitor, initialBuffered=initAmount)
+        self.bufferMon = monitorType(name="Buffer Monitor %s"%bName, ylab="nr in buffer", tlab="time", sim=self.sim)
+        self.bufferMon.observe(y=self.amount, t=now())
         self.capacity = capacity
 
+        # (level, rising, process) of the processes waiting for the buffer's
+        # level to cross a threshold
+        self.watchers = []
+
+    # Includes the data that has flowed since the last settle()
+    def getamount(self):
+        if self.rate:
+            return min(self.capacity, max(0, self.nrBuffered + self.rate*(now() - self.rateSince)))
+        return self.nrBuffered
+    amount = property(getamount)
+
     # Named subtraction for more readable code
     def freeSpace(self):
         return self.capacity - self.amount
 
+    # Folds the fluid flow into nrBuffered.  The flow is linear between two
+    # settles, so the new level is observed half way through the interval,
+    # which keeps the monitor's (step-wise) time average exact.
+    def settle(self):
+        if self.rate:
+            t = now()
+            if t > self.rateSince:
+                self.nrBuffered = self.amount
+                self.bufferMon.observe(y=self.nrBuffered, t=(self.rateSince + t)/2.0)
+                self.rateSince = t
+
+    # Returns the ms until the fluid flow fills or empties the buffer or
+    # reaches a watcher's level, None if it never will.
+    def timeToNextEvent(self):
+        amount = self.amount
+        if self.rate > 0 and amount < self.capacity - fluidSlack:
+            target = self.capacity
+            for level, rising, proc in self.watchers:
+                if rising and amount < level < target:
+                    target = level
+            return (target - amount)/self.rate
+        if self.rate < 0 and amount > fluidSlack:
+            target = 0
+            for level, rising, proc in self.watchers:
+                if not rising and target < level <= amount:
+                    target = level
+            return (amount - target)/-self.rate
+        return None
+
+    # Makes the fluid stream re-plan its next wake up after the level or the
+    # watchers changed.
+    def wakeFlow(self, cause):
+        if cause is self.flowProc:
+            return
+        if self.flowProc.active():
+            cause.interrupt(self.flowProc)
+        else:
+            reactivate(self.flowProc)
+
+    # Interrupts proc, which should be holding, once the buffer's level has
+    # risen to at least level (rising) or fallen below it (not rising).
+    def watch(self, level, rising, proc):
+        self.watchers.append((level, rising, proc))
+        if self.flowProc is not None:
+            self.wakeFlow(proc)
+
+    # Removes proc's watcher if it has not been triggered yet
+    def unwatch(self, proc):
+        self.watchers = [w for w in self.watchers if w[2] is not proc]
+
+    # Every change of the buffer's level goes through Level's _put or _get,
+    # so the watchers are checked after them.  The process that moved the
+    # data interrupts the watching process.
+    def _put(self, arg):
+        self.settle()
+        Level._put(self, arg)
+        if self.flowProc is not None:
+            self.wakeFlow(arg[1])
+        if self.watchers:
+            self.checkWatchers(arg[1])
+
+    def _get(self, arg):
+        self.settle()
+        Level._get(self, arg)
+        if self.flowProc is not None:
+            self.wakeFlow(arg[1])
+        if self.watchers:
+            self.checkWatchers(arg[1])
+
+    def checkWatchers(self, cause, slack=0.0):
+        amount = self.amount
+        for watcher in self.watchers[:]:
+            level, rising, proc = watcher
+            if (rising and amount >= level - slack) or (not rising and amount < level + slack):
+                self.watchers.remove(watcher)
+                cause.interrupt(proc)
+
+# The stages of a request's life, each timed into its own histogram:
+#   scheduler  created to taken from the scheduler by the cache
+#   cache      taken by the cache (including the wait for space) to the disk
+#   disk       on the platter
+#   flush      a read from the end of the disk, a write from entering the
+#              cache, to its data having moved over the RAM bus
+#   total      created to completed
+# A request split between disks has its parts timed through the first four
+# and only itself through total.
+stages = ("scheduler", "cache", "disk", "flush", "total")
+
 # This is a parent module for the request creation modules that utilize the same
 # watchBuffer process but do not create the same type of requests.
 class BufferControl(Process):
-    def __init__(self, bcName, cpu, capacity, initAmount, watchInterval):
+    def __init__(self, bcName, cpu, capacity, initAmount, watchInterval, monitorType=ListMonitor):
         Process.__init__(self, name=bcName)
-        self.buffer = Buffer(bcName, capacity, initAmount)
+        self.buffer = Buffer(bcName, capacity, initAmount, monitorType)
         self.watchInterval = watchInterval
         self.cpu = cpu
+        self.traceId = Trace.component(bcName)
 
         # Buffer Control will only create an I/O request if the previous
         # request has completed processing.
         self.requestComplete = SimEvent(name="%s: HDD Request Complete"%self.name)
 
+        # Latency histograms of the requests, by stage, and the requests
+        # that completed after their deadline
+        self.latency = dict((stage, Histogram()) for stage in stages)
+        self.missed = 0
+
     # A continuous process that decides when a buffer needs more/less data
     # and makes the corresponding HDD request.
     def watchBuffer(self):
@@ -45,6 +170,19 @@ class BufferControl(Process):
         timeNoReq = 0
 
         while True:
+            # Unless polling, the process sleeps until the buffer crosses its
+            # threshhold or the rest of reqTimeOut passes, so it only takes
+            # the CPU when it is going to make a request.
+            if not self.polling and self.noReqCond(timeNoReq):
+                self.buffer.watch(self.threshhold, self.rising, self)
+                start = now()
+                yield hold, self, self.reqTimeOut - timeNoReq
+                if self.interrupted():
+                    self.interruptReset()
+                else:
+                    self.buffer.unwatch(self)
+                timeNoReq += now() - start
+
             # The process must "have" the cpu to do anything because in the
             # actual system, it is the CPU code that creates IO requests.
             yield request, self, self.cpu
@@ -66,17 +204,38 @@ class BufferControl(Process):
             else:
                 timeNoReq = 0
                 req = self.createRequest()
-                yield hold, self, self.cpu.processTime(10+req.size/128)
+                # The request may grow as others are merged into it, but
+                # only its own data is moved to or from the buffer
+                size = req.size
+                yield hold, self, self.cpu.processTime(10+size/128)
                 yield release, self, self.cpu
 
-                print self.name, "created a request", req
+                if Trace.tracingEvents:
+                    Trace.record(now(), self.traceId, Trace.REQ_CREATE, req.id, size, req.diskAddress)
                 yield waitevent, self, self.requestComplete
                 if req.write:
-                    yield get, self, self.buffer, req.size
+                    yield get, self, self.buffer, size
                 else:
-                    yield put, self, self.buffer, req.size
+                    yield put, self, self.buffer, size
 
 
+    # Returns the LBA of the next size kBs of the buffer's file.  A file is
+    # laid out in extents of extentSize kBs, each at a random place on the
+    # disk, and is read or written from start to end.
+    def nextAddress(self, size):
+        if self.extentLeft < size:
+            self.lba = self.rand.randint(0, int(self.diskSize//self.extentSize) - 1)*self.extentSize
+            self.extentLeft = self.extentSize
+        lba = self.lba
+        self.lba += size
+        self.extentLeft -= size
+        return lba
+
+    def resetLatency(self):
+        for hist in self.latency.values():
+            hist.reset()
+        self.missed = 0
+
     # Abstract Method to be overwritten by subclasses
     def createRequest(self):
         pass
@@ -88,14 +247,38 @@ class BufferControl(Process):
 # A container class for an IORequest.  These are instantiated in subclasses of
 # the BufferControl Monitor, which then waits until the requests completion.
 # These are passed to a scheduler object, and completed by the HDD module.
-class IORequest():
-    def __init__(self, bufferCon, size, diskAddress, write=0):
+# Requests are made by the million in a sweep, so they have slots instead of
+# a dictionary; sort them with the byDeadline and byAddress keys.
+class IORequest(object):
+    __slots__ = ("id", "bufferCon", "size", "diskAddress", "write", "parent", "parts",
+                 "merged", "created", "dispatched", "cached", "diskEnd", "deadline")
+
+    # Gives every request a unique id for the event trace
+    ids = count(1)
+
+    def __init__(self, bufferCon, size, diskAddress, write=0, parent=None):
+        self.id = next(IORequest.ids)
         self.bufferCon = bufferCon
         self.size = size
         self.diskAddress = diskAddress
-        self.deadline = bufferCon.computeDeadline()
         self.write = write
 
+        # A request split between disks completes once all of its parts
+        # have completed
+        self.parent = parent
+        self.parts = 0
+        # Requests a scheduler merged into this one, completed with it
+        self.merged = None
+        # Times the request entered each stage, see stages
+        self.created = now()
+        self.dispatched = None
+        self.cached = None
+        self.diskEnd = None
+        if parent is None:
+            self.deadline = bufferCon.computeDeadline()
+        else:
+            self.deadline = parent.deadline
+
     def __str__(self):
         if self.write:
             return "WRITE Request|Size:%ikBs|LBA:%i|DL:%s"%(self.size,
@@ -112,28 +295,58 @@ class IORequest():
     # buffer, the IO request is complete and the requester modules are
     # signaled to resume operation
     def completeRequest(self):
-        print "Request completed:", self
+        if self.merged is not None:
+            for IOReq in self.merged:
+                IOReq.completeRequest()
+        if self.parent is not None:
+            self.parent.parts -= 1
+            if not self.parent.parts:
+                self.parent.completeRequest()
+            return
+        if Trace.tracingEvents:
+            Trace.record(now(), self.bufferCon.traceId, Trace.REQ_COMPLETE, self.id, self.size, self.diskAddress)
+        self.bufferCon.latency["total"].record(now() - self.created)
+        if now() > self.deadline:
+            self.bufferCon.missed += 1
         self.bufferCon.requestComplete.signal()
 
-    # Grabber function for sort()
-    def deadline(self):
-        return self.deadline
+    # Returns a request for size kBs of this one at diskAddress, for one of
+    # the disks of an array
+    def split(self, size, diskAddress):
+        self.parts += 1
+        return IORequest(self.bufferCon, size, diskAddress, self.write, self)
 
-    # Grabber function for sort()
-    def diskAddress(self):
-        return self.diskAddress
+    # Takes IOReq, merged into this request by a scheduler, to be completed
+    # along with it
+    def absorb(self, IOReq):
+        if self.merged is None:
+            self.merged = []
+        self.merged.append(IOReq)
+
+# Sort keys of IORequests, run in C instead of as python callbacks
+byDeadline = attrgetter("deadline")
+byAddress = attrgetter("diskAddress")
 
 # This module watches a buffer that is being continously emptied.  To fill it,
 # this process creates read requests to pull more data from the hdd, filling
 # the buffer.
 class RRequester(BufferControl):
     def __init__(self, name, params):
-        BufferControl.__init__(self, name, params.cpu, params.oBSize, params.oBSize/2, params.oInterval)
+        BufferControl.__init__(self, name, params.cpu, params.oBSize, params.oBSize/2, params.oInterval, params.monitor)
         self.cap = params.oBSize
         self.maxData = params.oThreshhold
         self.largestRead = params.rMaxSize
         self.reqTimeOut = params.oReqTimeOut
-        self.sched = params.sched
+        self.array = params.array
+        self.polling = params.polling
+        self.rand = RandomStream(params.seed, name, params.rngBlockSize)
+        self.diskSize = params.array.capacity
+        self.extentSize = params.extentSize
+        self.extentLeft = 0
+
+        # Wakes watchBuffer when the buffer falls below maxData
+        self.threshhold = self.maxData
+        self.rising = False
 
     # Used in parent's watchBuffer function to create a new read request
     # based on the buffer amount.
@@ -142,9 +355,9 @@ class RRequester(BufferControl):
 
         n = int(self.buffer.freeSpace() / sectorSize)
         reqSize = min(self.largestRead, n*sectorSize)
-        req = IORequest(self, reqSize, randint(0,100))
+        req = IORequest(self, reqSize, self.nextAddress(reqSize))
 
-        self.sched.add(req)
+        self.array.add(req)
         return req
 
     # Used in parent's watchBuffer function.  Returns true if the system is
@@ -160,12 +373,21 @@ class RRequester(BufferControl):
 # the buffer.
 class WRequester(BufferControl):
     def __init__(self, name, params):
-        BufferControl.__init__(self, name, params.cpu, params.iBSize, 0, params.iInterval)
+        BufferControl.__init__(self, name, params.cpu, params.iBSize, 0, params.iInterval, params.monitor)
         self.cap = params.iBSize
         self.minData = params.iThreshhold
         self.largestWrite = params.wMaxSize
         self.reqTimeOut = params.iReqTimeOut
-        self.sched = params.sched
+        self.array = params.array
+        self.polling = params.polling
+        self.rand = RandomStream(params.seed, name, params.rngBlockSize)
+        self.diskSize = params.array.capacity
+        self.extentSize = params.extentSize
+        self.extentLeft = 0
+
+        # Wakes watchBuffer when the buffer rises to minData
+        self.threshhold = self.minData
+        self.rising = True
 
     # Used in parent's watchBuffer function to create a new write request
     # based on the buffer amount.
@@ -175,9 +397,9 @@ class WRequester(BufferControl):
 
         n = int(self.buffer.amount / sectorSize)
         reqSize = min(self.largestWrite, n*sectorSize)
-        req = IORequest(self, reqSize, randint(0,100), write=1)
+        req = IORequest(self, reqSize, self.nextAddress(reqSize), write=1)
 
-        self.sched.add(req)
+        self.array.add(req)
         return req
 
     # Used in parent's watchBuffer function.  Returns true if the system is
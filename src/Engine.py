@@ -0,0 +1,73 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import os
+
+# The simulator's modules import the simulation primitives (Process, hold,
+# Resource, Level, SimEvent, now, simulate ...) from here instead of from a
+# kernel directly.  The kernel is chosen once, when this module is first
+# imported, with the SIM_KERNEL environment variable:
+#   SIM_KERNEL=simpy    SimPy classic (the default)
+#   SIM_KERNEL=builtin  the built-in kernel in Kernel.py
+# The built-in kernel is also used when SimPy is not installed.
+kernelName = os.environ.get("SIM_KERNEL", "simpy")
+if kernelName not in ("simpy", "builtin"):
+    raise ValueError("Unknown SIM_KERNEL: %s"%kernelName)
+
+if kernelName == "simpy":
+    try:
+        from SimPy.Simulation import *
+    except ImportError:
+        kernelName = "builtin"
+if kernelName == "builtin":
+    from Kernel import *
+
+# With SIM_PROFILE set to a file name, every process generator is wrapped to
+# time its resumptions, see Profile.py.  Unset, the kernel's activate and
+# simulate are exported as they are.
+profileFile = os.environ.get("SIM_PROFILE")
+if profileFile:
+    import atexit
+    import Profile
+    _activate = activate
+    def activate(proc, gen, *args, **kwargs):
+        return _activate(proc, Profile.wrap(proc, gen), *args, **kwargs)
+    simulate = Profile.wrapSimulate(simulate)
+    atexit.register(Profile.report, profileFile)
+
+# With SIM_COUNT_EVENTS set, events() returns the process resumptions since
+# the last initialize() on either kernel, as Bench reports them.  The
+# built-in kernel counts them itself; under SimPy, which does not, every
+# process generator is wrapped to count its resumptions.
+countingEvents = bool(os.environ.get("SIM_COUNT_EVENTS"))
+eventCount = [0]
+if countingEvents and kernelName == "simpy":
+    def countResumptions(gen):
+        while True:
+            eventCount[0] += 1
+            yield next(gen)
+    _countedActivate = activate
+    def activate(proc, gen, *args, **kwargs):
+        return _countedActivate(proc, countResumptions(gen), *args, **kwargs)
+    _countedInitialize = initialize
+    def initialize():
+        eventCount[0] = 0
+        _countedInitialize()
+
+# Returns the process resumptions since initialize(), None if they are not
+# counted
+def events():
+    if kernelName == "builtin":
+        import Kernel
+        return Kernel.kernel.events
+    if countingEvents:
+        return eventCount[0]
+    return None
@@ -0,0 +1,105 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import sys
+from argparse import ArgumentParser
+from Sweep import makeTasks, sweep
+
+# Validation report for fluid mode.  Runs the default Parameters once with
+# packet streams and once with fluid streams, each in its own process, and
+# compares the buffer levels, latencies, faults and run times.  Fluid mode
+# is an approximation: the checked figures, averaged over the tuners and
+# over the outputs, must be within --tolerance of packet mode's, and the
+# check exits with status 1 and lists the ones that are not.
+#
+# Fluid streams have no packet to packet noise, so the peaks of their
+# buffers are lower (tuner max levels by 20-30%) and are shown but not
+# checked.  Fluid mode reports one overflow/underflow per period a buffer
+# stays full/empty, where packet mode reports one for every packet lost, so
+# only whether faults happened at all is checked.  Every stream is off on
+# its own by more than the averages are; compare several seeds before
+# trusting one stream.
+
+# Returns the average of stat over the buffers whose names start with kind
+def kindAverage(result, kind, stat):
+    values = [b[stat] for name, b in result["buffers"].items() if name.startswith(kind)]
+    return sum(values)/len(values) if values else None
+
+def main(argv=None):
+    parser = ArgumentParser(description="Compare fluid and packet streams on the default parameters")
+    parser.add_argument("-t", "--maxSimTime", type=float, default=None,
+                        help="simulated ms to run (default: Parameters.maxSimTime)")
+    parser.add_argument("-s", "--seed", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="largest part of packet mode's figure a checked figure may be off by (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    base = {}
+    if args.maxSimTime is not None:
+        base["maxSimTime"] = args.maxSimTime
+    tasks = makeTasks([{"fluid":False}, {"fluid":True}], [args.seed], base)
+    results = {}
+    for result in sweep(tasks, 2):
+        results[result["overrides"]["fluid"]] = result
+    packet = results[False]
+    fluid = results[True]
+
+    out = sys.stdout
+    out.write("%-12s %-5s %12s %12s %8s\n"%("Buffer", "stat", "packet kB", "fluid kB", "diff"))
+    for name in sorted(packet["buffers"]):
+        for stat in ("mean", "min", "max"):
+            p = packet["buffers"][name][stat]
+            f = fluid["buffers"][name][stat]
+            diff = (f - p)/p*100 if p else 0.0
+            out.write("%-12s %-5s %12.1f %12.1f %7.1f%%\n"%(name, stat, p, f, diff))
+
+    # (name, packet, fluid, checked)
+    figures = []
+    for kind, label in (("Tuner", "tuner"), ("Output", "output")):
+        for stat, checked in (("mean", True), ("p5", kind == "Output"), ("max", False)):
+            p = kindAverage(packet, kind, stat)
+            if p is not None:
+                figures.append(("%s level %s kB"%(label, stat), p, kindAverage(fluid, kind, stat), checked))
+    for kind in ("write", "read"):
+        figures.append(("%s latency mean ms"%kind, packet["latency"][kind]["total"]["mean"],
+                        fluid["latency"][kind]["total"]["mean"], True))
+
+    failures = []
+    out.write("\n%-28s %12s %12s %8s\n"%("Averages", "packet", "fluid", "diff"))
+    for name, p, f, checked in figures:
+        diff = (f - p)/p if p else 0.0
+        note = ""
+        if not checked:
+            note = "not checked"
+        elif abs(diff) > args.tolerance:
+            note = "FAIL"
+            failures.append("%s off by %.1f%%"%(name, 100*diff))
+        out.write("%-28s %12.1f %12.1f %7.1f%%  %s\n"%(name, p, f, 100*diff, note))
+    for kind in ("overflows", "underflows"):
+        if (packet[kind] > 0) != (fluid[kind] > 0):
+            failures.append("%s in only one mode"%kind)
+
+    out.write("\n%-24s %12s %12s\n"%("", "packet", "fluid"))
+    out.write("%-24s %12i %12i\n"%("overflows", packet["overflows"], fluid["overflows"]))
+    out.write("%-24s %12i %12i\n"%("underflows", packet["underflows"], fluid["underflows"]))
+    out.write("%-24s %12.2f %12.2f\n"%("wall time (s)", packet["wallTime"], fluid["wallTime"]))
+    out.write("%-24s %12.0f %12.0f\n"%("simulated s per wall s",
+              packet["simTime"]/1000.0/packet["wallTime"], fluid["simTime"]/1000.0/fluid["wallTime"]))
+    out.write("fluid mode speed-up: %.1fx\n"%(packet["wallTime"]/fluid["wallTime"]))
+
+    out.write("\n%i figures off by more than %.0f%%\n"%(len(failures), 100*args.tolerance))
+    for note in failures:
+        out.write("  FAIL: %s\n"%note)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
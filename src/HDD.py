@@ -9,78 +9,224 @@ __email__ = "ptyler@calpoly.edu"
 __status__ = "Developement"
 
 # Imports------------------
-from SimPy.Simulation import *
-from random import randint
+import json
+from array import array
+from bisect import bisect_right
+from collections import deque
+from math import sqrt
+from Engine import *
 from Data import Buffer
+from Monitors import ListMonitor
+from RNG import RandomStream
 from Schedule import Scheduler
+import Trace
 
-# Contains variables needed to Simulate different HDDs.
-# Different HDDs are simulated using different numbers.
+# Seek tables already built, by (cylinders, seek curve), shared by the
+# disks of an array
+seekTables = {}
+
+# Returns the seek time, in ms, over every distance from 0 to cylinders-1.
+# seekCurve is a list of (distance, ms) points joined by straight lines.
+def makeSeekTable(cylinders, seekCurve):
+    points = sorted(dict(map(tuple, seekCurve)).items())
+    key = (cylinders, tuple(points))
+    if key not in seekTables:
+        table = array("d", [0.0])*cylinders
+        j = 0
+        for d in range(1, cylinders):
+            while j < len(points) - 2 and points[j+1][0] < d:
+                j += 1
+            (d0, t0), (d1, t1) = points[j], points[j+1]
+            table[d] = t0 + (t1 - t0)*(d - d0)/float(d1 - d0)
+        seekTables[key] = table
+    return seekTables[key]
+
+# Returns the seek curve of a disk whose heads move one track in
+# oneTrackMove ms and over every track in fullStroke ms.  The heads spend
+# most of a short seek speeding up and settling, so the time grows with the
+# square root of the distance.
+def defaultSeekCurve(cylinders, oneTrackMove, fullStroke, points=64):
+    curve = [(0, 0.0)]
+    for i in range(points + 1):
+        d = 1 + (cylinders - 2)*i//points
+        curve.append((d, oneTrackMove + (fullStroke - oneTrackMove)*sqrt((d - 1)/float(max(cylinders - 2, 1)))))
+    return curve
+
+# The layout of a disk's LBAs (kBs) on its platters.  The cylinders are split
+# into zones, each read/written at its own rate.  Every track spins past the
+# heads in the same time, so outer zones, being faster, also hold more kBs
+# per track; the tracks of a cylinder hold consecutive LBAs.  Loaded from a
+# vendor profile or built from the hdd parameters, see DiskGeometry.load.
+class DiskGeometry():
+    def __init__(self, capacity, cylinders, rotateTime, zones, seekCurve):
+        self.capacity = capacity
+        self.cylinders = cylinders
+        self.rotateTime = rotateTime
+        self.seekTable = makeSeekTable(cylinders, seekCurve)
+
+        # Zones are (first cylinder, kBs per ms), the outermost first.  Each
+        # cylinder of a zone holds a share of the capacity proportional to
+        # its rate.
+        zones = sorted(zones)
+        bounds = [z[0] for z in zones[1:]] + [cylinders]
+        weight = sum(rate*(end - first) for (first, rate), end in zip(zones, bounds))
+        self.zoneLBAs = []
+        self.zones = []
+        lba = 0.0
+        for (first, rate), end in zip(zones, bounds):
+            kBsPerCyl = capacity*rate/weight
+            self.zoneLBAs.append(lba)
+            self.zones.append((lba, first, kBsPerCyl, rate, rate*rotateTime))
+            lba += kBsPerCyl*(end - first)
+
+    # Returns the cylinder of lba, the part of a turn from the track's start
+    # to lba and the zone's transfer rate
+    def locate(self, lba):
+        start, first, kBsPerCyl, rate, kBsPerTrack = self.zones[bisect_right(self.zoneLBAs, lba) - 1]
+        offset = lba - start
+        return (min(first + int(offset/kBsPerCyl), self.cylinders - 1),
+                (offset % kBsPerCyl % kBsPerTrack)/kBsPerTrack, rate)
+
+    # Builds the geometry from params.hddProfile, a JSON file of the form:
+    #   {"capacity": 524288000, "cylinders": 100000, "rotateTime": 8.33,
+    #    "zones": [[0, 150], [30000, 120], [60000, 90]],
+    #    "seek": [[0, 0], [1, 0.8], [1000, 4.5], [99999, 18]]}
+    # (kBs, ms, [first cylinder, kBs per ms], [distance, ms]).  Anything left
+    # out, or every value without a profile, comes from the hdd parameters:
+    # hddZones zones with rates falling from hddRWkBpms to hddInnerRate of it
+    # and a seek curve through hddTrackMove and hddFullStroke.
+    @staticmethod
+    def load(params):
+        profile = {}
+        if params.hddProfile is not None:
+            with open(params.hddProfile) as f:
+                profile = json.load(f)
+        cylinders = profile.get("cylinders", params.hddCylinders)
+        zones = profile.get("zones")
+        if zones is None:
+            n = params.hddZones
+            zones = [(cylinders*i//n, params.hddRWkBpms*(1 - (1 - params.hddInnerRate)*i/float(max(n - 1, 1))))
+                     for i in range(n)]
+        seekCurve = profile.get("seek")
+        if seekCurve is None:
+            seekCurve = defaultSeekCurve(cylinders, params.hddTrackMove, params.hddFullStroke)
+        return DiskGeometry(profile.get("capacity", params.hddCapacity), cylinders,
+                            profile.get("rotateTime", params.hddMaxTurn), zones, seekCurve)
+
+# The platters and heads of an HDD.  The heads stay on the cylinder of the
+# last request's end, and the platters spin continuously, so the time a
+# request waits for its first sector follows from when the seek ends.
 class Disk(Resource):
-    def __init__(self, hddname, fullStroke, oneTrackMove, maxRotateTime, RWkBpms):
+    def __init__(self, hddname, geometry):
         Resource.__init__(self, "Disk of %s"%hddname) #, qType=PriorityQ, preemptable=True)
+        self.geometry = geometry
+        self.seekTable = geometry.seekTable
+        self.rotateTime = geometry.rotateTime
         self.currHeadPos = 0
-        self.oneHeadMove=oneTrackMove
-        self.maxRotateTime=maxRotateTime
-        self.RWkBpms=RWkBpms
-        self.fullStroke=fullStroke
-
-    # Returns the total time needed to process a request on the disk:
-    # Rotation time, write/read track time, moving the head to the correct
-    # track etc.
+
+    # Returns the total time needed to process a request on the disk: moving
+    # the head to the request's cylinder, waiting for its first sector to
+    # turn under the head, then reading/writing at the zone's rate.
     def processReq(self, IOReq):
-        IOTime = randint(0, self.maxRotateTime)+IOReq.size/self.RWkBpms
-        self.currHeadPos = IOReq.diskAddress
-        return IOTime+min(self.fullStroke,
-            abs(IOReq.diskAddress-self.currHeadPos)*self.oneHeadMove)
+        cylinder, angle, rate = self.geometry.locate(IOReq.diskAddress)
+        seekTime = self.seekTable[abs(cylinder - self.currHeadPos)]
+        rotateTime = ((angle - (now() + seekTime)/self.rotateTime) % 1.0)*self.rotateTime
+        self.currHeadPos = self.geometry.locate(IOReq.diskAddress + IOReq.size)[0]
+        return seekTime + rotateTime + IOReq.size/rate
 
 # This module represents the cache of the HDD.  A buffer for unwritten write
 # requests and processed read requests.  The process of the cache constantly
 # pulls new IO requests from the scheduler, thus filling the cache and keeping
-# the HDD busy.
+# the HDD busy.  Besides when the cache runs out of space or requests, a
+# flush is started once the cache is filled to watermark (a part of its
+# size, None for never) with completed requests waiting.
 class Cache(Process):
-    def __init__(self, hddname, sizekBs, sched, rambus):
+    def __init__(self, hddname, sizekBs, sched, rambus, polling=False, monitorType=ListMonitor,
+                 flushMode="single", flushMaxBatch=8192, watermark=None):
         Process.__init__(self, "Cache of %s"%(hddname))
         self.sched = sched
+        self.polling = polling
         self.rambus = rambus
         self.openReqs = []
-        self.closedReqs = []
-        self.buffer = Buffer(self.name, sizekBs, 0)
+        self.closedReqs = deque()
+        self.buffer = Buffer(self.name, sizekBs, 0, monitorType)
         self.size = sizekBs
+        self.watermark = None if watermark is None else watermark*sizekBs
+        self.flushMode = flushMode
+        self.flushMaxBatch = flushMaxBatch
         self.flushNow = SimEvent(name="Flush Now")
+        self.reqAdded = SimEvent(name="%s: Request Added"%self.name)
+        self.reqProcessed = SimEvent(name="%s: Request Processed"%self.name)
+        self.traceId = Trace.component(self.name)
         self.flush = Flush(self)
 
     def fillCache(self, waitInterval):
         activate(self.flush, self.flush.flushCache())
         while True:
             # Attempts to get a new request from the scheduler's sorted list
-            # if it fails, the cache will wait waitInterval ms and try again.
+            # if it fails, the cache waits until the scheduler has requests
+            # ready (or, when polling, waitInterval ms) and tries again.
             try:
                 nextIO = self.sched.nextRequest()
             except IndexError:
-                yield hold, self, waitInterval
+                if self.polling:
+                    yield hold, self, waitInterval
+                elif self.closedReqs:
+                    # With nothing new to add, completed requests are
+                    # flushed instead of waiting for the cache to fill up,
+                    # since their requesters make no new requests until then.
+                    self.flushNow.signal()
+                    yield waitevent, self, self.flush.flushComplete
+                else:
+                    yield waitevent, self, [self.sched.reqReady, self.reqProcessed]
                 continue
+            self.sched.unindex(nextIO)
+            nextIO.dispatched = now()
+            nextIO.bufferCon.latency["scheduler"].record(nextIO.dispatched - nextIO.created)
 
             # Once the cache has found a request to be processed by the HDD,
             # it waits for the cache to have enough space for the data.
-            print "IO being added to HDD Cache", nextIO
             while nextIO.size > self.buffer.freeSpace():
-                print "not enough rooom for nextIO, %i items to flush"%len(self.closedReqs)
+                if Trace.tracingDebug:
+                    Trace.record(now(), self.traceId, Trace.CACHE_FULL, nextIO.id, len(self.closedReqs), nextIO.diskAddress)
                 if len(self.closedReqs) > 2:
                     self.flushNow.signal()
                     yield waitevent, self, self.flush.flushComplete
-                else:
+                elif self.polling:
                     yield hold, self, waitInterval
+                elif self.openReqs:
+                    yield waitevent, self, self.reqProcessed
+                else:
+                    # Nothing left on the HDD will free space, so the
+                    # few closed requests have to be flushed now.
+                    self.flushNow.signal()
+                    yield waitevent, self, self.flush.flushComplete
 
             # Once enough bytes free up, the cache marks that the new request's
             # data size is being used in the cache and adds the request to
             # the cache's FIFO list of pending requests.  If the request is a
             # write request, it is marked as complete.
             yield put, self, self.buffer, nextIO.size
+            if Trace.tracingEvents:
+                Trace.record(now(), self.traceId, Trace.CACHE_ADD, nextIO.id, nextIO.size, nextIO.diskAddress)
+            nextIO.cached = now()
             self.openReqs.append(nextIO)
             if nextIO.write:
                 self.closedReqs.append(nextIO)
+                self.checkWatermark()
+            self.reqAdded.signal()
+
+    # Called when completed requests are added, starts a flush if the cache
+    # is filled past its watermark and the flusher is idle
+    def checkWatermark(self):
+        if self.watermark is not None and not self.flush.busy and self.buffer.amount >= self.watermark:
+            self.flushNow.signal()
 
+# Moves the data of completed requests between the cache and the RAM buffers.
+# In "single" mode every request is a transfer of its own over the RAM bus;
+# in "batch" mode, like a scatter-gather DMA engine, the waiting requests
+# are taken together, up to maxBatch kBs at a time, and moved in one
+# transfer that pays the bus's overhead once, then completed together.
 class Flush(Process):
     def __init__(self, cache):
         Process.__init__(self, name="Cache Flusher")
@@ -88,7 +234,13 @@ class Flush(Process):
         self.buffer = cache.buffer
         self.closedReqs = cache.closedReqs
         self.rambus = cache.rambus
+        self.mode = cache.flushMode
+        self.maxBatch = cache.flushMaxBatch
+        self.busy = False
         self.flushComplete = SimEvent(name="Flush Complete")
+        self.traceId = Trace.component("Flusher of %s"%cache.name)
+        if self.mode not in ("single", "batch"):
+            raise ValueError("Unknown flush mode: %s"%self.mode)
 
     def flushCache(self):
         # This loop simulates the cache actually transfering data to/from
@@ -98,54 +250,104 @@ class Flush(Process):
         # while the data is transfered.
         while True:
             yield waitevent, self, self.flushNow
-            print "FLUSHING COMENCING"
-            print self.closedReqs
+            self.busy = True
+            if Trace.tracingDebug:
+                Trace.record(now(), self.traceId, Trace.FLUSH_START, 0, len(self.closedReqs))
             while len(self.closedReqs):
-                processedIO = self.closedReqs.pop(0)
+                if self.mode == "batch":
+                    for cmd in self.flushBatch():
+                        yield cmd
+                    continue
+                processedIO = self.closedReqs.popleft()
                 rtime = now()
                 yield request, self, self.rambus
                 rtime = now() - rtime
-                htime = now()
                 yield hold, self, self.rambus.processTime(processedIO.size)
-                htime = now() - htime
-                print "IO processed, RAM request time: %f, RAM processTime: %f"%(rtime,htime)
                 yield release, self, self.rambus
+                if Trace.tracingEvents:
+                    Trace.record(now(), self.traceId, Trace.FLUSH_IO, processedIO.id, rtime, processedIO.diskAddress)
                 if not processedIO.write:
                     yield get, self, self.buffer, processedIO.size
+                    processedIO.bufferCon.latency["flush"].record(now() - processedIO.diskEnd)
+                else:
+                    processedIO.bufferCon.latency["flush"].record(now() - processedIO.cached)
                 processedIO.completeRequest()
+            self.busy = False
             self.flushComplete.signal()
 
+    # Moves the next batch of requests, the yields of flushCache
+    def flushBatch(self):
+        batch = [self.closedReqs.popleft()]
+        size = batch[0].size
+        while self.closedReqs and size + self.closedReqs[0].size <= self.maxBatch:
+            batch.append(self.closedReqs.popleft())
+            size += batch[-1].size
+        rtime = now()
+        yield request, self, self.rambus
+        rtime = now() - rtime
+        yield hold, self, self.rambus.processTime(size)
+        yield release, self, self.rambus
+        readSize = sum(IOReq.size for IOReq in batch if not IOReq.write)
+        if readSize:
+            yield get, self, self.buffer, readSize
+        for IOReq in batch:
+            if Trace.tracingEvents:
+                Trace.record(now(), self.traceId, Trace.FLUSH_IO, IOReq.id, rtime, IOReq.diskAddress)
+            if IOReq.write:
+                IOReq.bufferCon.latency["flush"].record(now() - IOReq.cached)
+            else:
+                IOReq.bufferCon.latency["flush"].record(now() - IOReq.diskEnd)
+            IOReq.completeRequest()
+
 # This module simulates the actual disk portion of the HDD.  Using a FIFO list
 # created in the cache, this module uses parameter numbers to simulate the time
 # needed to complete all the requests in the list.
 class HDD(Process):
-    def __init__(self, name, params):
+    def __init__(self, name, params, sched):
         Process.__init__(self, name)
-        self.cache = Cache(name, params.hddCacheSize, params.sched, params.cpu)
-        self.disk = Disk(name, params.hddFullStroke, params.hddTrackMove, params.hddMaxTurn, params.hddRWkBpms)
+        self.cache = Cache(name, params.hddCacheSize, sched, params.rambus, params.polling, params.monitor,
+                           params.flushMode, params.flushMaxBatch, params.flushWatermark)
+        self.polling = params.polling
+        self.disk = Disk(name, params.geometry)
+        self.rand = RandomStream(params.seed, name, params.rngBlockSize)
         self.baseChance = params.baseChanceATR
+        self.ATRchance = self.baseChance
+        self.traceId = Trace.component(name)
+
+        # ms spent processing requests or in ATR, and requests processed
+        self.busyTime = 0.0
+        self.reqsDone = 0
 
     # A continuous process that simulates writes/reads on a HDD platter.  When
     # a request from the cache found, this process calculates an amount of time
     # to hold itself for bases on disk variables, then marks the request done.
     def processRequests(self, waitInterval):
         activate(self.cache, self.cache.fillCache(waitInterval))
-        ATRchance = self.baseChance
 
         while True:
             # The HDD gets the next pending request from the cache, if none
-            # are available, the HDD waits waitInterval ms.
+            # are available, the HDD waits for the cache to add one (or, when
+            # polling, waitInterval ms).
             try:
                 nextIO = self.cache.openReqs.pop(0)
             except IndexError:
-                yield hold, self, waitInterval
+                if self.polling:
+                    yield hold, self, waitInterval
+                else:
+                    yield waitevent, self, self.cache.reqAdded
                 continue
 
             # The HDD calculates the time needed to process the request, and
             # simulates writing/reading the data by delaying the process.
+            nextIO.bufferCon.latency["cache"].record(now() - nextIO.dispatched)
             temp = self.disk.processReq(nextIO)
-            print "Disk hold time:", temp
             yield hold, self, temp
+            self.busyTime += temp
+            self.reqsDone += 1
+            nextIO.diskEnd = now()
+            nextIO.bufferCon.latency["disk"].record(temp)
+            if Trace.tracingEvents:
+                Trace.record(now(), self.traceId, Trace.DISK_IO, nextIO.id, temp, nextIO.diskAddress)
 
             # if the processed request is a write request, its data is removed
             # from the cache.  If a read request, it is added to the cache's
@@ -154,15 +356,19 @@ class HDD(Process):
                 yield get, self, self.cache.buffer, nextIO.size
             else:
                 self.cache.closedReqs.append(nextIO)
+                self.cache.checkWatermark()
+            self.cache.reqProcessed.signal()
 
             # After processing a request, the HDD has a chance to enter
             # Adjacent Track Repair mode, simulating that of a WD HDD.  A
             # random integer is generated, if below ATRchance, the HDD will
             # stall itself for a calculated amount of time, then resume
             # processing requests.
-            if randint(0,100) < ATRchance:
-                print "Adjacent Track Repair: %i ms"%(70+3*ATRchance)
-                yield hold, self, 70+3*ATRchance
-                ATRchance = self.baseChance
+            if self.rand.randint(0,100) < self.ATRchance:
+                if Trace.tracingEvents:
+                    Trace.record(now(), self.traceId, Trace.ATR, 0, 70+3*self.ATRchance)
+                yield hold, self, 70+3*self.ATRchance
+                self.busyTime += 70+3*self.ATRchance
+                self.ATRchance = self.baseChance
             else:
-                ATRchance += 1
+                self.ATRchance += 1
@@ -0,0 +1,458 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import sys
+from collections import deque
+from heapq import heappush, heappop
+from itertools import count
+
+# A small discrete-event kernel with the part of SimPy classic's API the
+# simulator uses: hold, passivate, request/release on a Resource, put/get on
+# a Level, waitevent/signal on a SimEvent, interrupts and Monitors.  Processes
+# resume in the same order as under SimPy (prior notices first, then first
+# posted first), so a seeded run gives the same results on both kernels.
+#
+# The calendar is a heap of (time, order, process) tuples.  A cancelled or
+# replaced notice is not removed from the heap; it is skipped when popped
+# because its process no longer refers to it.  The commands are dispatched in
+# the simulate loop, with hold handled inline since most events are holds.
+
+__all__ = ["hold", "passivate", "request", "release", "waitevent", "get", "put",
+           "Process", "Resource", "Level", "SimEvent", "Monitor",
+           "initialize", "now", "activate", "reactivate", "simulate", "stopSimulation"]
+
+# Yield commands, with SimPy's values
+hold = 1
+passivate = 2
+request = 3
+release = 4
+waitevent = 5
+get = 8
+put = 9
+
+class Kernel():
+    def __init__(self):
+        self.initialize()
+
+    def initialize(self):
+        self.t = 0
+        self.calendar = []
+        self.order = count(1)
+        self.stopped = False
+
+        # Number of process resumptions, for events per second figures
+        self.events = 0
+
+    def now(self):
+        return self.t
+
+    def stopSimulation(self):
+        self.stopped = True
+
+    # Schedules proc to resume at time at, before (prior) or after the
+    # processes already scheduled for that time
+    def post(self, proc, at, prior=False):
+        if at < self.t:
+            raise ValueError("Attempt to schedule %s in the past"%proc.name)
+        proc._nextTime = at
+        if prior:
+            rec = (at, -next(self.order), proc)
+        else:
+            rec = (at, next(self.order), proc)
+        proc._rec = rec
+        heappush(self.calendar, rec)
+
+    def unpost(self, proc):
+        if proc._nextTime is not None:
+            proc._rec = None
+            proc._nextTime = None
+
+    def when(self, at, delay):
+        if delay is not None:
+            return max(self.t, self.t + delay)
+        if at is not None:
+            return max(self.t, at)
+        return self.t
+
+    def activate(self, proc, gen, at=None, delay=None, prior=False):
+        if not proc._terminated and not proc._nextTime:
+            proc._nextpoint = gen
+            self.post(proc, self.when(at, delay), prior)
+
+    def reactivate(self, proc, at=None, delay=None, prior=False):
+        if not proc._terminated:
+            self.unpost(proc)
+            self.post(proc, self.when(at, delay), prior)
+
+    def simulate(self, until=0):
+        calendar = self.calendar
+        order = self.order
+        try:
+            while calendar and not self.stopped and calendar[0][0] <= until:
+                rec = heappop(calendar)
+                proc = rec[2]
+                if proc._rec is not rec:
+                    continue
+                proc._rec = None
+                self.t = rec[0]
+                self.events += 1
+
+                try:
+                    cmd = next(proc._nextpoint)
+                except StopIteration:
+                    proc._nextpoint = None
+                    proc._terminated = True
+                    proc._nextTime = None
+                    continue
+
+                code = cmd[0]
+                if code == hold:
+                    if len(cmd) > 2:
+                        delay = cmd[2]
+                        if delay < 0:
+                            raise ValueError("hold: negative delay %s in %s"%(delay, proc.name))
+                    else:
+                        delay = 0
+                    proc.interruptLeft = delay
+                    proc.interruptCause = None
+                    proc._inInterrupt = False
+                    at = self.t + delay
+                    proc._nextTime = at
+                    rec = (at, next(order), proc)
+                    proc._rec = rec
+                    heappush(calendar, rec)
+                elif code == request:
+                    cmd[2]._request((cmd, proc))
+                elif code == release:
+                    cmd[2]._release((cmd, proc))
+                elif code == waitevent:
+                    if isinstance(cmd[2], SimEvent):
+                        cmd[2]._wait(proc)
+                    else:
+                        cmd[2][0]._waitOR(proc, cmd[2])
+                elif code == get:
+                    cmd[2]._get((cmd, proc))
+                elif code == put:
+                    cmd[2]._put((cmd, proc))
+                elif code == passivate:
+                    proc._nextTime = None
+                else:
+                    raise ValueError("Unsupported command: yield %s"%(cmd,))
+
+            if not self.stopped and calendar:
+                self.t = until
+        finally:
+            self.stopped = True
+
+kernel = Kernel()
+
+def initialize():
+    kernel.initialize()
+
+def now():
+    return kernel.t
+
+def stopSimulation():
+    kernel.stopSimulation()
+
+def activate(proc, gen, at=None, delay=None, prior=False):
+    kernel.activate(proc, gen, at, delay, prior)
+
+def reactivate(proc, at=None, delay=None, prior=False):
+    kernel.reactivate(proc, at, delay, prior)
+
+def simulate(until=0):
+    kernel.simulate(until)
+
+class Process(object):
+    def __init__(self, name="a_process", sim=None):
+        self.sim = sim or kernel
+        self.name = name
+        self._nextpoint = None
+        self._nextTime = None
+        self._rec = None
+        self._terminated = False
+        self._inInterrupt = False
+        self.interruptCause = None
+        self.interruptLeft = None
+        self.eventsFired = []
+
+    def active(self):
+        return self._nextTime is not None and not self._inInterrupt
+
+    def passive(self):
+        return self._nextTime is None and not self._terminated
+
+    def terminated(self):
+        return self._terminated
+
+    def interrupted(self):
+        return self._inInterrupt and not self._terminated
+
+    def cancel(self, victim):
+        self.sim.unpost(victim)
+
+    # Wakes victim up from a hold now, returns the time that was left of it
+    # or None if victim was not holding
+    def interrupt(self, victim):
+        if not victim.active():
+            return None
+        left = victim._nextTime - self.sim.t
+        victim.interruptCause = self
+        victim.interruptLeft = left
+        victim._inInterrupt = True
+        self.sim.reactivate(victim)
+        return left
+
+    def interruptReset(self):
+        self._inInterrupt = False
+
+# One-shot signal.  Every process waiting for the event is resumed when it is
+# signalled; a signal nobody waits for is kept until the next waitevent.
+class SimEvent(object):
+    def __init__(self, name="a_SimEvent", sim=None):
+        self.sim = sim or kernel
+        self.name = name
+        self.waits = []
+        self.occurred = False
+        self.signalparam = None
+
+    def signal(self, param=None):
+        self.signalparam = param
+        if not self.waits:
+            self.occurred = True
+            return
+        for proc, events in self.waits:
+            proc.eventsFired.append(self)
+            self.sim.reactivate(proc, prior=True)
+            for ev in events:
+                if ev is not self:
+                    if ev.occurred:
+                        proc.eventsFired.append(ev)
+                    for w in ev.waits:
+                        if w[0] is proc:
+                            ev.waits.remove(w)
+                            break
+        self.waits = []
+
+    def _wait(self, proc):
+        proc.eventsFired = []
+        if self.occurred:
+            proc.eventsFired.append(self)
+            self.occurred = False
+            self.sim.post(proc, self.sim.t, True)
+        else:
+            self.waits.append((proc, (self,)))
+            proc._nextTime = None
+
+    def _waitOR(self, proc, events):
+        proc.eventsFired = []
+        for ev in events:
+            if ev.occurred:
+                proc.eventsFired.append(ev)
+                ev.occurred = False
+        if proc.eventsFired:
+            self.sim.post(proc, self.sim.t, True)
+        else:
+            proc._nextTime = None
+            for ev in events:
+                ev.waits.append((proc, events))
+
+# capacity identical units handed out first come first served
+class Resource(object):
+    def __init__(self, capacity=1, name="a_resource", unitName="units", qType=None,
+                 preemptable=False, monitored=False, monitorType=None, sim=None):
+        if qType is not None or preemptable or monitored:
+            raise ValueError("Resource %s: queue types, preemption and monitoring are not supported"%name)
+        self.sim = sim or kernel
+        self.name = name
+        self.capacity = capacity
+        self.unitName = unitName
+        self.n = capacity
+        self.waitQ = deque()
+        self.activeQ = []
+
+    def _request(self, arg):
+        proc = arg[1]
+        if self.n == 0:
+            self.waitQ.append(proc)
+            proc._nextTime = None
+        else:
+            self.n -= 1
+            self.activeQ.append(proc)
+            self.sim.post(proc, self.sim.t, True)
+
+    def _release(self, arg):
+        proc = arg[1]
+        self.n += 1
+        self.activeQ.remove(proc)
+        if self.waitQ:
+            waiter = self.waitQ.popleft()
+            self.n -= 1
+            self.activeQ.append(waiter)
+            self.sim.reactivate(waiter, prior=True)
+        self.sim.post(proc, self.sim.t, True)
+
+# A store of an amount of something.  A put that would overflow capacity or
+# a get of more than the amount waits, first come first served, until it
+# can be done.
+class Level(object):
+    def __init__(self, name="a_level", capacity="unbounded", unitName="units", putQType=None,
+                 getQType=None, monitored=False, monitorType=None, initialBuffered=None, sim=None):
+        if putQType is not None or getQType is not None:
+            raise ValueError("Level %s: queue types are not supported"%name)
+        if capacity == "unbounded":
+            capacity = sys.maxsize
+        if capacity < 0:
+            raise ValueError("Level %s: negative capacity %s"%(name, capacity))
+        self.sim = sim or kernel
+        self.name = name
+        self.capacity = capacity
+        self.unitName = unitName
+        self.initialBuffered = initialBuffered or 0
+        if self.initialBuffered < 0 or self.initialBuffered > capacity:
+            raise ValueError("Level %s: initialBuffered %s outside [0, capacity]"%(name, initialBuffered))
+        self.putQ = []
+        self.getQ = []
+        self.monitored = monitored
+        if monitored:
+            if monitorType is None:
+                monitorType = Monitor
+            self.putQMon = monitorType(name="Producer Queue Monitor %s"%name, ylab="nr in queue", tlab="time", sim=self.sim)
+            self.getQMon = monitorType(name="Consumer Queue Monitor %s"%name, ylab="nr in queue", tlab="time", sim=self.sim)
+            self.bufferMon = monitorType(name="Buffer Monitor %s"%name, ylab="nr in buffer", tlab="time", sim=self.sim)
+            self.putQMon.observe(y=0, t=self.sim.t)
+            self.getQMon.observe(y=0, t=self.sim.t)
+        else:
+            self.putQMon = None
+            self.getQMon = None
+            self.bufferMon = None
+        self.nrBuffered = self.initialBuffered
+        if monitored:
+            self.bufferMon.observe(y=self.amount, t=self.sim.t)
+
+    def getamount(self):
+        return self.nrBuffered
+    amount = property(getamount)
+
+    def _put(self, arg):
+        cmd, proc = arg
+        sim = self.sim
+        amount = cmd[3] if len(cmd) > 3 else 1
+        if amount < 0:
+            raise ValueError("Level %s: negative put %s"%(self.name, amount))
+        if amount + self.amount > self.capacity:
+            proc._nextTime = None
+            proc._whatToPut = amount
+            self.putQ.append(proc)
+            if self.monitored:
+                self.putQMon.observe(y=len(self.putQ), t=sim.t)
+            return
+
+        self.nrBuffered += amount
+        if self.monitored:
+            self.bufferMon.observe(y=self.amount, t=sim.t)
+
+        # Serves the waiting getters in order
+        while self.getQ and self.amount > 0:
+            waiter = self.getQ[0]
+            if waiter._nrToGet > self.amount:
+                break
+            waiter.got = waiter._nrToGet
+            self.nrBuffered -= waiter.got
+            del self.getQ[0]
+            if self.monitored:
+                self.bufferMon.observe(y=self.amount, t=sim.t)
+                self.getQMon.observe(y=len(self.getQ), t=sim.t)
+            sim.post(waiter, sim.t)
+        sim.post(proc, sim.t, True)
+
+    def _get(self, arg):
+        cmd, proc = arg
+        sim = self.sim
+        amount = cmd[3] if len(cmd) > 3 else 1
+        if amount < 0:
+            raise ValueError("Level %s: negative get %s"%(self.name, amount))
+        proc.got = None
+        if self.amount < amount:
+            proc._nrToGet = amount
+            self.getQ.append(proc)
+            if self.monitored:
+                self.getQMon.observe(y=len(self.getQ), t=sim.t)
+            proc._nextTime = None
+            return
+
+        proc.got = amount
+        self.nrBuffered -= amount
+        if self.monitored:
+            self.bufferMon.observe(y=self.amount, t=sim.t)
+        sim.post(proc, sim.t, True)
+
+        # Serves the waiting putters in order
+        while self.putQ:
+            waiter = self.putQ[0]
+            if waiter._whatToPut + self.amount > self.capacity:
+                break
+            self.nrBuffered += waiter._whatToPut
+            del self.putQ[0]
+            if self.monitored:
+                self.bufferMon.observe(y=self.amount, t=sim.t)
+                self.putQMon.observe(y=len(self.putQ), t=sim.t)
+            sim.post(waiter, sim.t)
+
+# List of [time, value] observations, like SimPy's Monitor
+class Monitor(list):
+    def __init__(self, name="a_Monitor", ylab="y", tlab="t", sim=None):
+        list.__init__(self)
+        self.sim = sim or kernel
+        self.name = name
+        self.ylab = ylab
+        self.tlab = tlab
+        self.startTime = 0.0
+
+    def observe(self, y, t=None):
+        if t is None:
+            t = self.sim.t
+        self.append([t, y])
+
+    def reset(self, t=None):
+        self[:] = []
+        if t is None:
+            t = self.sim.t
+        self.startTime = t
+
+    def tseries(self):
+        return [ty[0] for ty in self]
+
+    def yseries(self):
+        return [ty[1] for ty in self]
+
+    def count(self):
+        return len(self)
+
+    def total(self):
+        return sum(ty[1] for ty in self)
+
+    def mean(self):
+        return float(self.total())/len(self)
+
+    def timeAverage(self, t=None):
+        if not self:
+            return None
+        if t is None:
+            t = self.sim.t
+        total = 0.0
+        for i in range(len(self) - 1):
+            total += self[i][1]*(self[i+1][0] - self[i][0])
+        total += self[-1][1]*(t - self[-1][0])
+        if t == self[0][0]:
+            return None
+        return total/float(t - self[0][0])
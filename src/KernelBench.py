@@ -0,0 +1,84 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import json
+import os
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser, SUPPRESS
+
+# Benchmark of the simulation kernels.  Runs the default Parameters (seeded)
+# on SimPy and on the built-in kernel, each in its own process since the
+# kernel is picked on import, and reports the events processed per wall
+# second.  Run with 'python KernelBench.py'
+#
+# The events are counted by the built-in kernel; both kernels resume the
+# processes in the same order, which the benchmark checks by comparing the
+# two runs' summaries.
+
+# Runs one simulation on the kernel in SIM_KERNEL and prints its wall time,
+# events and summary as the last line of output
+def runChild(maxSimTime, seed):
+    from Simulation import Sim
+    import Engine
+    sim = Sim()
+    sim.params.seed = seed
+    if maxSimTime is not None:
+        sim.params.maxSimTime = maxSimTime
+    start = time.time()
+    summary = sim.run()
+    wallTime = time.time() - start
+    events = None
+    if Engine.kernelName == "builtin":
+        import Kernel
+        events = Kernel.kernel.events
+    sys.stdout.write("\n" + json.dumps({"kernel":Engine.kernelName, "wallTime":wallTime, "events":events, "summary":summary}) + "\n")
+
+# Returns the fastest of repeat runs on kernel
+def timeKernel(kernel, args):
+    env = dict(os.environ, SIM_KERNEL=kernel)
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", "-s", str(args.seed)]
+    if args.maxSimTime is not None:
+        cmd += ["-t", str(args.maxSimTime)]
+    best = None
+    for i in range(args.repeat):
+        out = subprocess.check_output(cmd, env=env)
+        result = json.loads(out.decode("utf-8").strip().splitlines()[-1])
+        if best is None or result["wallTime"] < best["wallTime"]:
+            best = result
+    return best
+
+def main(argv=None):
+    parser = ArgumentParser(description="Compare the SimPy and built-in simulation kernels")
+    parser.add_argument("-t", "--maxSimTime", type=float, default=None,
+                        help="simulated ms to run (default: Parameters.maxSimTime)")
+    parser.add_argument("-s", "--seed", type=int, default=1)
+    parser.add_argument("-n", "--repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        runChild(args.maxSimTime, args.seed)
+        return
+
+    simpy = timeKernel("simpy", args)
+    builtin = timeKernel("builtin", args)
+    events = builtin["events"]
+    out = sys.stdout
+    out.write("%-10s %12s %10s %14s\n"%("kernel", "events", "wall s", "events/s"))
+    for result in (simpy, builtin):
+        out.write("%-10s %12i %10.2f %14.0f\n"%(result["kernel"], events, result["wallTime"], events/result["wallTime"]))
+    out.write("speed-up: %.2fx\n"%(simpy["wallTime"]/builtin["wallTime"]))
+    if simpy["summary"] != builtin["summary"]:
+        out.write("WARNING: the kernels' results differ, the simpy event count is not exact\n")
+
+if __name__ == "__main__":
+    main()
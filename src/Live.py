@@ -0,0 +1,263 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser, REMAINDER
+
+# Live view of a simulation running in another process.  With
+# Parameters.liveFile set, the simulation writes a snapshot of its state
+# every liveInterval simulated ms into a ring of liveSlots fixed-size
+# records in that memory mapped file, and any number of viewers map it read
+# only and read the newest snapshot (or every one still in the ring) at
+# their own pace, without ever holding up the simulation:
+#   python -m Live run sim.live config.json -s numTuners=12
+#   python -m Live view sim.live
+#   python -m Live record sim.live -o snapshots.jsonl
+# 'run' starts 'python -m Batch' as a worker process writing sim.live and
+# shows it, 'view' shows a simulation already writing it, 'record' writes
+# every snapshot out as JSON lines.  This module only needs the standard
+# library, so a viewer does not import the simulator.
+#
+# The file is a header, the names of the streams and disks as JSON, and the
+# ring.  Every record starts and ends with its sequence number, 1 for the
+# first snapshot.  The writer zeroes both before writing the record and
+# sets the end one and then the start one after it, then the header's count
+# of snapshots written, so a reader that copies a record and finds both
+# numbers as expected has not read it while it was being overwritten.
+
+header = struct.Struct("<4sIIIIId")
+counter = struct.Struct("<QI") # Snapshots written, 1 once the simulation is done
+magic = "SIMV"
+version = 1
+
+# Fields of every stream and disk in a snapshot
+streamFields = (("level", "d"), # kBs in the stream's buffer
+                ("faults", "I")) # Overflows or underflows so far
+diskFields = (("cacheUsed", "d"), # kBs of the HDD cache in use
+              ("queued", "I"), # Requests waiting in the scheduler
+              ("open", "I"), # Requests in the cache waiting for the disk
+              ("closed", "I"), # Requests done waiting to be flushed
+              ("busyTime", "d"), # ms the disk has been busy
+              ("reqsDone", "I")) # Requests the disk has done
+
+# Returns the struct of a record and the offset of the ring
+def layout(numStreams, numDisks, namesSize):
+    fmt = "<Qd" + "".join(f for name, f in streamFields)*numStreams \
+          + "".join(f for name, f in diskFields)*numDisks + "Q"
+    ringStart = header.size + counter.size + namesSize
+    ringStart += -ringStart % 8
+    return struct.Struct(fmt), ringStart
+
+# Writes the snapshots of one simulation, called by Simulation.Publisher
+class Writer():
+    def __init__(self, path, streamNames, diskNames, slots=4096, interval=100):
+        names = json.dumps({"streams":streamNames, "disks":diskNames}).encode("utf-8")
+        self.slots = slots
+        self.record, self.ringStart = layout(len(streamNames), len(diskNames), len(names))
+        self.seq = 0
+        self.file = open(path, "w+b")
+        self.file.truncate(self.ringStart + slots*self.record.size)
+        self.map = mmap.mmap(self.file.fileno(), self.ringStart + slots*self.record.size)
+
+        # The magic is written last, so a viewer never sees half a header
+        header.pack_into(self.map, 0, "\0"*4, version, len(streamNames), len(diskNames),
+                         slots, len(names), interval)
+        counter.pack_into(self.map, header.size, 0, 0)
+        self.map[header.size + counter.size:header.size + counter.size + len(names)] = names
+        self.map[0:4] = magic
+
+    # Writes the snapshot at time t, values holding every stream's fields
+    # and then every disk's, in the order of streamFields and diskFields
+    def write(self, t, values):
+        self.seq += 1
+        offset = self.ringStart + ((self.seq - 1) % self.slots)*self.record.size
+        end = offset + self.record.size - 8
+        struct.pack_into("<Q", self.map, offset, 0)
+        struct.pack_into("<Q", self.map, end, 0)
+        self.record.pack_into(self.map, offset, 0, t, *(values + [0]))
+        struct.pack_into("<Q", self.map, end, self.seq)
+        struct.pack_into("<Q", self.map, offset, self.seq)
+        counter.pack_into(self.map, header.size, self.seq, 0)
+
+    def close(self):
+        if self.map is not None:
+            counter.pack_into(self.map, header.size, self.seq, 1)
+            self.map.flush()
+            self.map.close()
+            self.file.close()
+            self.map = None
+
+# Reads the snapshots of a simulation, waiting up to timeout s for it to
+# create the file
+class Reader():
+    def __init__(self, path, timeout=10.0):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                self.file = open(path, "rb")
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+                if self.map[0:4] == magic:
+                    break
+                self.map.close()
+                self.file.close()
+            except (IOError, OSError, ValueError):
+                pass
+            if time.time() > deadline:
+                raise IOError("%s is not a live view file"%path)
+            time.sleep(0.05)
+        (m, v, numStreams, numDisks, self.slots, namesSize,
+         self.interval) = header.unpack_from(self.map, 0)
+        if v != version:
+            raise IOError("%s is version %i of the live view, not %i"%(path, v, version))
+        start = header.size + counter.size
+        names = json.loads(self.map[start:start + namesSize].decode("utf-8"))
+        self.streams = names["streams"]
+        self.disks = names["disks"]
+        self.record, self.ringStart = layout(numStreams, numDisks, namesSize)
+
+    # Returns (snapshots written, whether the simulation is done)
+    def status(self):
+        return counter.unpack_from(self.map, header.size)
+
+    # Returns snapshot seq as a dictionary, None if it has been overwritten
+    def read(self, seq):
+        offset = self.ringStart + ((seq - 1) % self.slots)*self.record.size
+        values = self.record.unpack(self.map[offset:offset + self.record.size])
+        if values[0] != seq or values[-1] != seq:
+            return None
+        snapshot = {"seq":seq, "time":values[1], "streams":{}, "disks":{}}
+        i = 2
+        for name in self.streams:
+            snapshot["streams"][name] = dict((field, values[i + j]) for j, (field, f) in enumerate(streamFields))
+            i += len(streamFields)
+        for name in self.disks:
+            snapshot["disks"][name] = dict((field, values[i + j]) for j, (field, f) in enumerate(diskFields))
+            i += len(diskFields)
+        return snapshot
+
+    # Returns the newest snapshot, None before the first
+    def latest(self):
+        while True:
+            seq = self.status()[0]
+            if not seq:
+                return None
+            snapshot = self.read(seq)
+            if snapshot is not None:
+                return snapshot
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+# Starts 'python -m Batch' with batchArgs as a worker process writing path
+def spawn(path, batchArgs):
+    here = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen([sys.executable, "-m", "Batch"] + list(batchArgs) + ["-s", "liveFile=%s"%json.dumps(path)],
+                            cwd=here)
+
+# Shows the newest snapshot every refresh s until the simulation is done
+def view(reader, refresh, out=sys.stdout, worker=None):
+    last = None
+    while True:
+        seq, done = reader.status()
+        snapshot = reader.latest()
+        if snapshot is not None:
+            lines = ["t = %.0f ms (snapshot %i)"%(snapshot["time"], snapshot["seq"]), "",
+                     "%-20s %12s %8s"%("stream", "level kB", "faults")]
+            for name in reader.streams:
+                s = snapshot["streams"][name]
+                lines.append("%-20s %12.0f %8i"%(name, s["level"], s["faults"]))
+            lines += ["", "%-20s %12s %7s %7s %7s %8s %6s"%("disk", "cache kB", "queued", "open", "closed", "reqs", "busy")]
+            for name in reader.disks:
+                d = snapshot["disks"][name]
+                busy = ""
+                if last is not None and snapshot["time"] > last["time"]:
+                    busy = "%5.0f%%"%(100*(d["busyTime"] - last["disks"][name]["busyTime"])/(snapshot["time"] - last["time"]))
+                lines.append("%-20s %12.0f %7i %7i %7i %8i %6s"%(name, d["cacheUsed"], d["queued"], d["open"],
+                                                                 d["closed"], d["reqsDone"], busy))
+            if out.isatty():
+                out.write("\x1b[H\x1b[2J")
+            out.write("\n".join(lines) + "\n\n")
+            out.flush()
+            last = snapshot
+        if done or (worker is not None and worker.poll() is not None):
+            return
+        time.sleep(refresh)
+
+# Writes every snapshot as a JSON line until the simulation is done, and
+# returns the number of snapshots overwritten before they were read
+def record(reader, out, poll=0.05):
+    seq = 0
+    missed = 0
+    while True:
+        written, done = reader.status()
+        if written - seq > reader.slots:
+            missed += written - reader.slots - seq
+            seq = written - reader.slots
+        while seq < written:
+            seq += 1
+            snapshot = reader.read(seq)
+            if snapshot is None:
+                missed += 1
+            else:
+                out.write(json.dumps(snapshot, sort_keys=True) + "\n")
+        if done:
+            return missed
+        time.sleep(poll)
+
+def main(argv=None):
+    parser = ArgumentParser(prog="python -m Live", description="Live view of a simulation in another process")
+    commands = parser.add_subparsers(dest="command")
+    runParser = commands.add_parser("run", help="run 'python -m Batch' writing FILE and show it")
+    runParser.add_argument("file")
+    runParser.add_argument("-r", "--refresh", type=float, default=0.5, help="s between updates (default: 0.5)")
+    runParser.add_argument("batchArgs", nargs=REMAINDER, help="arguments of Batch")
+    viewParser = commands.add_parser("view", help="show a simulation writing FILE")
+    viewParser.add_argument("file")
+    viewParser.add_argument("-r", "--refresh", type=float, default=0.5, help="s between updates (default: 0.5)")
+    recordParser = commands.add_parser("record", help="write every snapshot of FILE as JSON lines")
+    recordParser.add_argument("file")
+    recordParser.add_argument("-o", "--output", default=None, help="file to write to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        if os.path.exists(args.file):
+            os.remove(args.file)
+        worker = spawn(os.path.abspath(args.file), args.batchArgs)
+        try:
+            reader = Reader(args.file)
+        except IOError:
+            worker.wait()
+            parser.error("the worker did not start writing %s"%args.file)
+        view(reader, args.refresh, worker=worker)
+        sys.exit(worker.wait())
+    try:
+        reader = Reader(args.file)
+    except IOError as e:
+        parser.error(str(e))
+    if args.command == "view":
+        view(reader, args.refresh)
+    else:
+        out = sys.stdout if args.output is None else open(args.output, "w")
+        missed = record(reader, out)
+        if out is not sys.stdout:
+            out.close()
+        if missed:
+            sys.stderr.write("%i snapshots were overwritten before they were read\n"%missed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import math
+import mmap
+import os
+import re
+import struct
+from array import array
+from itertools import count
+from Engine import *
+
+# Monitor backends for the buffers' levels, chosen with
+# Parameters.monitorType:
+#   "list"    SimPy's Monitor, every (time, level) pair kept in a list
+#   "stats"   streaming time-weighted mean/variance/min/max and a percentile
+#             sketch, constant memory
+#   "sampled" "stats" plus the level's time average over every
+#             monitorInterval ms, kept in a preallocated array
+#   "mapped"  "stats" plus every (time, level) pair written to a memory
+#             mapped file in a directory of monitorDir of its own for every
+#             run, named by the process id and the run's number in it
+# Every backend answers timeAverage(), timeVariance(), minimum(), maximum()
+# and percentile(), which is all the simulation reads back.
+
+# SimPy's Monitor with the statistics the other backends have
+class ListMonitor(Monitor):
+    def minimum(self):
+        return min(self.yseries())
+
+    def maximum(self):
+        return max(self.yseries())
+
+    # The level the buffer was at or below for fraction p of the time
+    def percentile(self, p, t=None):
+        if t is None:
+            t = now()
+        weights = {}
+        for i in range(len(self)):
+            ti, yi = self[i]
+            tnext = self[i+1][0] if i+1 < len(self) else t
+            weights[yi] = weights.get(yi, 0) + tnext - ti
+        return weightedPercentile(sorted(weights.items()), p)
+
+    def close(self):
+        pass
+
+# Returns the value below which fraction p of the total weight of the sorted
+# (value, weight) pairs lies
+def weightedPercentile(pairs, p):
+    total = sum(w for y, w in pairs)
+    if not pairs:
+        return None
+    cumulative = 0.0
+    for y, w in pairs:
+        cumulative += w
+        if cumulative >= p*total:
+            return y
+    return pairs[-1][0]
+
+# Keeps running time-weighted sums instead of the observations.  Percentiles
+# come from a sketch of log-spaced buckets (each bucket's values are within
+# accuracy of each other), weighted by the time the level spent in them, so
+# memory only grows with the log of the range of levels.  Levels are
+# expected to be non-negative.
+class StatsMonitor():
+    def __init__(self, name='a_Monitor', ylab='y', tlab='t', sim=None, accuracy=0.01):
+        self.name = name
+        self.ylab = ylab
+        self.tlab = tlab
+        self.sim = sim
+        self.gamma = (1 + accuracy)/(1 - accuracy)
+        self.logGamma = math.log(self.gamma)
+        self.reset()
+
+    def reset(self, t=None):
+        self.count = 0
+        self.startTime = t
+        self.lastT = t
+        self.lastY = 0.0
+        self.integral = 0.0
+        self.integral2 = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+        self.zeroWeight = 0.0
+
+    def observe(self, y, t=None):
+        if t is None:
+            t = now()
+        if self.count:
+            self.accumulate(self.lastT, t, self.lastY)
+        else:
+            self.startTime = t
+        if self.min is None or y < self.min:
+            self.min = y
+        if self.max is None or y > self.max:
+            self.max = y
+        self.lastT = t
+        self.lastY = y
+        self.count += 1
+
+    # Adds the level y, held from t0 to t1, to the running sums
+    def accumulate(self, t0, t1, y):
+        dt = t1 - t0
+        self.integral += dt*y
+        self.integral2 += dt*y*y
+        if y <= 0:
+            self.zeroWeight += dt
+        else:
+            i = int(math.ceil(math.log(y)/self.logGamma))
+            self.buckets[i] = self.buckets.get(i, 0.0) + dt
+
+    def __len__(self):
+        return self.count
+
+    def timeAverage(self, t=None):
+        if t is None:
+            t = now()
+        if not self.count or t <= self.startTime:
+            return None
+        integral = self.integral + (t - self.lastT)*self.lastY
+        return integral/(t - self.startTime)
+
+    def timeVariance(self, t=None):
+        if t is None:
+            t = now()
+        mean = self.timeAverage(t)
+        if mean is None:
+            return None
+        integral2 = self.integral2 + (t - self.lastT)*self.lastY*self.lastY
+        return integral2/(t - self.startTime) - mean*mean
+
+    def minimum(self):
+        return self.min
+
+    def maximum(self):
+        return self.max
+
+    # The level the buffer was at or below for fraction p of the time, to
+    # within the sketch's accuracy
+    def percentile(self, p, t=None):
+        if t is None:
+            t = now()
+        if not self.count:
+            return None
+        pairs = [(0.0, self.zeroWeight)]
+        for i in sorted(self.buckets):
+            pairs.append((2*self.gamma**i/(self.gamma + 1), self.buckets[i]))
+
+        # The current level has not been added to the buckets yet
+        pairs.append((self.lastY, t - self.lastT))
+        pairs.sort()
+        y = weightedPercentile(pairs, p)
+        return min(max(y, self.min), self.max)
+
+    def close(self):
+        pass
+
+# Also keeps the level's time average over every interval ms, from time 0,
+# in an array preallocated for numSamples intervals.  Time past the last
+# interval is added to it.
+class SampledMonitor(StatsMonitor):
+    def __init__(self, name='a_Monitor', ylab='y', tlab='t', sim=None, interval=100.0, numSamples=5001):
+        self.interval = float(interval)
+        self.samples = array('d', [0.0])*numSamples
+        StatsMonitor.__init__(self, name, ylab, tlab, sim)
+
+    def reset(self, t=None):
+        StatsMonitor.reset(self, t)
+        self.samples = array('d', [0.0])*len(self.samples)
+
+    def accumulate(self, t0, t1, y):
+        StatsMonitor.accumulate(self, t0, t1, y)
+        self.spread(self.samples, t0, t1, y)
+
+    # Adds the level y, held from t0 to t1, to the intervals of samples
+    def spread(self, samples, t0, t1, y):
+        last = len(samples) - 1
+        i = int(t0/self.interval)
+        while t0 < t1:
+            if i >= last:
+                samples[last] += (t1 - t0)*y
+                break
+            end = min(t1, (i + 1)*self.interval)
+            samples[i] += (end - t0)*y
+            t0 = end
+            i += 1
+
+    # Returns the start times and average levels of the intervals up to t
+    def series(self, t=None):
+        if t is None:
+            t = now()
+        samples = self.samples
+        if self.count and t > self.lastT:
+            # The current level has not been added to the samples yet
+            samples = array('d', samples)
+            self.spread(samples, self.lastT, t, self.lastY)
+        n = min(int(math.ceil(t/self.interval)), len(samples))
+        times = [i*self.interval for i in range(n)]
+        levels = [samples[i]/self.interval for i in range(n)]
+        if n and t < n*self.interval:
+            # The last interval is only partly over
+            levels[-1] *= self.interval/(t - times[-1])
+        return times, levels
+
+    def tseries(self):
+        return self.series()[0]
+
+    def yseries(self):
+        return self.series()[1]
+
+# Also writes every (time, level) observation to a memory mapped file of
+# little-endian double pairs, which is grown as needed and cut down to the
+# observations made when the monitor is closed.  Once closed, the series are
+# read back from the file.
+class MappedMonitor(StatsMonitor):
+    record = struct.Struct("<dd")
+
+    def __init__(self, name='a_Monitor', ylab='y', tlab='t', sim=None, directory=".", initialRecords=65536):
+        StatsMonitor.__init__(self, name, ylab, tlab, sim)
+        self.path = os.path.join(directory, re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_") + ".mon")
+        self.file = open(self.path, "w+b")
+        self.file.truncate(initialRecords*self.record.size)
+        self.map = mmap.mmap(self.file.fileno(), initialRecords*self.record.size)
+
+    def reset(self, t=None):
+        StatsMonitor.reset(self, t)
+        self.used = 0
+
+    def observe(self, y, t=None):
+        if t is None:
+            t = now()
+        StatsMonitor.observe(self, y, t)
+        if self.used + self.record.size > len(self.map):
+            self.map.resize(2*len(self.map))
+        self.record.pack_into(self.map, self.used, t, y)
+        self.used += self.record.size
+
+    def series(self):
+        values = array('d')
+        if self.map is not None:
+            values.fromstring(self.map[:self.used])
+        else:
+            with open(self.path, "rb") as f:
+                values.fromstring(f.read())
+        return values[0::2], values[1::2]
+
+    def tseries(self):
+        return self.series()[0]
+
+    def yseries(self):
+        return self.series()[1]
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.file.truncate(self.used)
+            self.file.close()
+            self.map = None
+
+# Runs of this process that used the mapped monitor
+mappedRuns = count(1)
+
+# Returns the monitor class chosen in the simulation's parameters, with its
+# settings filled in, for Buffer's monitorType
+def makeMonitor(params):
+    if params.monitorType == "list":
+        return ListMonitor
+    if params.monitorType == "stats":
+        return StatsMonitor
+    if params.monitorType == "sampled":
+        numSamples = int(math.ceil(params.maxSimTime/float(params.monitorInterval))) + 1
+        return lambda name, ylab, tlab, sim: SampledMonitor(name, ylab, tlab, sim, params.monitorInterval, numSamples)
+    if params.monitorType == "mapped":
+        # Sweep and Batch workers, and the runs of one of them, write their
+        # files apart
+        directory = os.path.join(params.monitorDir, "run-%i-%i"%(os.getpid(), next(mappedRuns)))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return lambda name, ylab, tlab, sim: MappedMonitor(name, ylab, tlab, sim, directory)
+    raise ValueError("Unknown monitor type: %s"%params.monitorType)
+
+# Counts of values (latencies in ms) in a fixed number of log-linear buckets,
+# in the style of an HDR histogram.  Values are kept in us; below 2**subBits
+# us every us has its own bucket, above it every power of two is split into
+# 2**(subBits-1) buckets, so a value is known to within 1/2**(subBits-1) of
+# itself.  Values above maxMs are counted in the last bucket.  Histograms
+# with the same settings can be merged.
+class Histogram():
+    def __init__(self, subBits=8, maxMs=1000000):
+        self.subBits = subBits
+        self.half = 1 << (subBits - 1)
+        self.size = self.index(int(maxMs*1000)) + 1
+        self.counts = array('I', [0])*self.size
+        self.reset()
+
+    def reset(self):
+        for i in range(self.size):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def index(self, us):
+        shift = us.bit_length() - self.subBits
+        if shift <= 0:
+            return us
+        return (shift + 1)*self.half + (us >> shift) - self.half
+
+    # Returns the middle of bucket i in ms
+    def value(self, i):
+        if i < 2*self.half:
+            return i/1000.0
+        shift = i//self.half - 1
+        return ((i - shift*self.half) + 0.5)*(1 << shift)/1000.0
+
+    def record(self, ms):
+        i = self.index(int(ms*1000))
+        self.counts[i if i < self.size else self.size - 1] += 1
+        self.count += 1
+        self.total += ms
+        if self.max is None or ms > self.max:
+            self.max = ms
+
+    def merge(self, other):
+        for i in range(self.size):
+            self.counts[i] += other.counts[i]
+        self.count += other.count
+        self.total += other.total
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def mean(self):
+        return self.total/self.count if self.count else None
+
+    # The value at or below which fraction p of the values are, None
+    # without values.  The last bucket has no upper bound, so it is given
+    # as the max.
+    def percentile(self, p):
+        if not self.count:
+            return None
+        target = max(1, int(math.ceil(p*self.count)))
+        cumulative = 0
+        for i in range(self.size - 1):
+            cumulative += self.counts[i]
+            if cumulative >= target:
+                return min(self.value(i), self.max)
+        return self.max
+
+    # Returns the count, mean, max and p50/p99/p99.9 as a dictionary
+    def summary(self):
+        return {"count":self.count, "mean":self.mean(), "max":self.max,
+                "p50":self.percentile(0.5), "p99":self.percentile(0.99),
+                "p999":self.percentile(0.999)}
+
+# Counts a stream's faults, the packets that overflowed or underflowed its
+# buffer, in a fixed amount of memory however many there are.  Faults with
+# no good packet between them make up one episode, which lasts from the
+# first of them until the stream recovers.  The GUI reads the start of the
+# newest episode (episodeStart, or lastEpisode once over) to log it.
+class Faults():
+    def __init__(self, kind):
+        self.kind = kind # "Overflow" or "Underflow"
+        self.episodeStart = None
+        self.reset(0)
+
+    # Forgets the faults so far.  An episode going on carries on from t.
+    def reset(self, t):
+        self.count = 0
+        self.kBs = 0.0
+        self.first = None
+        self.last = None
+        self.episodes = 0
+        self.longest = 0.0
+        self.lastEpisode = None
+        if self.episodeStart is not None:
+            self.episodeStart = t
+            self.episodes = 1
+
+    # Counts a fault at time t that lost kBs of the stream's data
+    def fail(self, t, kBs):
+        self.count += 1
+        self.kBs += kBs
+        if self.first is None:
+            self.first = t
+        self.last = t
+        if self.episodeStart is None:
+            self.episodeStart = t
+            self.episodes += 1
+
+    # Ends the episode, if any, at time t, adding the kBs lost during it
+    # that were not counted by fail
+    def recover(self, t, kBs=0.0):
+        if self.episodeStart is not None:
+            self.longest = max(self.longest, t - self.episodeStart)
+            self.lastEpisode = self.episodeStart
+            self.episodeStart = None
+            self.kBs += kBs
+
+    # Returns the counts as a dictionary, an episode going on at endTime
+    # lasting until then
+    def summary(self, endTime):
+        longest = self.longest
+        if self.episodeStart is not None:
+            longest = max(longest, endTime - self.episodeStart)
+        return {"count":self.count, "kBs":self.kBs, "first":self.first, "last":self.last,
+                "episodes":self.episodes, "longest":longest}
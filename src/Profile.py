@@ -0,0 +1,120 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import sys
+from timeit import default_timer as clock
+
+# Attributes the host's time to the simulated components.  Enabled with the
+# SIM_PROFILE environment variable (or Batch's --profile), which Engine reads
+# when it is first imported:
+#   SIM_PROFILE=run.folded python -m Batch config.json
+# Engine then wraps every process generator it activates, so each resumption
+# of a process is counted and timed, by the process's class, its generator
+# function and the command it yielded.  At exit, a table sorted by time is
+# written to stderr and the same figures, in us, as collapsed stacks to the
+# SIM_PROFILE file, e.g. for flamegraph.pl:
+#   InputStream;fillBuffer;hold 812345
+# Time spent in the kernel itself (the calendar, resources, levels and
+# events) is reported as "(kernel)".
+#
+# With SIM_PROFILE unset this module is not imported, and Engine exports the
+# kernel's own activate, so nothing is added to the event loop.
+
+# {(class, generator, command): [resumptions, seconds]}
+stats = {}
+
+# Seconds spent in simulate()
+simulateTime = [0.0]
+
+# Yield command names, by their value
+commandNames = {}
+
+def reset():
+    stats.clear()
+    simulateTime[0] = 0.0
+
+# Returns gen, a process generator of proc, with every resumption counted
+# and timed
+def wrap(proc, gen):
+    component = proc.__class__.__name__
+    function = getattr(gen, "__name__", "?")
+    while True:
+        start = clock()
+        try:
+            cmd = next(gen)
+        except StopIteration:
+            record(component, function, "return", clock() - start)
+            return
+        record(component, function, cmd[0], clock() - start)
+        yield cmd
+
+def record(component, function, command, elapsed):
+    key = (component, function, command)
+    try:
+        entry = stats[key]
+    except KeyError:
+        entry = stats[key] = [0, 0.0]
+    entry[0] += 1
+    entry[1] += elapsed
+
+# Returns simulate wrapped to add its wall time to simulateTime
+def wrapSimulate(simulate):
+    def profiledSimulate(*args, **kwargs):
+        start = clock()
+        try:
+            return simulate(*args, **kwargs)
+        finally:
+            simulateTime[0] += clock() - start
+    return profiledSimulate
+
+def commandName(command):
+    if not commandNames:
+        import Engine
+        for name in ("hold", "passivate", "request", "release", "waitevent", "get", "put"):
+            commandNames[getattr(Engine, name)] = name
+    return commandNames.get(command, str(command))
+
+# Returns {(class, generator): [resumptions, seconds, {command: resumptions}]}
+def byComponent():
+    components = {}
+    for (component, function, command), (count, seconds) in stats.items():
+        entry = components.setdefault((component, function), [0, 0.0, {}])
+        entry[0] += count
+        entry[1] += seconds
+        entry[2][commandName(command)] = entry[2].get(commandName(command), 0) + count
+    return components
+
+def kernelTime():
+    return max(0.0, simulateTime[0] - sum(seconds for count, seconds in stats.values()))
+
+def writeTable(out):
+    components = byComponent()
+    total = simulateTime[0] or sum(entry[1] for entry in components.values()) or 1.0
+    out.write("%-20s %-16s %12s %10s %7s  %s\n"%("component", "generator", "resumptions", "wall ms", "%", "by yield"))
+    rows = sorted(components.items(), key=lambda item: -item[1][1])
+    for (component, function), (count, seconds, commands) in rows:
+        byYield = " ".join("%s:%i"%(name, n) for name, n in sorted(commands.items(), key=lambda item: -item[1]))
+        out.write("%-20s %-16s %12i %10.1f %6.1f%%  %s\n"%(component, function, count, 1000*seconds, 100*seconds/total, byYield))
+    if simulateTime[0]:
+        out.write("%-20s %-16s %12s %10.1f %6.1f%%\n"%("(kernel)", "", "", 1000*kernelTime(), 100*kernelTime()/total))
+        out.write("%-20s %-16s %12s %10.1f\n"%("simulate() total", "", "", 1000*simulateTime[0]))
+
+def writeCollapsed(out):
+    for (component, function, command), (count, seconds) in sorted(stats.items()):
+        out.write("%s;%s;%s %i\n"%(component, function, commandName(command), int(1e6*seconds)))
+    if simulateTime[0]:
+        out.write("(kernel) %i\n"%int(1e6*kernelTime()))
+
+# Writes both reports, called at exit when SIM_PROFILE is set
+def report(path):
+    writeTable(sys.stderr)
+    with open(path, "w") as f:
+        writeCollapsed(f)
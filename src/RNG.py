@@ -0,0 +1,94 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import random
+from zlib import crc32
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Every stream, requester and disk draws its random numbers from its own
+# generator, seeded from the simulation's seed and the component's name.
+# A component therefore sees the same numbers in two runs with the same seed
+# even if other parts of the configuration differ (common random numbers).
+#
+# With NumPy, variates are drawn in blocks of blockSize and handed out one
+# at a time, so the per-packet cost is a list index instead of a call into
+# the random module.  Without NumPy a random.Random per component is used.
+# Both seed MT19937 from the same key, so they draw the same numbers.
+
+# Returns the seed of the named component's generator, None when the
+# simulation is not seeded
+def componentSeed(seed, name):
+    if seed is None:
+        return None
+    return (seed & 0xffffffff) << 32 | (crc32(name.encode("utf-8")) & 0xffffffff)
+
+# Returns the 32-bit words, lowest first, that random.Random seeds MT19937
+# with for the seed seed, which drops the zero words above the highest
+# non-zero one, for NumPy to be seeded with the same key
+def seedKey(seed):
+    key = [seed & 0xffffffff]
+    seed >>= 32
+    while seed:
+        key.append(seed & 0xffffffff)
+        seed >>= 32
+    return key
+
+class RandomStream():
+    def __init__(self, seed, name, blockSize=4096):
+        self.name = name
+        self.blockSize = blockSize
+        self.reseed(seed)
+
+    # Restarts the generator from the simulation seed seed, dropping the
+    # variates already drawn
+    def reseed(self, seed):
+        seed = componentSeed(seed, self.name)
+        if numpy is not None:
+            if seed is not None:
+                seed = seedKey(seed)
+            self.gen = numpy.random.RandomState(seed)
+        else:
+            self.gen = random.Random(seed)
+        self.exps = []
+        self.expIndex = 0
+        self.unifs = []
+        self.unifIndex = 0
+
+    # Same as random.expovariate
+    def expovariate(self, lambd):
+        if self.expIndex == len(self.exps):
+            if numpy is not None:
+                self.exps = self.gen.standard_exponential(self.blockSize).tolist()
+            else:
+                self.exps = [self.gen.expovariate(1.0) for i in range(self.blockSize)]
+            self.expIndex = 0
+        x = self.exps[self.expIndex]
+        self.expIndex += 1
+        return x/lambd
+
+    # Returns a float in [0, 1)
+    def random(self):
+        if self.unifIndex == len(self.unifs):
+            if numpy is not None:
+                self.unifs = self.gen.random_sample(self.blockSize).tolist()
+            else:
+                self.unifs = [self.gen.random() for i in range(self.blockSize)]
+            self.unifIndex = 0
+        x = self.unifs[self.unifIndex]
+        self.unifIndex += 1
+        return x
+
+    # Same as random.randint, a and b are included
+    def randint(self, a, b):
+        return a + int(self.random()*(b - a + 1))
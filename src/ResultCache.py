@@ -0,0 +1,233 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+# Content-addressed cache of run summaries.  With Parameters.resultCache set
+# to a directory, Sim.run (and so Batch and every sweep) first looks for the
+# run there and only simulates it when it is missing.  A run is found by
+# the SHA-1 of:
+#   - every parameter (the scheduler, disk model and seed included) but
+#     those in ignoredParameters, as canonical JSON with whole floats as ints
+#   - the size and modification time of the files the parameters name
+#     (hddProfile, tunerWorkload, outputWorkload)
+#   - the simulator's code: every .py file of this directory, the kernel in
+#     SIM_KERNEL and the python version
+# so any change to the code is a miss.  Runs without a seed, or that write
+# files of their own (traceFile, liveFile, the mapped monitor), are never
+# cached.  Every entry is a gzipped JSON file holding the summary, the
+# seconds the run took and, with resultCacheSeries, the buffer level
+# series.  Entries are written atomically, so sweep workers can share the
+# directory.  Hits touch their entry.  Once the entries take more than
+# resultCacheSize bytes, the least recently used are removed.  Every lookup
+# is logged in stats.log:
+#   python ResultCache.py stats cachedir
+# shows the hit rate, the simulation time and bytes the hits saved, and the
+# entries, and 'python ResultCache.py clear cachedir' empties the cache.
+
+# Parameters that name input files, identified by their size and mtime
+fileParameters = ("hddProfile", "tunerWorkload", "outputWorkload")
+
+# Parameters that do not change the results: the cache's own and those of
+# outputs a cached run does not write
+ignoredParameters = ("resultCache", "resultCacheSize", "resultCacheSeries",
+                     "traceLevel", "monitorDir", "liveInterval", "liveSlots")
+
+codeVersion = []
+
+# Returns the hash of the simulator's code, read once per process
+def codeHash():
+    if not codeVersion:
+        import Engine
+        digest = hashlib.sha1()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(here, "*.py"))):
+            digest.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        digest.update(("%s %s"%(Engine.kernelName, sys.version_info[:2])).encode("utf-8"))
+        codeVersion.append(digest.hexdigest())
+    return codeVersion[0]
+
+# Returns whether a run of params can be cached
+def cacheable(params):
+    return (params.seed is not None and params.traceFile is None
+            and params.liveFile is None and params.monitorType != "mapped")
+
+# Returns val with its whole floats made ints, in its lists and dicts too,
+# so 5 and 5.0 (as a sweep file or the GUI may give it) make the same key
+def canonical(val):
+    if isinstance(val, float) and val.is_integer():
+        return int(val)
+    if isinstance(val, list):
+        return [canonical(item) for item in val]
+    if isinstance(val, dict):
+        return dict((name, canonical(item)) for name, item in val.items())
+    return val
+
+# Returns the key of a run of params, before Sim.prepare adds the
+# simulation's modules to them
+def key(params):
+    fields = {}
+    for name, val in vars(params).items():
+        if name in ignoredParameters or not isinstance(val, (type(None), bool, int, long, float, str, unicode, list, dict)):
+            continue
+        if name in fileParameters and val is not None:
+            stat = os.stat(val)
+            val = [val, stat.st_size, stat.st_mtime]
+        fields[name] = canonical(val)
+    text = json.dumps({"params":fields, "code":codeHash()}, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class ResultCache():
+    def __init__(self, directory, maxBytes=256*1024*1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json.gz")
+
+    # Returns the entry of key, None if it is missing or, when series is
+    # set, was stored without the series.  Misses are only logged with
+    # logMisses, so a run looked up again before it is simulated counts once.
+    def get(self, key, series=False, logMisses=True):
+        path = self.path(key)
+        try:
+            with gzip.open(path, "rb") as f:
+                entry = json.loads(f.read().decode("utf-8"))
+            size = os.path.getsize(path)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            if logMisses:
+                self.log("miss\n")
+            return None
+        if series and entry.get("series") is None:
+            if logMisses:
+                self.log("miss\n")
+            return None
+        self.log("hit %i %r\n"%(size, entry["wallTime"]))
+        return entry
+
+    # Stores summary under key, with the wall seconds the run took and the
+    # buffer level series {buffer: [times, levels]} if given
+    def put(self, key, summary, wallTime, series=None):
+        entry = {"summary":summary, "wallTime":wallTime, "series":series}
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                    f.write(json.dumps(entry, sort_keys=True).encode("utf-8"))
+            os.chmod(tmp, 0o644)
+            os.rename(tmp, self.path(key))
+        except:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    # Returns [(mtime, bytes, path)] of every entry
+    def entries(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.json.gz")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    # Removes the least recently used entries until the rest fit in maxBytes
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+                self.log("evict %i\n"%size)
+            except OSError:
+                pass
+            total -= size
+
+    # Appends a line to stats.log, whole even with other processes appending
+    def log(self, line):
+        fd = os.open(os.path.join(self.directory, "stats.log"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    # Returns the counts of stats.log and the entries
+    def stats(self):
+        hits = misses = evictions = 0
+        bytesSaved = 0
+        secondsSaved = 0.0
+        try:
+            with open(os.path.join(self.directory, "stats.log")) as f:
+                for line in f:
+                    fields = line.split()
+                    if not fields:
+                        continue
+                    if fields[0] == "hit":
+                        hits += 1
+                        bytesSaved += int(fields[1])
+                        secondsSaved += float(fields[2])
+                    elif fields[0] == "miss":
+                        misses += 1
+                    elif fields[0] == "evict":
+                        evictions += 1
+        except IOError:
+            pass
+        entries = self.entries()
+        return {"hits":hits, "misses":misses,
+                "hitRate":hits/float(hits + misses) if hits + misses else None,
+                "secondsSaved":secondsSaved, "bytesSaved":bytesSaved, "evictions":evictions,
+                "entries":len(entries), "bytes":sum(size for mtime, size, path in entries)}
+
+    def clear(self):
+        for mtime, size, path in self.entries():
+            os.remove(path)
+        if os.path.exists(os.path.join(self.directory, "stats.log")):
+            os.remove(os.path.join(self.directory, "stats.log"))
+
+def main(argv=None):
+    parser = ArgumentParser(description="Look after a result cache directory")
+    parser.add_argument("command", choices=("stats", "clear"))
+    parser.add_argument("directory")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.directory):
+        parser.error("%s is not a directory"%args.directory)
+    cache = ResultCache(args.directory)
+    if args.command == "clear":
+        cache.clear()
+        return
+    stats = cache.stats()
+    out = sys.stdout
+    out.write("hits            %i\n"%stats["hits"])
+    out.write("misses          %i\n"%stats["misses"])
+    if stats["hitRate"] is not None:
+        out.write("hit rate        %.1f%%\n"%(100*stats["hitRate"]))
+    out.write("seconds saved   %.1f\n"%stats["secondsSaved"])
+    out.write("bytes saved     %i\n"%stats["bytesSaved"])
+    out.write("entries         %i (%i bytes)\n"%(stats["entries"], stats["bytes"]))
+    out.write("evictions       %i\n"%stats["evictions"])
+
+if __name__ == "__main__":
+    main()
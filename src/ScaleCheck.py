@@ -0,0 +1,70 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import sys
+from argparse import ArgumentParser
+from Sweep import makeTasks, sweep
+
+# Tuner capacity of disk arrays and CPUs.  For every disk count, core count
+# and RAID mode the most tuners that run without an overflow or underflow
+# is found by bisection, running the midpoints of every configuration
+# together as one sweep.  Run with 'python ScaleCheck.py'.  With --stop,
+# runs end at their first overflow or underflow, or once their metrics
+# converge (see Stopping.py), instead of at maxSimTime.
+
+def main(argv=None):
+    parser = ArgumentParser(description="Find the tuner capacity of disk arrays and multi-core CPUs")
+    parser.add_argument("-d", "--disks", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("-c", "--cores", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("-m", "--modes", nargs="+", default=["stripe", "mirror"])
+    parser.add_argument("-n", "--maxTuners", type=int, default=128)
+    parser.add_argument("-t", "--maxSimTime", type=float, default=30000)
+    parser.add_argument("-s", "--seed", type=int, default=1)
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument("--stop", action="store_true",
+                        help="end runs by the stopping rule instead of at maxSimTime")
+    args = parser.parse_args(argv)
+
+    # A single disk is the same in every mode
+    base = {"maxSimTime":args.maxSimTime}
+    if args.stop:
+        base["stopRule"] = True
+
+    configs = [(mode, disks, cores) for mode in args.modes for disks in args.disks
+               for cores in args.cores if disks > 1 or mode == args.modes[0]]
+
+    # {config: [most tuners known to run clean, fewest known to fault]}
+    bounds = dict((config, [0, args.maxTuners + 1]) for config in configs)
+    while True:
+        points = []
+        for config in configs:
+            low, high = bounds[config]
+            if high - low > 1:
+                mode, disks, cores = config
+                points.append({"raidMode":mode, "numDisks":disks, "numCores":cores,
+                               "numTuners":(low + high)//2})
+        if not points:
+            break
+        for result in sweep(makeTasks(points, [args.seed], base), args.jobs):
+            point = result["overrides"]
+            config = (point["raidMode"], point["numDisks"], point["numCores"])
+            faulted = result["overflows"] or result["underflows"]
+            bounds[config][1 if faulted else 0] = point["numTuners"]
+
+    out = sys.stdout
+    out.write("%-8s %6s %6s %8s\n"%("mode", "disks", "cores", "tuners"))
+    for config in configs:
+        mode, disks, cores = config
+        out.write("%-8s %6i %6i %8i\n"%(mode if disks > 1 else "-", disks, cores, bounds[config][0]))
+
+if __name__ == "__main__":
+    main()
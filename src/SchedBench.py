@@ -0,0 +1,95 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import random
+import sys
+import time
+from Engine import initialize
+from Data import IORequest, BufferControl
+from Simulation import Parameters
+from Schedule import DLScheduler, EDFScheduler
+
+# Microbenchmark of the deadline schedulers.  Each scheduler is given the
+# same queue of requests with random deadlines, then drained the way the HDD
+# cache drains it.  The requests come round robin from the default number of
+# streams, each reading or writing its file in extents laid out on the disk
+# as BufferControl.nextAddress lays them out.  Run with 'python SchedBench.py'
+#
+# EDFScheduler is slower than DLScheduler on short queues and only wins on
+# long ones.  Python 2.7, best of 20, over three runs:
+#   queued  speed-up
+#       10  0.5-0.6x
+#      100  0.7-0.8x
+#     1000  1.9-3.0x
+# With one request per stream, the default box never queues more than 12.
+
+# Stands in for a BufferControl so requests can be made without a simulation
+class BenchRequester():
+    def __init__(self, rand, params):
+        self.rand = rand
+        self.diskSize = params.hddCapacity
+        self.extentSize = params.extentSize
+        self.extentLeft = 0
+
+    nextAddress = BufferControl.__dict__["nextAddress"]
+
+    def computeDeadline(self):
+        return self.rand.uniform(0, 1000)
+
+def makeRequests(n, seed=1):
+    params = Parameters()
+    rand = random.Random(seed)
+    requesters = [BenchRequester(rand, params) for i in range(params.numTuners + params.numOutputs)]
+    reqs = []
+    for i in range(n):
+        requester = requesters[i % len(requesters)]
+        reqs.append(IORequest(requester, 2048, requester.nextAddress(2048), rand.randint(0, 1)))
+    return reqs
+
+# Drains a DLScheduler one schedule() batch at a time
+def drainDL(reqs):
+    sched = DLScheduler()
+    for req in reqs:
+        sched.add(req)
+    while sched.newReqsQ:
+        sched.schedule()
+        while sched.sortedReqsQ:
+            sched.nextRequest()
+
+def drainEDF(reqs):
+    sched = EDFScheduler()
+    for req in reqs:
+        sched.add(req)
+    while len(sched):
+        sched.nextRequest()
+
+# Returns the best wall time, in ms, of repeat runs of drain
+def timeDrain(drain, reqs, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        drain(reqs)
+        elapsed = 1000*(time.time() - start)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(sizes=(10, 100, 1000), repeat=20):
+    initialize()
+    sys.stdout.write("%8s %16s %16s %8s\n"%("queued", "DLScheduler ms", "EDFScheduler ms", "speedup"))
+    for n in sizes:
+        reqs = makeRequests(n)
+        dl = timeDrain(drainDL, reqs, repeat)
+        edf = timeDrain(drainEDF, reqs, repeat)
+        sys.stdout.write("%8i %16.3f %16.3f %7.1fx\n"%(n, dl, edf, dl/max(edf, 1e-6)))
+
+if __name__ == "__main__":
+    main()
@@ -9,32 +9,157 @@ __email__ = "ptyler@calpoly.edu"
 __status__ = "Developement"
 
 # Imports------------------
-from SimPy.Simulation import *
-from Data import IORequest
+from Engine import *
+from bisect import bisect_left, bisect_right
+from collections import deque
+from heapq import heappush, heappop
+from Data import byDeadline, byAddress
+import Trace
 
 # This module represents the IO scheduler in the linux kernel.  It keeps two
 # lists: a FIFO list that IO requesters add their newly-created requests to
 # and a sorted list the HDD pulls requests from.
+#
+# With maxMergeSize set, a request that follows or precedes a queued request
+# of the same direction on the disk is merged into it, as the Linux block
+# layer back and front merges bios into requests, so long as the merged
+# request is no more than maxMergeSize kBs.  The queued requests are indexed
+# by (direction, start LBA) and (direction, end LBA), so a merge is found
+# with one lookup of each.  The merged request takes the earlier of the two
+# deadlines and completes the requests merged into it when it completes.
+#
+# When polling is set, the scheduler re-checks its lists every waitInterval
+# ms and leaves sorted requests in the FIFO list, so they are sorted and
+# handed to the cache again, as the simulator originally did.  Otherwise it
+# sleeps on reqAdded/drained and sorted requests are taken off the FIFO list.
 class Scheduler(Process):
     def __init__(self):
         Process.__init__(self, name="Scheduler");
         self.newReqsQ = []
         self.sortedReqsQ = []
         self.minReqs2Schedule = 5
+        self.totalOps = 0
+        self.polling = False
+        self.traceId = Trace.component(self.name)
+
+        # {(write, LBA): request} of the queued requests that can still be
+        # merged into, by their first and their last LBA
+        self.maxMergeSize = 0 # kBs
+        self.byStart = {}
+        self.byEnd = {}
+        self.frontMerges = 0
+        self.backMerges = 0
+
+        # reqAdded: a requester added a request, reqReady: requests can be
+        # taken with nextRequest(), drained: the sorted list was emptied
+        self.reqAdded = SimEvent(name="%s: Request Added"%self.name)
+        self.reqReady = SimEvent(name="%s: Request Ready"%self.name)
+        self.drained = SimEvent(name="%s: Sorted Requests Drained"%self.name)
 
     # Called by IO request creators
     def add(self, IOReq):
+        if self.maxMergeSize and IOReq.size and self.merge(IOReq):
+            return
+        self.queue(IOReq)
+
+    # Queues a request that was not merged
+    def queue(self, IOReq):
         self.newReqsQ.append(IOReq)
+        self.reqAdded.signal()
+
+    # Merges IOReq into a queued request it follows (a back merge) or
+    # precedes (a front merge) and returns True, or indexes it and returns
+    # False
+    def merge(self, IOReq):
+        start = (IOReq.write, IOReq.diskAddress)
+        end = (IOReq.write, IOReq.diskAddress + IOReq.size)
+        back = self.byEnd.get(start)
+        if back is not None and back.size + IOReq.size <= self.maxMergeSize:
+            del self.byEnd[start]
+            back.size += IOReq.size
+            self.byEnd[end] = back
+            back.absorb(IOReq)
+            self.backMerges += 1
+            self.mergeDeadline(back, IOReq)
+            return True
+        front = self.byStart.get(end)
+        if front is not None and front.size + IOReq.size <= self.maxMergeSize:
+            del self.byStart[end]
+            front.diskAddress = IOReq.diskAddress
+            front.size += IOReq.size
+            self.byStart[start] = front
+            front.absorb(IOReq)
+            self.moved(front, end[1])
+            self.frontMerges += 1
+            self.mergeDeadline(front, IOReq)
+            return True
+        self.byStart[start] = IOReq
+        self.byEnd[end] = IOReq
+        return False
+
+    # Called after a front merge moved the start of IOReq from diskAddress.
+    # A request that was already sorted is moved to its new place in the
+    # sorted list; the FIFO list is sorted every time it is scheduled.
+    def moved(self, IOReq, diskAddress):
+        if IOReq in self.sortedReqsQ:
+            self.sortedReqsQ.remove(IOReq)
+            addresses = [req.diskAddress for req in self.sortedReqsQ]
+            self.sortedReqsQ.insert(bisect_right(addresses, IOReq.diskAddress), IOReq)
+
+    # Gives IOReq the deadline of the request merged into it if that is
+    # earlier
+    def mergeDeadline(self, IOReq, merged):
+        if merged.deadline < IOReq.deadline:
+            IOReq.deadline = merged.deadline
+            self.hastened(IOReq)
+
+    # Called after a merge made the deadline of IOReq earlier.  The FIFO
+    # list is sorted (by deadline in DLScheduler) every time it is
+    # scheduled, so it has nothing to move.
+    def hastened(self, IOReq):
+        pass
+
+    # Called by the cache as it takes IOReq, which can no longer be merged
+    # into
+    def unindex(self, IOReq):
+        if not self.maxMergeSize:
+            return
+        start = (IOReq.write, IOReq.diskAddress)
+        end = (IOReq.write, IOReq.diskAddress + IOReq.size)
+        if self.byStart.get(start) is IOReq:
+            del self.byStart[start]
+        if self.byEnd.get(end) is IOReq:
+            del self.byEnd[end]
+
+    def __len__(self):
+        return len(self.newReqsQ) + len(self.sortedReqsQ)
 
     # Called by the HDD's cache for the next request to be written to
     # the HDD
     def nextRequest(self):
-        return self.sortedReqsQ.pop(0)
+        IOReq = self.sortedReqsQ.pop(0)
+        if not self.sortedReqsQ:
+            self.drained.signal()
+        return IOReq
+
+    # Removes and returns every queued request, oldest first, so another
+    # scheduler can take them over
+    def takeRequests(self):
+        reqs = []
+        for IOReq in self.sortedReqsQ + self.newReqsQ:
+            if IOReq not in reqs:
+                reqs.append(IOReq)
+        self.sortedReqsQ = []
+        self.newReqsQ = []
+        return sorted(reqs, key=lambda IOReq: IOReq.id)
 
     # Sorts requests (This one is bases on diskAddress)
     def schedule(self):
-        print "NOW SORTING %i items at %i"%(len(self.newReqsQ),now())
-        self.sortedReqsQ = sorted(self.newReqsQ,key=IORequest.diskAddress)
+        if Trace.tracingDebug:
+            Trace.record(now(), self.traceId, Trace.SCHED_SORT, 0, len(self.newReqsQ))
+        self.sortedReqsQ = sorted(self.newReqsQ, key=byAddress)
+        if not self.polling:
+            self.newReqsQ = []
         return len(self.sortedReqsQ)
 
     # A continuous process that waits for the schedulers sorted list to empty
@@ -43,15 +168,25 @@ class Scheduler(Process):
         while True:
             if len(self.sortedReqsQ):
                 #print "%s still has %i sorted requests, waiting %ims, now:%i"%(self.name, len(self.sortedReqsQ), interval, now())
-                yield hold, self, interval
+                if self.polling:
+                    yield hold, self, interval
+                else:
+                    yield waitevent, self, self.drained
             else:
                 if len(self.newReqsQ) >= self.minReqs2Schedule:
                     yield request, self, cpu
-                    yield hold, self, cpu.processTime(self.schedule())
+                    ops = self.schedule()
+                    self.reqReady.signal()
+                    self.totalOps += ops
+                    yield hold, self, cpu.processTime(ops)
                     yield release, self, cpu
                 else:
-                    print "%s's newReqQ: %i requests, sorted: %i, waiting %ims"%(self.name, len(self.newReqsQ), len(self.sortedReqsQ), interval)
-                    yield hold, self, interval
+                    if Trace.tracingDebug:
+                        Trace.record(now(), self.traceId, Trace.SCHED_IDLE, 0, len(self.newReqsQ))
+                    if self.polling:
+                        yield hold, self, interval
+                    else:
+                        yield waitevent, self, self.reqAdded
 
 class DLScheduler(Scheduler):
     def __init__(self):
@@ -61,22 +196,237 @@ class DLScheduler(Scheduler):
     def avgProcessingTime(self,IOReq):
         return 50
 
+    # Takes the requests in deadline order until the earliest deadline's
+    # time is used up, and sorts them by LBA
     def schedule(self):
-        self.newReqsQ = sorted(self.newReqsQ,key=IORequest.deadline)
-        IO = self.newReqsQ.pop(0)
-        time = IO.deadline - now()
-        print "Trying to schedule %i reqs with %f ms at %i"%(len(self.newReqsQ),time,now())
-
-        while True:
-            self.sortedReqsQ.append(IO)
+        queue = sorted(self.newReqsQ, key=byDeadline)
+        time = queue[0].deadline - now()
+        n = 0
+        for IO in queue:
+            n += 1
             time -= self.avgProcessingTime(IO)
             if time < 0:
                 break
-            try:
-                IO = self.newReqsQ.pop(0)
-            except IndexError:
-                break
+        self.newReqsQ = queue[n:]
+        self.sortedReqsQ = sorted(self.sortedReqsQ + queue[:n], key=byAddress)
+        if Trace.tracingDebug:
+            Trace.record(now(), self.traceId, Trace.SCHED_BATCH, 0, len(self.sortedReqsQ))
+        return pow(len(self.sortedReqsQ),2)
+
+# Keeps the queued requests in an LBA ordered index as they arrive, so the
+# next request is found with a binary search instead of re-sorting the whole
+# queue, and is removed from the index once dispatched.  This is SCAN (or
+# LOOK, the head turns around at the last request instead of the disk's
+# edge): the head keeps sweeping one way until no requests are ahead of it.
+class ElevatorScheduler(Scheduler):
+    def __init__(self):
+        Scheduler.__init__(self)
+        self.lbas = []
+        self.reqs = []
+        self.headPos = 0
+        self.ascending = True
+
+        # Operations done since the CPU was last charged for them
+        self.ops = 0
+
+    def queue(self, IOReq):
+        self.insert(IOReq)
+        self.reqAdded.signal()
+        self.reqReady.signal()
+
+    # Places a request in the index, after any requests with the same LBA
+    def insert(self, IOReq):
+        i = bisect_right(self.lbas, IOReq.diskAddress)
+        self.lbas.insert(i, IOReq.diskAddress)
+        self.reqs.insert(i, IOReq)
+        self.ops += len(self.lbas).bit_length()
+
+    # Moves a front merged request to its new LBA in the index.  It is not
+    # in the index while it waits in an NStepScheduler's FIFO queue.
+    def moved(self, IOReq, diskAddress):
+        i = bisect_left(self.lbas, diskAddress)
+        while i < len(self.lbas) and self.lbas[i] == diskAddress:
+            if self.reqs[i] is IOReq:
+                del self.lbas[i]
+                del self.reqs[i]
+                ElevatorScheduler.insert(self, IOReq)
+                return
+            i += 1
+
+    def nextRequest(self):
+        if not self.reqs:
+            raise IndexError("no requests queued")
+        i = self.pick()
+        self.ops += len(self.lbas).bit_length()
+        del self.lbas[i]
+        IOReq = self.reqs.pop(i)
+        self.headPos = IOReq.diskAddress
+        return IOReq
+
+    # Returns the index of the request to dispatch next
+    def pick(self):
+        if self.ascending:
+            i = bisect_left(self.lbas, self.headPos)
+            if i < len(self.lbas):
+                return i
+            self.ascending = False
+        i = bisect_right(self.lbas, self.headPos)
+        if i > 0:
+            return i-1
+        self.ascending = True
+        return 0
+
+    def __len__(self):
+        return len(self.reqs)
+
+    def takeRequests(self):
+        reqs = self.reqs
+        self.lbas = []
+        self.reqs = []
+        return sorted(reqs, key=lambda IOReq: IOReq.id)
+
+    # Requests are ordered as they are added, so this process only charges
+    # the CPU for the index operations done since it last ran.
+    def sortRequests(self, interval, cpu):
+        while True:
+            if self.ops:
+                ops = self.ops
+                self.ops = 0
+                self.totalOps += ops
+                yield request, self, cpu
+                yield hold, self, cpu.processTime(ops)
+                yield release, self, cpu
+            elif self.polling:
+                yield hold, self, interval
+            else:
+                yield waitevent, self, self.reqAdded
+
+# C-LOOK: the head only services requests while moving towards higher LBAs,
+# then jumps back to the lowest queued LBA.
+class CLOOKScheduler(ElevatorScheduler):
+    def pick(self):
+        i = bisect_left(self.lbas, self.headPos)
+        if i == len(self.lbas):
+            return 0
+        return i
+
+# N-step SCAN: new requests wait in a FIFO queue, and only stepSize of them
+# at a time are moved into the index and swept, so a stream of requests near
+# the head cannot starve the others.
+class NStepScheduler(ElevatorScheduler):
+    def __init__(self, stepSize):
+        ElevatorScheduler.__init__(self)
+        self.stepSize = stepSize
+        self.waiting = deque()
+
+    def queue(self, IOReq):
+        self.waiting.append(IOReq)
+        self.reqAdded.signal()
+        self.reqReady.signal()
+
+    def nextRequest(self):
+        if not self.reqs:
+            for i in range(min(self.stepSize, len(self.waiting))):
+                self.insert(self.waiting.popleft())
+        return ElevatorScheduler.nextRequest(self)
+
+    def __len__(self):
+        return len(self.reqs) + len(self.waiting)
+
+    def takeRequests(self):
+        reqs = ElevatorScheduler.takeRequests(self) + list(self.waiting)
+        self.waiting.clear()
+        return reqs
+
+# Earliest deadline first, in the style of Linux's mq-deadline.  The same
+# requests are kept in a deadline heap and in the LBA index.  Requests are
+# dispatched in SCAN order in batches sized so the earliest deadline can
+# still be met (the DLScheduler's budget), and once the earliest deadline
+# has expired that request is promoted ahead of the sweep, which then
+# carries on from its LBA.  Heap entries of requests dispatched by the sweep
+# are dropped lazily when they reach the top of the heap.  Keeping the heap
+# and the index costs more than DLScheduler's sort on short queues, so EDF
+# is only faster from about 300 queued requests on (see SchedBench.py).
+class EDFScheduler(ElevatorScheduler):
+    def __init__(self, avgReqTime=50):
+        ElevatorScheduler.__init__(self)
+        self.avgReqTime = avgReqTime # ms
+        self.deadlines = []
+        self.queued = set()
+        self.batchLeft = 0
+        self.promotions = 0
+
+    def insert(self, IOReq):
+        ElevatorScheduler.insert(self, IOReq)
+        heappush(self.deadlines, (IOReq.deadline, IOReq.id, IOReq))
+        self.queued.add(IOReq.id)
+        self.ops += len(self.deadlines).bit_length()
+
+    # Pushes the earlier deadline of a merged request onto the heap.  The
+    # entry of its old deadline is dropped once the request is dispatched.
+    def hastened(self, IOReq):
+        if IOReq.id in self.queued:
+            heappush(self.deadlines, (IOReq.deadline, IOReq.id, IOReq))
+            self.ops += len(self.deadlines).bit_length()
+
+    def takeRequests(self):
+        self.deadlines = []
+        self.queued.clear()
+        self.batchLeft = 0
+        return ElevatorScheduler.takeRequests(self)
+
+    # Returns the queued request with the earliest deadline
+    def earliest(self):
+        while self.deadlines[0][1] not in self.queued:
+            heappop(self.deadlines)
+            self.ops += len(self.deadlines).bit_length()
+        return self.deadlines[0][2]
+
+    # Removes a request from the LBA index
+    def remove(self, IOReq):
+        i = bisect_left(self.lbas, IOReq.diskAddress)
+        while self.reqs[i] is not IOReq:
+            i += 1
+        del self.lbas[i]
+        del self.reqs[i]
+        self.ops += len(self.lbas).bit_length()
+
+    def nextRequest(self):
+        if not self.reqs:
+            raise IndexError("no requests queued")
+        if self.batchLeft <= 0:
+            first = self.earliest()
+            budget = first.deadline - now()
+            if budget < 0:
+                heappop(self.deadlines)
+                self.queued.discard(first.id)
+                self.remove(first)
+                self.headPos = first.diskAddress
+                self.promotions += 1
+                return first
+            self.batchLeft = max(1, int(budget/self.avgReqTime))
+        self.batchLeft -= 1
+        IOReq = ElevatorScheduler.nextRequest(self)
+        self.queued.discard(IOReq.id)
+        return IOReq
+
+# Scheduler names accepted for Parameters.schedType
+schedulers = {"sort":Scheduler, "deadline":DLScheduler, "scan":ElevatorScheduler,
+              "clook":CLOOKScheduler, "nstep":NStepScheduler, "edf":EDFScheduler}
 
-        self.sortedReqsQ = sorted(self.sortedReqsQ,key=IORequest.diskAddress)
-        print self.sortedReqsQ
-        return pow(len(self.sortedReqsQ),2)
\ No newline at end of file
+# Instantiates the scheduler chosen in the simulation's parameters, renamed
+# to name when given
+def makeScheduler(params, name=None):
+    if params.schedType not in schedulers:
+        raise ValueError("Unknown scheduler: %s"%params.schedType)
+    if params.schedType == "nstep":
+        sched = NStepScheduler(params.nStepSize)
+    else:
+        sched = schedulers[params.schedType]()
+    sched.polling = params.polling
+    # A merged request must fit in the HDD's cache
+    sched.maxMergeSize = min(params.maxMergeSize, params.hddCacheSize)
+    if name is not None:
+        sched.name = name
+        sched.traceId = Trace.component(name)
+    return sched
@@ -1,22 +1,35 @@
 # Import Python Standard Modules
+import json
 import os
 import platform
 import sys
+import tempfile
 
 # Import third-party modules
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
-from SimPy.Simulation import *
+from Engine import *
 
 # Import local modules
-from Simulation import Sim
+import Live
+from Simulation import Sim, Parameters
 
-class MainWindow(QMainWindow, Process):
+# The simulation runs in a 'python -m Batch' worker process writing a live
+# view file (see Live.py), and the window reads its newest snapshot every
+# refresh ms, so drawing the window never holds up the simulation and a busy
+# simulation never freezes the window.
+refresh = 100 # ms
+
+class MainWindow(QMainWindow):
     def __init__(self, parent=None):
         super(MainWindow, self).__init__(parent)
-        Process.__init__(self, name="Main Window")
         self.simDataMenuActs = []
         self.simData = Sim()
+        self.worker = None
+        self.reader = None
+        self.liveFile = None
+        self.timer = QTimer(self)
+        self.connect(self.timer, SIGNAL('timeout()'), self.poll)
 
         # Initialize Simulation
         self.createMainDialog()
@@ -39,7 +52,7 @@ class MainWindow(QMainWindow, Process):
         simAct = self.createAction("Reset Sim", self.createMainDialog,
                     tip="Reset all Simulation modules")
         self.simDataMenu.addAction(simAct)
-        simAct = self.createAction("Stop Sim", self.simData.stop,
+        simAct = self.createAction("Stop Sim", self.stopSimulation,
                     tip="Cancel Current Simulation")
         self.simDataMenu.addAction(simAct)
         
@@ -74,29 +87,80 @@ class MainWindow(QMainWindow, Process):
             act.setCheckable(True)
         return act
 
-    def postErrors(self):
-        while True:
-            while len(self.simData.errors):
-                self.textBrowser.append(self.simData.errors.pop(0))
-            self.repaint()
-            yield hold, self, 100
+    # Returns the Batch arguments of the parameters that differ from the
+    # defaults
+    def batchArgs(self):
+        defaults = vars(Parameters())
+        args = []
+        for name, val in sorted(vars(self.simData.params).items()):
+            if name in defaults and isinstance(val, (type(None), bool, int, long, float, str, unicode, list, dict)) \
+                    and val != defaults[name]:
+                args += ["-s", "%s=%s"%(name, json.dumps(val))]
+        return args
 
     def simulate(self):
+        if self.worker is not None:
+            return
         self.createMainDialog()
         self.textBrowser.append("<b>Beginning Simulation...</b>")
-        self.simData.activate()
-        activate(self.simData.dialog, self.simData.dialog.updateLabels(), at=10)
-        activate(self.simData.statusBar, self.simData.statusBar.updateStatusBar(), at=10)
-        activate(self, self.postErrors())
-        self.simData.simulate()
-        self.simData.statusBar.progressBar.setValue(self.simData.params.maxSimTime)
-        self.textBrowser.append("Done!")
+        self.simData.statusBar.start()
+        fd, self.liveFile = tempfile.mkstemp(suffix=".live")
+        os.close(fd)
+        os.remove(self.liveFile)
+        self.worker = Live.spawn(self.liveFile, self.batchArgs())
+        self.logged = {}
+        self.timer.start(refresh)
+
+    def stopSimulation(self):
+        if self.worker is not None and self.worker.poll() is None:
+            self.worker.terminate()
+
+    # Shows the worker's newest snapshot, and once it is done, the end
+    def poll(self):
+        if self.reader is None:
+            try:
+                self.reader = Live.Reader(self.liveFile, timeout=0)
+            except IOError:
+                if self.worker.poll() is not None:
+                    self.finish("<font color=red>The simulation did not start</font>")
+                return
+        seq, done = self.reader.status()
+        snapshot = self.reader.latest()
+        if snapshot is not None:
+            self.simData.dialog.updateLabels(snapshot)
+            self.simData.statusBar.progressBar.setValue(int(snapshot["time"]))
+            self.postErrors(snapshot)
+        if done:
+            self.simData.statusBar.progressBar.setValue(self.simData.params.maxSimTime)
+            self.finish("Done!")
+        elif self.worker.poll() is not None:
+            self.finish("<font color=red>Stopped</font>")
+
+    # Logs every stream whose faults started growing since the last snapshot
+    def postErrors(self, snapshot):
+        for name in self.reader.streams:
+            faults = snapshot["streams"][name]["faults"]
+            last, growing = self.logged.get(name, (0, False))
+            if faults > last and not growing:
+                kind = "overflow" if name.startswith("Tuner") else "underflow"
+                self.textBrowser.append("<font color=red>%s Buffer %s at %.3f</font>"%(name, kind, snapshot["time"]))
+            self.logged[name] = (faults, faults > last)
+
+    def finish(self, message):
+        self.timer.stop()
+        self.worker.wait()
+        self.worker = None
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        if os.path.exists(self.liveFile):
+            os.remove(self.liveFile)
+        self.textBrowser.append(message)
         self.statusBar().statusLabel.setText("Finished Simulation")
 
-class SimDialog(QLabel, Process):
+class SimDialog(QLabel):
     def __init__(self, vars, parent=None):
         QLabel.__init__(self, parent)
-        Process.__init__(self, name="Monitoring Dialog Box")
         self.setMinimumSize(300,300)
         self.vars = vars
         self.labels = []
@@ -123,34 +187,27 @@ class SimDialog(QLabel, Process):
         for i in xrange(self.numVars):
             self.labels[i].setValue(0)
 
-    def updateLabels(self):
-        while True:
-            self.vars.updateVals()
-            for i in xrange(self.numVars):
-                if self.vars.maxVals[i] is not None:
-                    self.labels[i].setValue(self.vars.vals[i])
-                else:
-                    self.labels[i].setText(str(self.vars.vals[i]))
-            app.processEvents()
-            yield hold, self, 100
+    # Shows the buffer levels of a live view snapshot
+    def updateLabels(self, snapshot):
+        for i in xrange(self.numVars):
+            val = snapshot["streams"][self.vars.names[i]]["level"]
+            if self.vars.maxVals[i] is not None:
+                self.labels[i].setValue(val)
+            else:
+                self.labels[i].setText(str(val))
 
-class SimStatusBar(QStatusBar, Process):
+class SimStatusBar(QStatusBar):
     def __init__(self, sim, parent=None):
         QStatusBar.__init__(self, parent)
-        Process.__init__(self, name="Simulation Status Bar")
         self.simData = sim
 
-    def updateStatusBar(self):
-        print "hello"
+    def start(self):
         self.progressBar = QProgressBar(self)
         self.progressBar.setMaximum(self.simData.params.maxSimTime)
         self.addWidget(self.progressBar)
         self.statusLabel = QLabel("Simulating...")
         self.addPermanentWidget(self.statusLabel)
         self.repaint()
-        while True:
-            self.progressBar.setValue(self.simData.currTime())
-            yield hold, self, 100
 
 class ParamDialog(QDialog):
     def __init__(self, sim, parent=None):
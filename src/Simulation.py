@@ -9,20 +9,36 @@ __email__ = "ptyler@calpoly.edu"
 __status__ = "Developement"
 
 # Imports------------------
-from SimPy.Simulation import *
-from Schedule import Scheduler, DLScheduler
-from HDD import HDD
+import random
+import time
+from Engine import *
+from Schedule import makeScheduler
+from Array import DiskArray
+from HDD import DiskGeometry
 from Stream import *
 from System import *
+from Monitors import makeMonitor, Histogram
+from Data import stages
+import Trace
+import Live
+from Stopping import Stopper
+from Workload import PacketTrace
+import ResultCache
 
 class Parameters():
     def __init__(self):
         self.maxSimTime=500000 # ms
         self.hddCacheSize=16000 # kBs
         self.hddTrackMove=1.63 # ms
-        self.hddMaxTurn=10 # ms
-        self.hddRWkBpms=110 # kBs per ms
+        self.hddMaxTurn=10 # ms per turn of the platters
+        self.hddRWkBpms=110 # kBs per ms on the outermost zone
         self.hddFullStroke=28.55 # ms
+        self.hddCapacity=500*1024*1024 # kBs
+        self.hddCylinders=100000 # Cylinders, the seek table has one entry per cylinder
+        self.hddZones=16 # Zones of cylinders with their own transfer rate
+        self.hddInnerRate=0.5 # Rate of the innermost zone, as a part of hddRWkBpms
+        self.hddProfile=None # JSON vendor profile of the disk's geometry, None to build it from the hdd parameters
+        self.extentSize=65536 # kBs of a file laid out together on the disk
         self.baseChanceATR=0 # Percent
         self.iBSize=8000  # kBs
         self.oBSize=8000 # kBs
@@ -30,6 +46,10 @@ class Parameters():
         self.numOutputs=2 # mb per s
         self.tunerBitrate = 20 # mb per s
         self.outputBitrate = 20 # mb per s
+        self.tunerWorkload = None # Workload file every tuner replays instead of packets at tunerBitrate (see Workload.py), None for none
+        self.outputWorkload = None # Workload file every output replays instead of packets at outputBitrate, None for none
+        self.workloadShift = 0 # ms each stream starts later in its workload than the one before it
+        self.workloadLoop = True # True to replay a workload from its start once it ends, False to stop the stream
         self.iInterval=100 # ms
         self.oInterval=100 # ms
         self.iThreshhold=2048 # kBs
@@ -42,6 +62,48 @@ class Parameters():
         self.CPUnumMsPerOp = 0.01 # ms
         self.RAMtranSpeed = 0.00026 # ms per kB
         self.RAMoverhead = .00007 # ms
+        self.schedType = "sort" # sort, deadline, scan, clook, nstep or edf
+        self.nStepSize = 16 # Requests swept at a time by the nstep scheduler
+        self.numDisks = 1 # Disks in the array, each with its own scheduler and cache
+        self.raidMode = "stripe" # stripe or mirror, how the array spreads requests over its disks
+        self.stripeSize = 256 # kBs in each chunk of a striped request
+        self.numCores = 1 # CPU cores
+        self.flushMode = "single" # single: a RAM bus transfer per completed request, batch: scatter-gather batches
+        self.flushMaxBatch = 8192 # kBs most moved in one batch flush
+        self.maxMergeSize = 4096 # kBs a scheduler may merge adjacent requests into (at most hddCacheSize), 0 to not merge
+        self.flushWatermark = None # Part of the HDD cache filled that starts a flush, None for only when full or idle
+        self.fluid = False # True for streams that flow at their bitrate instead of in packets
+        self.polling = False # True to poll every waitInterval ms, as the original simulator did (its dispatch order, not its seeded results)
+        self.seed = None # Seed of every random number stream, None for system time
+        self.rngBlockSize = 4096 # Variates drawn at a time by each component's generator
+        self.traceFile = None # Binary event trace file, None for no trace
+        self.traceLevel = Trace.EVENT # Trace.OFF, Trace.EVENT or Trace.DEBUG
+        self.monitorType = "list" # Buffer level monitor: list, stats, sampled or mapped
+        self.monitorInterval = 100 # ms averaged into each sample of the sampled monitor
+        self.monitorDir = "." # Directory of the mapped monitor's files, in a run-<pid>-<run> directory of each run
+        self.liveFile = None # Shared memory file of the live view's snapshots (see Live.py), None for no live view
+        self.liveInterval = 100 # ms between live view snapshots
+        self.liveSlots = 4096 # Snapshots kept in the live view's ring
+        self.stopRule = False # True to end the run once the stopMetrics converge (see Stopping.py), instead of at maxSimTime
+        self.stopMetrics = ["inputLevel", "outputLevel", "outputLevelP5", "writeLatency", "readLatency", "faultRate"] # Metrics the stopping rule waits for
+        self.stopPrecision = 0.1 # Half width of every metric's confidence interval, as a part of its mean
+        self.stopConfidence = 0.95 # Confidence level of the intervals
+        self.stopInterval = 1000 # ms of each observation of the metrics
+        self.stopBatches = 20 # Batches the observations after the warm-up are cut into
+        self.stopMinBatchSize = 5 # Fewest observations in a batch
+        self.stopOnFault = True # True to end the run at the first overflow or underflow
+        self.resultCache = None # Directory of the result cache Sim.run looks runs up in (see ResultCache.py), None for no cache
+        self.resultCacheSize = 256*1024*1024 # bytes the result cache's entries may take
+        self.resultCacheSeries = False # True to also cache the buffer level series
+
+    # Applies a dictionary of {parameter name: value} overrides.  Only
+    # parameters that already exist can be overridden so a typo in a sweep
+    # definition does not silently run the default configuration.
+    def update(self, overrides):
+        for name, val in overrides.items():
+            if not hasattr(self, name):
+                raise ValueError("Unknown parameter: %s"%name)
+            setattr(self, name, val)
 
 class Variables():
     def __init__(self, sim):
@@ -66,12 +128,43 @@ class Variables():
         for stream in self.sim.streams:
             self.vals.append(stream.requester.buffer.amount)
 
+# Writes a snapshot of the simulation to the live view file every interval
+# ms, see Live.py.  Streams added by applyVariant are not in the snapshots.
+class Publisher(Process):
+    def __init__(self, sim):
+        Process.__init__(self, name="Live View Publisher")
+        params = sim.params
+        self.streams = list(sim.streams)
+        self.hdds = params.array.hdds
+        self.writer = Live.Writer(params.liveFile, [stream.name for stream in self.streams],
+                                  [hdd.name for hdd in self.hdds], params.liveSlots, params.liveInterval)
+
+    def publish(self, interval):
+        while True:
+            values = []
+            for stream in self.streams:
+                values += [stream.requester.buffer.amount, stream.faults.count]
+            for hdd in self.hdds:
+                cache = hdd.cache
+                values += [cache.buffer.amount, len(cache.sched), len(cache.openReqs),
+                           len(cache.closedReqs), hdd.busyTime, hdd.reqsDone]
+            self.writer.write(now(), values)
+            yield hold, self, interval
+
 # Main Simulation Function
 class Sim():
-    def __init__(self):
-        self.params = Parameters()
+    def __init__(self, params=None):
+        if params is None:
+            params = Parameters()
+        self.params = params
         self.vars = Variables(self)
-        self.errors = []
+        self.publisher = None
+        self.stopper = None
+        self.workloads = {}
+        self.cacheHit = False
+        # Series of a run returned from the result cache, None if they were
+        # not stored with it
+        self.cachedSeries = None
 
     def currTime(self):
         return now()
@@ -82,36 +175,279 @@ class Sim():
     def prepare(self):
 
         params = self.params
+        if params.seed is not None:
+            random.seed(params.seed)
 
         # Instantiate Scheduler(s), HDD(s), RAMBus and CPU(s) modules
         params.rambus = RAMBus(params.RAMtranSpeed, params.RAMoverhead)
-        params.cpu = CPU(params.CPUnumMsPerOp)
-        params.sched = Scheduler()
-        params.hdd = HDD("HDD", params)
+        params.cpu = CPU(params.CPUnumMsPerOp, params.numCores)
+        params.monitor = makeMonitor(params)
+        params.geometry = DiskGeometry.load(params)
+        params.array = DiskArray(params)
+        self.statsSince = 0.0
 
         # Instantiate Input/Ouput Streams
         self.streams = []
         for i in range(0, params.numTuners):
-            self.streams.append(InputStream("Tuner #%i"%i, params.tunerBitrate, self))
+            self.streams.append(self.makeStream(InputStream, i))
         for i in range(0, params.numOutputs):
-            self.streams.append(OutputStream("Output #%i"%i, params.outputBitrate, self))
+            self.streams.append(self.makeStream(OutputStream, i))
         self.vars.initVarData()
 
+    # Returns tuner (InputStream) or output (OutputStream) number i, which
+    # replays the workload file of its kind if there is one
+    def makeStream(self, kind, i):
+        params = self.params
+        if kind is InputStream:
+            name, bitrate, path, traceKind = "Tuner #%i"%i, params.tunerBitrate, params.tunerWorkload, TraceInputStream
+        else:
+            name, bitrate, path, traceKind = "Output #%i"%i, params.outputBitrate, params.outputWorkload, TraceOutputStream
+        if path is None:
+            return kind(name, bitrate, self)
+        if params.fluid:
+            raise ValueError("Workload files can not be replayed in fluid mode")
+        if path not in self.workloads:
+            self.workloads[path] = PacketTrace(path)
+        return traceKind(name, bitrate, self, self.workloads[path], i*params.workloadShift)
+
+    # Returns every buffer in the simulation
+    def buffers(self):
+        return [stream.requester.buffer for stream in self.streams] + [hdd.cache.buffer for hdd in self.params.array.hdds]
+
     def activate(self):
         params = self.params
+        if params.traceFile is not None:
+            Trace.start(params.traceFile, params.traceLevel)
+
         # Activate all processes
-        activate(params.sched, params.sched.sortRequests(params.waitInterval, params.cpu))
-        activate(params.hdd, params.hdd.processRequests(params.waitInterval))
-        for i in range(0, params.numTuners):
-            activate(self.streams[i], self.streams[i].fillBuffer())
-        for i in range(params.numTuners, len(self.streams)):
-            activate(self.streams[i], self.streams[i].drainBuffer())
+        for hdd in params.array.hdds:
+            activate(hdd.cache.sched, hdd.cache.sched.sortRequests(params.waitInterval, params.cpu))
+            activate(hdd, hdd.processRequests(params.waitInterval))
+        for stream in self.streams:
+            self.startStream(stream)
+        if params.liveFile is not None:
+            self.publisher = Publisher(self)
+            activate(self.publisher, self.publisher.publish(params.liveInterval))
+        if params.stopRule:
+            self.stopper = Stopper(self)
+            activate(self.stopper, self.stopper.watch())
+
+    def startStream(self, stream):
+        if self.params.fluid:
+            activate(stream, stream.flowBuffer())
+        elif isinstance(stream, InputStream):
+            activate(stream, stream.fillBuffer())
+        else:
+            activate(stream, stream.drainBuffer())
+
+    # Changes a running simulation, for branches started from a warmed up
+    # state.  Only the parameters below can be changed mid-run: tuners and
+    # outputs can be added but not removed, and a new scheduler takes over
+    # the old one's queued requests.
+    def applyVariant(self, overrides):
+        params = self.params
+        newScheduler = False
+        for name, val in sorted(overrides.items()):
+            if name == "seed":
+                params.seed = val
+                self.reseed()
+            elif name == "baseChanceATR":
+                params.baseChanceATR = val
+                for hdd in params.array.hdds:
+                    hdd.baseChance = val
+                    hdd.ATRchance = val
+            elif name == "numTuners" or name == "numOutputs":
+                if val < getattr(params, name):
+                    raise ValueError("Streams can not be removed from a running simulation")
+                for i in range(getattr(params, name), val):
+                    stream = self.makeStream(InputStream if name == "numTuners" else OutputStream, i)
+                    self.streams.append(stream)
+                    self.startStream(stream)
+                setattr(params, name, val)
+                self.vars.initVarData()
+            elif name == "schedType" or name == "nStepSize":
+                setattr(params, name, val)
+                newScheduler = True
+            else:
+                raise ValueError("%s can not be changed in a running simulation"%name)
+        if newScheduler:
+            self.replaceScheduler()
+
+    # Restarts every random number stream from params.seed
+    def reseed(self):
+        params = self.params
+        if params.seed is not None:
+            random.seed(params.seed)
+        for stream in self.streams:
+            stream.rand.reseed(params.seed)
+            stream.requester.rand.reseed(params.seed)
+        for hdd in params.array.hdds:
+            hdd.rand.reseed(params.seed)
+
+    # Swaps in a new scheduler of params.schedType for every disk.  The old
+    # schedulers' processes are left waiting on their own, now unused,
+    # events.
+    def replaceScheduler(self):
+        params = self.params
+        for hdd in params.array.hdds:
+            old = hdd.cache.sched
+            sched = makeScheduler(params, old.name)
+            hdd.cache.sched = sched
+            activate(sched, sched.sortRequests(params.waitInterval, params.cpu))
+            for IOReq in old.takeRequests():
+                sched.add(IOReq)
+
+            # The cache may be waiting on the old scheduler
+            old.reqReady.signal()
+
+    # Forgets the findings made so far, so a branch only reports the time
+    # after it was started
+    def resetStats(self):
+        for stream in self.streams:
+            stream.faults.reset(now())
+        if self.stopper is not None:
+            self.stopper.reset()
+        self.statsSince = now()
+        self.params.cpu.resetStats()
+        for hdd in self.params.array.hdds:
+            hdd.cache.sched.totalOps = 0
+            hdd.cache.sched.frontMerges = 0
+            hdd.cache.sched.backMerges = 0
+            hdd.busyTime = 0.0
+            hdd.reqsDone = 0
+        for stream in self.streams:
+            stream.requester.resetLatency()
+        for buffer in self.buffers():
+            buffer.settle()
+            buffer.bufferMon.reset(now())
+            buffer.bufferMon.observe(y=buffer.amount, t=now())
 
     def simulate(self):
         # Simulate system for params.maxTime simulation milliseconds
         print "Starting Simulation"
-        simulate(until=self.params.maxSimTime)
+        try:
+            simulate(until=self.params.maxSimTime)
+        finally:
+            Trace.stop()
+            if self.publisher is not None:
+                self.publisher.writer.close()
+            for buffer in self.buffers():
+                buffer.settle()
+                buffer.bufferMon.close()
+            for trace in self.workloads.values():
+                trace.close()
+            self.workloads = {}
 
         # Report Simulation findings
         print 'Done!'
 
+    # Runs a whole simulation without the GUI.  SimPy's event list is global
+    # so it has to be reset between the creation of the modules and their
+    # activation.  The clock is also reset before the modules are created,
+    # since the buffers observe their initial level then, for when another
+    # simulation ran before this one.
+    #
+    # With params.resultCache set, a run already in the cache is not run,
+    # its summary is returned from there (and cacheHit is set), and series()
+    # returns the series stored with it.
+    def run(self):
+        params = self.params
+        cache = None
+        self.cacheHit = False
+        self.cachedSeries = None
+        if params.resultCache is not None and ResultCache.cacheable(params):
+            cache = ResultCache.ResultCache(params.resultCache, params.resultCacheSize)
+            key = ResultCache.key(params)
+            entry = cache.get(key, params.resultCacheSeries)
+            if entry is not None:
+                self.cacheHit = True
+                self.cachedSeries = entry.get("series")
+                return entry["summary"]
+        start = time.time()
+        initialize()
+        self.prepare()
+        initialize()
+        self.activate()
+        self.simulate()
+        summary = self.summary()
+        if cache is not None:
+            cache.put(key, summary, time.time() - start, self.series() if params.resultCacheSeries else None)
+        return summary
+
+    # Returns {buffer: [times, levels]} of the buffers whose monitors keep
+    # their series, or those stored in the result cache for a cached run
+    def series(self):
+        if self.cacheHit:
+            if self.cachedSeries is None:
+                raise ValueError("The run came from the result cache without its series (resultCacheSeries was not set)")
+            return self.cachedSeries
+        series = {}
+        for buffer in self.buffers():
+            if hasattr(buffer.bufferMon, "tseries"):
+                series[buffer.name] = [list(buffer.bufferMon.tseries()), list(buffer.bufferMon.yseries())]
+        return series
+
+    # Merges the latency histograms of requesters
+    def latencySummary(self, requesters):
+        result = {}
+        for stage in stages:
+            hist = Histogram()
+            for requester in requesters:
+                hist.merge(requester.latency[stage])
+            result[stage] = hist.summary()
+        done = result["total"]["count"]
+        missed = sum(requester.missed for requester in requesters)
+        result["missed"] = missed
+        result["missRate"] = missed/float(done) if done else None
+        return result
+
+    # Returns a dictionary of the simulation's findings made only of plain
+    # python types so it can be pickled back from a worker process or
+    # written out as JSON.
+    def summary(self):
+        endTime = now()
+        # Faults of every stream (see Monitors.Faults), in packet mode one
+        # per packet lost and in fluid mode one per episode
+        faults = dict((stream.name, stream.faults.summary(endTime)) for stream in self.streams)
+        overflows = sum(s.faults.count for s in self.streams if isinstance(s, InputStream))
+        underflows = sum(s.faults.count for s in self.streams if isinstance(s, OutputStream))
+
+        buffers = {}
+        for stream in self.streams:
+            stream.requester.buffer.settle()
+            mon = stream.requester.buffer.bufferMon
+            buffers[stream.name] = {"mean":mon.timeAverage(endTime),
+                                    "min":mon.minimum(), "max":mon.maximum(),
+                                    "p5":mon.percentile(0.05, endTime),
+                                    "p95":mon.percentile(0.95, endTime)}
+
+        # Disk use is counted as requests complete, so requests still on a
+        # disk are not included
+        disks = {}
+        elapsed = endTime - self.statsSince
+        for hdd in self.params.array.hdds:
+            disks[hdd.name] = {"requests":hdd.reqsDone,
+                               "utilization":hdd.busyTime/elapsed if elapsed else 0.0}
+
+        # Request latencies, ms, by stage (see Data.stages) and the part of
+        # the completed requests that missed their deadline, for reads,
+        # writes and every stream
+        latency = {"read":self.latencySummary([s.requester for s in self.streams if isinstance(s, OutputStream)]),
+                   "write":self.latencySummary([s.requester for s in self.streams if isinstance(s, InputStream)]),
+                   "streams":dict((s.name, self.latencySummary([s.requester])) for s in self.streams)}
+
+        # Requests the schedulers merged into the request before or after
+        # them on the disk
+        schedulers = self.params.array.schedulers()
+        merges = {"front":sum(sched.frontMerges for sched in schedulers),
+                  "back":sum(sched.backMerges for sched in schedulers)}
+
+        result = {"seed":self.params.seed, "simTime":endTime,
+                "overflows":overflows, "underflows":underflows, "faults":faults,
+                "schedulerOps":sum(sched.totalOps for sched in schedulers),
+                "merges":merges, "buffers":buffers, "disks":disks, "latency":latency,
+                "cpuUtilization":self.params.cpu.utilization()}
+        if self.stopper is not None:
+            result["stopping"] = self.stopper.summary()
+        return result
+
@@ -0,0 +1,206 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import math
+from Engine import *
+from Stream import InputStream, OutputStream
+
+# Run-length control.  With Parameters.stopRule set, the Stopper observes
+# the metrics in stopMetrics every stopInterval ms and ends the run once
+# each is known to within stopPrecision of itself with stopConfidence:
+#   1) the warm-up is found with MSER-5: the observations are grouped by 5,
+#      and the number of groups d dropped from the start is the one that
+#      minimizes the variance of the mean of the rest divided by their
+#      number, searched over the first half of the groups (the latest d of
+#      all the metrics is used)
+#   2) the observations after the warm-up are cut into stopBatches batches
+#      of at least stopMinBatchSize observations, and the batch means give a
+#      Student t confidence interval of the metric's steady state mean
+# The run is checked every time its observations have grown by a tenth.
+# With stopOnFault, a run is ended as infeasible at the end of the first
+# interval with an overflow or underflow.  The summary's "stopping" tells
+# why and when the run ended, the warm-up and every metric's interval.
+
+# Observations of a metric: each interval adds (sum, weight) to the sums
+# and weights of a "mean" metric, or its samples to a "percentile" metric,
+# and a batch's value is the sum over the weight, or the percentile, of its
+# intervals.  Levels are in kBs, latencies in ms, faults per s.
+class Metric():
+    def __init__(self, name, percentile=None):
+        self.name = name
+        self.percentile = percentile
+        self.obs = []
+
+    # Returns the value of observations start to end, None without any
+    def value(self, start, end):
+        if self.percentile is None:
+            total = sum(obs[0] for obs in self.obs[start:end])
+            weight = sum(obs[1] for obs in self.obs[start:end])
+            return total/weight if weight else None
+        samples = sorted(sample for obs in self.obs[start:end] for sample in obs)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(self.percentile*len(samples)))]
+
+# Returns the index of the first group MSER keeps of values, None if the
+# minimum is not in the first half, when the run is still too short to tell
+def mser(values):
+    n = len(values)
+    if n < 4:
+        return None
+    # Sums of the values and their squares from every group to the end
+    sums = [0.0]*(n + 1)
+    squares = [0.0]*(n + 1)
+    for i in range(n - 1, -1, -1):
+        sums[i] = sums[i + 1] + values[i]
+        squares[i] = squares[i + 1] + values[i]*values[i]
+    best = None
+    for d in range(n//2 + 1):
+        m = n - d
+        stat = (squares[d] - sums[d]*sums[d]/m)/(m*m)
+        if best is None or stat < best[0]:
+            best = (stat, d)
+    if best[1] >= n//2:
+        return None
+    return best[1]
+
+# Returns the quantile p of the standard normal distribution (Abramowitz
+# and Stegun 26.2.23, to within 4.5e-4)
+def normalQuantile(p):
+    q = p if p < 0.5 else 1 - p
+    t = math.sqrt(-2*math.log(q))
+    z = t - (2.515517 + 0.802853*t + 0.010328*t*t)/(1 + 1.432788*t + 0.189269*t*t + 0.001308*t*t*t)
+    return z if p >= 0.5 else -z
+
+# Returns the quantile p of Student's t distribution with df degrees of
+# freedom, by its Cornish-Fisher expansion about the normal
+def tQuantile(p, df):
+    z = normalQuantile(p)
+    return z + (z**3 + z)/(4*df) + (5*z**5 + 16*z**3 + 3*z)/(96*df*df) \
+             + (3*z**7 + 19*z**5 + 17*z**3 - 15*z)/(384*df**3)
+
+class Stopper(Process):
+    def __init__(self, sim):
+        Process.__init__(self, name="Stopper")
+        params = sim.params
+        self.simulation = sim
+        self.interval = params.stopInterval
+        self.precision = params.stopPrecision
+        self.confidence = params.stopConfidence
+        self.batches = params.stopBatches
+        self.minBatchSize = params.stopMinBatchSize
+        self.onFault = params.stopOnFault
+        self.inputs = [s for s in sim.streams if isinstance(s, InputStream)]
+        self.outputs = [s for s in sim.streams if isinstance(s, OutputStream)]
+        self.metrics = []
+        for name in params.stopMetrics:
+            if name not in metricNames:
+                raise ValueError("Unknown stopping metric: %s"%name)
+            self.metrics.append(Metric(name, metricNames[name]))
+        self.reset()
+
+    # Forgets the observations so far, for Sim.resetStats
+    def reset(self):
+        self.since = now()
+        self.latencies = self.latencyTotals()
+        self.faults = self.faultCount()
+        for metric in self.metrics:
+            metric.obs = []
+        self.checkAt = 2*self.batches*self.minBatchSize
+        self.reason = "maxSimTime"
+        self.warmUp = None
+        self.intervals = {}
+
+    def latencyTotals(self):
+        totals = []
+        for streams in (self.inputs, self.outputs):
+            hists = [s.requester.latency["total"] for s in streams]
+            totals.append((sum(hist.total for hist in hists), sum(hist.count for hist in hists)))
+        return totals
+
+    def faultCount(self):
+        return sum(s.faults.count for s in self.simulation.streams)
+
+    def watch(self):
+        while True:
+            yield hold, self, self.interval
+            faults = self.faults
+            self.observe()
+            if self.onFault and self.faults > faults:
+                self.reason = "infeasible"
+                stopSimulation()
+            elif self.metrics and len(self.metrics[0].obs) >= self.checkAt:
+                self.checkAt = int(1.1*self.checkAt) + 1
+                if self.check():
+                    self.reason = "converged"
+                    stopSimulation()
+
+    # Adds an observation of every metric for the interval just ended
+    def observe(self):
+        latencies = self.latencyTotals()
+        faults = self.faultCount()
+        for metric in self.metrics:
+            name = metric.name
+            if name == "inputLevel" or name == "outputLevel":
+                streams = self.inputs if name == "inputLevel" else self.outputs
+                metric.obs.append((sum(s.requester.buffer.amount for s in streams), len(streams)))
+            elif name == "outputLevelP5":
+                metric.obs.append([s.requester.buffer.amount for s in self.outputs])
+            elif name == "writeLatency" or name == "readLatency":
+                i = 0 if name == "writeLatency" else 1
+                metric.obs.append((latencies[i][0] - self.latencies[i][0], latencies[i][1] - self.latencies[i][1]))
+            else:
+                metric.obs.append((1000.0*(faults - self.faults)/self.interval, 1))
+        self.latencies = latencies
+        self.faults = faults
+
+    # Finds the warm-up and every metric's interval, and returns True once
+    # all of them are within the precision
+    def check(self):
+        n = len(self.metrics[0].obs)
+        start = 0
+        for metric in self.metrics:
+            groups = [metric.value(i, i + 5) for i in range(0, n - n % 5, 5)]
+            if None in groups:
+                continue
+            d = mser(groups)
+            if d is None:
+                return False
+            start = max(start, 5*d)
+        size = (n - start)//self.batches
+        if size < self.minBatchSize:
+            return False
+        start = n - size*self.batches
+        self.warmUp = self.since + start*self.interval
+        converged = True
+        for metric in self.metrics:
+            means = [metric.value(start + i*size, start + (i + 1)*size) for i in range(self.batches)]
+            if None in means:
+                if metric.value(start, n) is not None:
+                    converged = False
+                continue
+            mean = sum(means)/len(means)
+            variance = sum((m - mean)**2 for m in means)/(len(means) - 1)
+            halfWidth = tQuantile((1 + self.confidence)/2.0, len(means) - 1)*math.sqrt(variance/len(means))
+            self.intervals[metric.name] = {"mean":mean, "halfWidth":halfWidth, "batchSize":size*self.interval}
+            if halfWidth > self.precision*abs(mean):
+                converged = False
+        return converged
+
+    # Returns why and when the run ended, its warm-up and the intervals
+    # found at the last check
+    def summary(self):
+        return {"reason":self.reason, "stopTime":now(), "warmUp":self.warmUp,
+                "confidence":self.confidence, "intervals":self.intervals}
+
+# Metric names accepted in Parameters.stopMetrics, with their percentile
+metricNames = {"inputLevel":None, "outputLevel":None, "outputLevelP5":0.05,
+               "writeLatency":None, "readLatency":None, "faultRate":None}
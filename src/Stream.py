@@ -9,9 +9,17 @@ __email__ = "ptyler@calpoly.edu"
 __status__ = "Developement"
 
 # Imports------------------
-from SimPy.Simulation import *
-from random import expovariate
-from Data import RRequester, WRequester
+from Engine import *
+from Data import RRequester, WRequester, fluidSlack
+from RNG import RandomStream
+from Monitors import Faults
+
+# A fluid stream has no randomness of its own, so streams of the same bitrate
+# would reach their threshholds in lock-step and meet the scheduler in
+# batches that random packets soon break up.  Each fluid stream starts after
+# a random part of the ms its largest request of sizekB takes to flow.
+def flowPhase(stream, sizekB):
+    return stream.rand.random()*sizekB*1000.0/(stream.bitrate*128)
 
 # Simulates continous data being added to a buffer, specifically a TV tuner
 # chip constantly filtering a given channel and sending the raw filtered
@@ -22,8 +30,9 @@ class InputStream(Process):
         Process.__init__(self, name)
         self.requester = WRequester("Write Requester of %s"%name, sim.params)
         self.bitrate = bitrate
+        self.rand = RandomStream(sim.params.seed, name, sim.params.rngBlockSize)
         self.rambus = sim.params.rambus
-        self.errors = sim.errors
+        self.faults = Faults("Overflow")
 
     def fillBuffer(self, avgPktSize=0):
         # Activate BufferControl's process in 100 ms
@@ -36,19 +45,67 @@ class InputStream(Process):
         # Continuously fill corresponding buffer with kBs based on the
         # given average bitrate.
         while True:
-            sizemb = expovariate(1.0/avgPktSize)
+            sizemb = self.rand.expovariate(1.0/avgPktSize)
             sizekB = sizemb*128   #Mb -> KB
-            if self.requester.buffer.freeSpace() < sizekB:
-                self.errors.append("<font color=red>%s Buffer Overflow at %.3f</font>"%(self.name, now()))
-            else:
-                yield put, self, self.requester.buffer, sizekB
-                yield request, self, self.rambus
-                yield hold, self, self.rambus.processTime(sizekB)
-                yield release, self, self.rambus
+            for cmd in self.addPacket(sizekB):
+                yield cmd
 
             #print "Just added %f kBs to %s at %i"%(sizekB,self.name,now())
             yield hold, self, (1000*sizemb/self.bitrate)
 
+    # Moves a packet of sizekB into the buffer over the RAM bus, or counts an
+    # overflow if it does not fit.  Run by the packet loops of both drawn and
+    # replayed packets.
+    def addPacket(self, sizekB):
+        if self.requester.buffer.freeSpace() < sizekB:
+            self.faults.fail(now(), sizekB)
+            return
+        if self.faults.episodeStart is not None:
+            self.faults.recover(now())
+        yield put, self, self.requester.buffer, sizekB
+        yield request, self, self.rambus
+        yield hold, self, self.rambus.processTime(sizekB)
+        yield release, self, self.rambus
+
+    # Fluid mode: instead of adding packets, the buffer fills continuously at
+    # the bitrate and this process only wakes when the buffer reaches a
+    # requester's threshhold or fills up, or a request changes its level.
+    # An overflow is counted once for every period the buffer stays full,
+    # which loses the data that arrives until it has room again.
+    def flowBuffer(self, avgPktSize=0):
+        yield hold, self, flowPhase(self, self.requester.largestWrite)
+        activate(self.requester, self.requester.watchBuffer(), now()+100)
+        if avgPktSize <= 0:
+            avgPktSize = self.bitrate/10.0
+
+        buffer = self.requester.buffer
+        buffer.rate = self.bitrate*128/1000.0 # Mb per s -> kB per ms
+        buffer.rateSince = now()
+        buffer.flowProc = self
+        self.rambus.addLoad(buffer.rate, self.bitrate/(1000.0*avgPktSize))
+
+        full = False
+        while True:
+            buffer.settle()
+            if buffer.watchers:
+                buffer.checkWatchers(self, fluidSlack)
+            if buffer.freeSpace() <= fluidSlack:
+                if not full:
+                    self.faults.fail(now(), 0.0)
+                full = True
+            else:
+                if full:
+                    self.faults.recover(now(), buffer.rate*(now() - self.faults.episodeStart))
+                full = False
+
+            wait = buffer.timeToNextEvent()
+            if wait is None:
+                yield passivate, self
+            else:
+                yield hold, self, wait
+            if self.interrupted():
+                self.interruptReset()
+
 # Simulates continous data being removed from a buffer, specifically a real-
 # time MPEG decoder chip constantly pulling the raw MPEG video data from RAM
 # to output to a disply.  This module also activates a module that schedules
@@ -58,8 +115,9 @@ class OutputStream(Process):
         Process.__init__(self, name)
         self.requester = RRequester("Read Requester of %s"%name, sim.params)
         self.bitrate = bitrate
+        self.rand = RandomStream(sim.params.seed, name, sim.params.rngBlockSize)
         self.rambus = sim.params.rambus
-        self.errors = sim.errors
+        self.faults = Faults("Underflow")
 
     def drainBuffer(self, avgPktSize=0):
         # Activate BufferControl's process in 100 ms
@@ -72,16 +130,102 @@ class OutputStream(Process):
         # Continuously drain corresponding buffer with kBs based on the
         # given average bitrate.
         while True:
-            sizemb = expovariate(1.0/avgPktSize)
+            sizemb = self.rand.expovariate(1.0/avgPktSize)
             sizekB = sizemb*128   #Mb -> KB
-            if self.requester.buffer.amount < sizekB:
-                self.errors.append("<font color=red>%s Buffer Underflow at %.3f</font>"%(self.name, now()))
-                continue
-
-            yield get, self, self.requester.buffer, sizekB
-            yield request, self, self.rambus
-            yield hold, self, self.rambus.processTime(sizekB)
-            yield release, self, self.rambus
+            # A packet that is not in the buffer is not shown, the decoder
+            # still waits for the time it would have taken to play it.
+            for cmd in self.takePacket(sizekB):
+                yield cmd
 
             #print "Just removed %f kBs from %s at %i"%(sizekB,self.name,now())
-            yield hold, self, (1000*sizemb/self.bitrate) # 1000 ms in one s
\ No newline at end of file
+            yield hold, self, (1000*sizemb/self.bitrate) # 1000 ms in one s
+
+    # Moves a packet of sizekB out of the buffer over the RAM bus, or counts
+    # an underflow if it is not all there, see InputStream.addPacket
+    def takePacket(self, sizekB):
+        if self.requester.buffer.amount < sizekB:
+            self.faults.fail(now(), sizekB)
+            return
+        if self.faults.episodeStart is not None:
+            self.faults.recover(now())
+        yield get, self, self.requester.buffer, sizekB
+        yield request, self, self.rambus
+        yield hold, self, self.rambus.processTime(sizekB)
+        yield release, self, self.rambus
+
+    # Fluid mode: the buffer drains continuously at the bitrate, see
+    # InputStream.flowBuffer.  An underflow is counted once for every
+    # period the buffer stays empty.
+    def flowBuffer(self, avgPktSize=0):
+        yield hold, self, flowPhase(self, self.requester.largestRead)
+        activate(self.requester, self.requester.watchBuffer(), now()+100)
+        if avgPktSize <= 0:
+            avgPktSize = self.bitrate/10.0
+
+        buffer = self.requester.buffer
+        buffer.rate = -self.bitrate*128/1000.0 # Mb per s -> kB per ms
+        buffer.rateSince = now()
+        buffer.flowProc = self
+        self.rambus.addLoad(-buffer.rate, self.bitrate/(1000.0*avgPktSize))
+
+        empty = False
+        while True:
+            buffer.settle()
+            if buffer.watchers:
+                buffer.checkWatchers(self, fluidSlack)
+            if buffer.amount <= fluidSlack:
+                if not empty:
+                    self.faults.fail(now(), 0.0)
+                empty = True
+            else:
+                if empty:
+                    self.faults.recover(now(), -buffer.rate*(now() - self.faults.episodeStart))
+                empty = False
+
+            wait = buffer.timeToNextEvent()
+            if wait is None:
+                yield passivate, self
+            else:
+                yield hold, self, wait
+            if self.interrupted():
+                self.interruptReset()
+
+# A tuner that replays a recorded workload (see Workload.py) instead of
+# drawing its packets: every packet arrives at its time in the trace,
+# counted from when the stream starts plus shift ms into the trace.
+class TraceInputStream(InputStream):
+    def __init__(self, name, bitrate, sim, trace, shift=0.0):
+        InputStream.__init__(self, name, bitrate, sim)
+        self.trace = trace
+        self.shift = shift
+        self.loop = sim.params.workloadLoop
+
+    def fillBuffer(self, avgPktSize=0):
+        activate(self.requester, self.requester.watchBuffer(), now()+100)
+        start = now()
+        for offset, sizekB in self.trace.packets(self.shift, self.loop):
+            wait = start + offset - now()
+            if wait > 0:
+                yield hold, self, wait
+            for cmd in self.addPacket(sizekB):
+                yield cmd
+        yield passivate, self
+
+# An output that replays a recorded workload, see TraceInputStream
+class TraceOutputStream(OutputStream):
+    def __init__(self, name, bitrate, sim, trace, shift=0.0):
+        OutputStream.__init__(self, name, bitrate, sim)
+        self.trace = trace
+        self.shift = shift
+        self.loop = sim.params.workloadLoop
+
+    def drainBuffer(self, avgPktSize=0):
+        activate(self.requester, self.requester.watchBuffer(), now()+100)
+        start = now()
+        for offset, sizekB in self.trace.packets(self.shift, self.loop):
+            wait = start + offset - now()
+            if wait > 0:
+                yield hold, self, wait
+            for cmd in self.takePacket(sizekB):
+                yield cmd
+        yield passivate, self
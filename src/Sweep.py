@@ -0,0 +1,168 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import itertools
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from multiprocessing import Pool, cpu_count
+
+# Runs many Parameters configurations at once.  SimPy keeps its event list
+# in module globals, so only one Sim can run per interpreter.  Every sweep
+# point is therefore run in its own worker process, and a worker is thrown
+# away after a single run so no simulation state leaks into the next point.
+#
+# A sweep file is JSON of the form:
+#   {"grid": {"numTuners": [4, 8, 12], "iBSize": [4000, 8000]},
+#    "points": [{"numTuners": 16, "hddCacheSize": 32000}],
+#    "base": {"maxSimTime": 100000},
+#    "seeds": [1, 2, 3]}
+# "grid" is expanded to every combination of its values, "points" are
+# added as they are, "base" is applied to every point and every point is
+# replicated once for each seed.  Without "seeds", a "seed" in "base" or a
+# point is kept.
+#
+# With "resultCache" in the overrides, the parent looks every task up in
+# the result cache (see ResultCache.py) first and yields the hits right away,
+# so only the misses are simulated.  Every result tells whether it was
+# "cached".
+
+# Expands a {parameter: [values]} dictionary into a list of override
+# dictionaries, one for every combination of values.
+def expandGrid(grid):
+    names = sorted(grid.keys())
+    points = []
+    for vals in itertools.product(*[grid[name] for name in names]):
+        points.append(dict(zip(names, vals)))
+    return points
+
+# Builds the list of (index, overrides, seed) tasks handed to the workers.
+# A task's seed of None keeps the seed of its overrides, if they have one.
+def makeTasks(points, seeds=(None,), base=None):
+    tasks = []
+    for point in points:
+        overrides = dict(base or {})
+        overrides.update(point)
+        for seed in seeds:
+            tasks.append((len(tasks), overrides, seed))
+    return tasks
+
+# Keeps the workers' simulation chatter off of the sweep's output.
+def initWorker():
+    sys.stdout = open(os.devnull, "w")
+
+# Runs one sweep point inside a worker process.  The simulation modules are
+# imported here so the parent process never touches SimPy's globals.
+def runTask(task):
+    index, overrides, seed = task
+    from Simulation import Sim
+
+    start = time.time()
+    sim = Sim()
+    sim.params.update(overrides)
+    if seed is not None:
+        sim.params.seed = seed
+    result = sim.run()
+    result["index"] = index
+    result["overrides"] = overrides
+    result["wallTime"] = time.time() - start
+    result["cached"] = sim.cacheHit
+    return result
+
+# Returns the summary of task from the result cache, None if it is not there
+def lookup(task):
+    index, overrides, seed = task
+    if overrides.get("resultCache") is None:
+        return None
+    from Simulation import Parameters
+    import ResultCache
+    params = Parameters()
+    params.update(overrides)
+    if seed is not None:
+        params.seed = seed
+    if not ResultCache.cacheable(params):
+        return None
+    cache = ResultCache.ResultCache(params.resultCache, params.resultCacheSize)
+    entry = cache.get(ResultCache.key(params), params.resultCacheSeries, logMisses=False)
+    if entry is None:
+        return None
+    result = entry["summary"]
+    result["index"] = index
+    result["overrides"] = overrides
+    result["wallTime"] = 0.0
+    result["cached"] = True
+    return result
+
+# Runs every task over a pool of worker processes, yielding each run's
+# summary as soon as it completes (not in task order).
+def sweep(tasks, processes=None):
+    misses = []
+    for task in tasks:
+        result = lookup(task)
+        if result is None:
+            misses.append(task)
+        else:
+            yield result
+    tasks = misses
+    if not tasks:
+        return
+    if processes is None:
+        processes = cpu_count()
+    pool = Pool(processes, initializer=initWorker, maxtasksperchild=1)
+    try:
+        for result in pool.imap_unordered(runTask, tasks):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+# Reads a sweep definition file and returns its list of tasks
+def loadSweep(path):
+    with open(path) as f:
+        spec = json.load(f)
+    points = expandGrid(spec.get("grid", {})) if "grid" in spec else []
+    points.extend(spec.get("points", []))
+    if not points:
+        points = [{}]
+    return makeTasks(points, spec.get("seeds", [None]), spec.get("base"))
+
+def main(argv=None):
+    parser = ArgumentParser(description="Run a parameter sweep of the set-top box simulator")
+    parser.add_argument("sweepFile", help="JSON sweep definition")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="file to write one JSON result per line to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    tasks = loadSweep(args.sweepFile)
+    out = sys.stdout if args.output is None else open(args.output, "w")
+    start = time.time()
+    done = 0
+    cached = 0
+    try:
+        for result in sweep(tasks, args.jobs):
+            out.write(json.dumps(result, sort_keys=True) + "\n")
+            out.flush()
+            done += 1
+            cached += result["cached"]
+            sys.stderr.write("%i/%i runs done (%i from the result cache), %.1fs elapsed\n"%(done, len(tasks), cached, time.time() - start))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
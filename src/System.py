@@ -9,21 +9,65 @@ __email__ = "ptyler@calpoly.edu"
 __status__ = "Developement"
 
 # Imports------------------
-from SimPy.Simulation import *
+from Engine import *
+from heapq import heappush, heappop
 
 # This module is used to simulate the system's CPU.  Since a core in a
 # processor can only compute one task at any given point in time, this
 # module acts as a "flag" that other modules must "hold" in order to
-# use a CPU core.
+# use a CPU core.  A process holding the CPU is given the lowest numbered
+# free core, and the time every core is held is added up.
 class CPU(Resource):
-    def __init__(self, msPerOp):
-        Resource.__init__(self, name='CPU')
+    def __init__(self, msPerOp, numCores=1):
+        Resource.__init__(self, capacity=numCores, name='CPU')
         self.msPerOp = msPerOp
+        self.freeCores = list(range(numCores))
+
+        # {process: (core, time it got the core)} of the current holders,
+        # and the ms each core was held and times it was taken since
+        # statsSince
+        self.cores = {}
+        self.busyTime = [0.0]*numCores
+        self.grants = [0]*numCores
+        self.statsSince = 0.0
 
     # Returns time for CPU to process numOps operations
     def processTime(self, numOps):
         return self.msPerOp * numOps
 
+    # Resource hands a core to a requester right away or, once one is
+    # released, to the first waiting one; either way it then is in activeQ.
+    def _request(self, arg):
+        Resource._request(self, arg)
+        self.assignCores()
+
+    def _release(self, arg):
+        core, since = self.cores.pop(arg[1])
+        self.busyTime[core] += now() - max(since, self.statsSince)
+        heappush(self.freeCores, core)
+        Resource._release(self, arg)
+        self.assignCores()
+
+    def assignCores(self):
+        for proc in self.activeQ:
+            if proc not in self.cores:
+                core = heappop(self.freeCores)
+                self.cores[proc] = (core, now())
+                self.grants[core] += 1
+
+    # Returns the fraction of the time since statsSince each core was held
+    def utilization(self):
+        busy = list(self.busyTime)
+        for core, since in self.cores.values():
+            busy[core] += now() - max(since, self.statsSince)
+        elapsed = now() - self.statsSince
+        return [b/elapsed if elapsed else 0.0 for b in busy]
+
+    def resetStats(self):
+        self.busyTime = [0.0]*len(self.busyTime)
+        self.grants = [0]*len(self.grants)
+        self.statsSince = now()
+
 # This module is used to simulate the RAM data bus in the System.  Since only
 # one part of the system can write/read from the RAM at any one point in time,
 # this module acts as a "flag" that other modules must "hold" in order to
@@ -34,6 +78,18 @@ class RAMBus(Resource):
         self.tranSpeedkBpms = tranSpeedkBpms
         self.tranOverhead = tranOverhead
 
+        # Fraction of the bus's time used by fluid streams, which do not
+        # request the bus for each packet.
+        self.load = 0.0
+
+    # Accounts for a fluid stream moving kBpms kBs per ms in pktsPerMs packets
+    # per ms.  The bus is shared, so the other transfers are slowed down by
+    # the time the streams take up.
+    def addLoad(self, kBpms, pktsPerMs):
+        self.load += kBpms*self.tranSpeedkBpms + pktsPerMs*self.tranOverhead
+        if self.load >= 1:
+            raise ValueError("Fluid streams use more than the whole RAM bus")
+
     # Returns time to read/write numDatakBs to RAM
     def processTime(self, numDatakBs):
-        return self.tranOverhead + numDatakBs * self.tranSpeedkBpms
+        return (self.tranOverhead + numDatakBs * self.tranSpeedkBpms)/(1 - self.load)
@@ -0,0 +1,191 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import json
+import mmap
+import struct
+import sys
+
+# This module replaces the print statements that used to sit in every inner
+# loop of the simulation.  Events are written as fixed-width binary records
+# into a preallocated ring buffer that is flushed to a file in bulk.  When
+# tracing is off, the only cost left in a hot loop is the check of one of the
+# module level flags below, e.g.:
+#
+#   if Trace.tracingEvents:
+#       Trace.record(now(), self.traceId, Trace.REQ_CREATE, req.id, req.size, req.diskAddress)
+#
+# Decode a trace file back into text with 'python Trace.py run.trace'
+
+# Trace levels
+OFF = 0     # Nothing is recorded
+EVENT = 1   # Request lifecycle: creation, caching, disk, flush, completion
+DEBUG = 2   # Everything, including idle polling and waits
+
+# Flags checked in the hot loops, set by start() and stop()
+tracingEvents = False
+tracingDebug = False
+
+# Event kinds
+REQ_CREATE = 1      # A requester created an IO request
+REQ_COMPLETE = 2    # An IO request completed
+CACHE_ADD = 3       # A request was added to the HDD cache
+CACHE_FULL = 4      # The HDD cache had no room for the next request, size=closed reqs
+FLUSH_START = 5     # The flusher woke up, size=closed reqs
+FLUSH_IO = 6        # A request's data was moved over the RAM bus, size=RAM request wait
+DISK_IO = 7         # A request was processed on the platter, size=disk hold time
+ATR = 8             # The HDD entered Adjacent Track Repair, size=stall time
+SCHED_SORT = 9      # The scheduler sorted its queue, size=number of queued requests
+SCHED_BATCH = 10    # The deadline scheduler picked a batch, size=batch length
+SCHED_IDLE = 11     # The scheduler had too few requests to sort, size=queued requests
+
+kindNames = {REQ_CREATE:"REQ_CREATE", REQ_COMPLETE:"REQ_COMPLETE",
+             CACHE_ADD:"CACHE_ADD", CACHE_FULL:"CACHE_FULL",
+             FLUSH_START:"FLUSH_START", FLUSH_IO:"FLUSH_IO", DISK_IO:"DISK_IO",
+             ATR:"ATR", SCHED_SORT:"SCHED_SORT", SCHED_BATCH:"SCHED_BATCH",
+             SCHED_IDLE:"SCHED_IDLE"}
+
+# time, component id, event kind, request id, size, LBA (64 bits, so any
+# disk's kB addresses fit)
+recordFormat = struct.Struct("<dHBxIfq")
+headerFormat = struct.Struct("<8sHH")
+footerFormat = struct.Struct("<Q8s")
+MAGIC = b"STBTRACE"
+ENDMAGIC = b"STBTEND\0"
+VERSION = 2
+
+# Component names are registered once, when a module is created, and only
+# their ids are written into the records.
+componentIds = {}
+componentNames = []
+
+_ring = None
+
+# Returns the id used for the named component's records
+def component(name):
+    try:
+        return componentIds[name]
+    except KeyError:
+        componentIds[name] = len(componentNames)
+        componentNames.append(name)
+        return componentIds[name]
+
+# A preallocated buffer of fixed-width records.  With a file, the buffer is
+# written out whenever it fills up.  Without one it keeps overwriting its
+# oldest records, so the last numRecords events can be dumped after a run.
+class Ring():
+    def __init__(self, path, numRecords):
+        self.path = path
+        self.numRecords = numRecords
+        self.data = bytearray(numRecords*recordFormat.size)
+        self.next = 0
+        self.wrapped = False
+        self.file = None
+        if path is not None:
+            self.file = open(path, "wb")
+            self.file.write(headerFormat.pack(MAGIC, VERSION, recordFormat.size))
+
+    def add(self, time, compId, kind, reqId, size, lba):
+        recordFormat.pack_into(self.data, self.next*recordFormat.size,
+                               time, compId, kind, reqId, size, lba)
+        self.next += 1
+        if self.next == self.numRecords:
+            if self.file is not None:
+                self.file.write(self.data)
+            else:
+                self.wrapped = True
+            self.next = 0
+
+    # Writes the remaining records and the component name table
+    def close(self, path=None):
+        f = self.file
+        if f is None:
+            f = open(path or self.path, "wb")
+            f.write(headerFormat.pack(MAGIC, VERSION, recordFormat.size))
+            if self.wrapped:
+                f.write(memoryview(self.data)[self.next*recordFormat.size:])
+        f.write(memoryview(self.data)[:self.next*recordFormat.size])
+        tableOffset = f.tell()
+        f.write(json.dumps({"components":componentNames}).encode("ascii"))
+        f.write(footerFormat.pack(tableOffset, ENDMAGIC))
+        f.close()
+        self.file = None
+
+# Starts recording events at the given level.  If path is None, the records
+# are only kept in memory until stop() is given a path.
+def start(path, level=EVENT, numRecords=65536):
+    global _ring, tracingEvents, tracingDebug
+    if _ring is not None:
+        stop()
+    if level <= OFF:
+        return
+    _ring = Ring(path, numRecords)
+    tracingEvents = level >= EVENT
+    tracingDebug = level >= DEBUG
+
+# Stops recording and writes out everything still in the ring buffer
+def stop(path=None):
+    global _ring, tracingEvents, tracingDebug
+    tracingEvents = False
+    tracingDebug = False
+    if _ring is not None:
+        if _ring.file is not None or path is not None or _ring.path is not None:
+            _ring.close(path)
+        _ring = None
+
+# Records one event, callers check the level flags first
+def record(time, compId, kind, reqId=0, size=0, lba=-1):
+    _ring.add(time, compId, kind, reqId, size, lba)
+
+# Yields the (time, component, kind, reqId, size, lba) records of a trace
+# file.  The file is memory mapped, as workload files are (see Workload.py),
+# and its records are unpacked as they are reached, so a trace of any length
+# is decoded in the same memory.
+def readTrace(path):
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError("%s is empty"%path)
+    try:
+        if len(data) < headerFormat.size + footerFormat.size:
+            raise ValueError("%s is not a trace file"%path)
+        magic, version, recSize = headerFormat.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a trace file"%path)
+        if version != VERSION or recSize != recordFormat.size:
+            raise ValueError("%s is version %i of the trace format, not %i"%(path, version, VERSION))
+        tableOffset, endMagic = footerFormat.unpack_from(data, len(data)-footerFormat.size)
+        if endMagic != ENDMAGIC:
+            raise ValueError("%s was not closed properly"%path)
+        names = json.loads(data[tableOffset:len(data)-footerFormat.size].decode("ascii"))["components"]
+        unpack = recordFormat.unpack_from
+        offset = headerFormat.size
+        while offset < tableOffset:
+            time, compId, kind, reqId, size, lba = unpack(data, offset)
+            yield time, names[compId], kindNames.get(kind, str(kind)), reqId, size, lba
+            offset += recSize
+    finally:
+        data.close()
+
+# Decoder: prints a trace file as text
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) != 1:
+        sys.stderr.write("Usage: python Trace.py TRACEFILE\n")
+        return 2
+    for time, name, kind, reqId, size, lba in readTrace(argv[0]):
+        sys.stdout.write("%12.3f  %-32s %-12s req:%-8i size:%-10.2f lba:%i\n"%(time, name, kind, reqId, size, lba))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
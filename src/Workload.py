@@ -0,0 +1,179 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+# Imports------------------
+import csv
+import mmap
+import os
+import struct
+import sys
+from argparse import ArgumentParser
+
+# Recorded packet workloads, replayed by Stream.TraceInputStream and
+# TraceOutputStream in place of the exponential packets of the bitrate.  A
+# workload file is a header and then one (time in ms, size in kBs) record
+# per packet in time order, the first at time 0.  It is memory mapped and
+# its records are unpacked one at a time as the streams reach them, so a
+# trace of any length replays in the same memory.  Opening it only checks
+# the times are in order.
+# Convert a CSV file of time,size rows and look at the result with:
+#   python Workload.py convert packets.csv tuner.wkld --sizeScale 0.0009765625
+#   python Workload.py info tuner.wkld
+
+headerFormat = struct.Struct("<8sHxxxxxx")
+recordFormat = struct.Struct("<df")
+MAGIC = b"STBWKLD\0"
+VERSION = 1
+
+class PacketTrace():
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError("%s is empty"%path)
+        if len(self.map) < headerFormat.size:
+            raise ValueError("%s is not a workload file"%path)
+        magic, version = headerFormat.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a workload file"%path)
+        if version != VERSION:
+            raise ValueError("%s is version %i of the workload format, not %i"%(path, version, VERSION))
+        self.count = (len(self.map) - headerFormat.size)//recordFormat.size
+        if self.count < 2:
+            raise ValueError("%s needs at least 2 packets"%path)
+        self.checkOrder()
+        # A replay that loops starts over one average gap after the last packet
+        self.last = self.record(self.count - 1)[0]
+        if self.last <= 0:
+            raise ValueError("%s: the last packet must come after the first"%self.path)
+        self.period = self.last*self.count/(self.count - 1)
+
+    # Raises ValueError unless the packets start at time 0 and their times
+    # never decrease.  This is the only pass over the whole file, it only
+    # unpacks the times.
+    def checkOrder(self):
+        unpack = recordFormat.unpack_from
+        last = 0.0
+        offset = headerFormat.size
+        end = headerFormat.size + self.count*recordFormat.size
+        while offset < end:
+            t = unpack(self.map, offset)[0]
+            if t < last or (offset == headerFormat.size and t != 0):
+                raise ValueError("%s: packet %i at %r ms is out of order, the packets must be in time order from 0"%(self.path, (offset - headerFormat.size)//recordFormat.size, t))
+            last = t
+            offset += recordFormat.size
+
+    # Returns packet i as (time, size)
+    def record(self, i):
+        return recordFormat.unpack_from(self.map, headerFormat.size + i*recordFormat.size)
+
+    # Returns the index of the first packet at or after time t
+    def index(self, t):
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high)//2
+            if self.record(mid)[0] < t:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    # Yields (ms after the replay started, size) of every packet from shift
+    # ms into the trace, starting over at its beginning once it ends when
+    # loop is set
+    def packets(self, shift=0.0, loop=True):
+        start = shift % self.period
+        i = self.index(start)
+        base = -start
+        unpack = recordFormat.unpack_from
+        offset = headerFormat.size + i*recordFormat.size
+        end = headerFormat.size + self.count*recordFormat.size
+        while True:
+            while offset < end:
+                t, size = unpack(self.map, offset)
+                yield t + base, size
+                offset += recordFormat.size
+            if not loop:
+                return
+            base += self.period
+            offset = headerFormat.size
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+# Writes the rows of a CSV file of time,size as a workload file, scaling the
+# times and sizes to ms and kBs and moving the first packet to time 0.  Rows
+# that do not start with a number, e.g. a header, are skipped.  Returns the
+# number of packets written, or removes dst and raises ValueError if the
+# packets are out of order.
+def convert(src, dst, timeScale=1.0, sizeScale=1.0):
+    try:
+        return writeWorkload(src, dst, timeScale, sizeScale)
+    except ValueError:
+        os.remove(dst)
+        raise
+
+def writeWorkload(src, dst, timeScale, sizeScale):
+    count = 0
+    first = None
+    last = None
+    with open(src) as f, open(dst, "wb") as out:
+        out.write(headerFormat.pack(MAGIC, VERSION))
+        for row in csv.reader(f):
+            try:
+                t = float(row[0])*timeScale
+                size = float(row[1])*sizeScale
+            except (IndexError, ValueError):
+                continue
+            if first is None:
+                first = t
+            if last is not None and t < last:
+                raise ValueError("%s: packets must be in time order, %r comes after %r"%(src, row[0], last/timeScale))
+            last = t
+            out.write(recordFormat.pack(t - first, size))
+            count += 1
+    return count
+
+def info(trace, out):
+    totalkBs = sum(trace.record(i)[1] for i in range(trace.count))
+    out.write("packets         %i\n"%trace.count)
+    out.write("duration        %.3f ms\n"%trace.last)
+    out.write("loop period     %.3f ms\n"%trace.period)
+    out.write("mean packet     %.3f kBs\n"%(totalkBs/trace.count))
+    out.write("mean bitrate    %.3f Mb/s\n"%(totalkBs/128.0/(trace.period/1000.0)))
+
+def main(argv=None):
+    parser = ArgumentParser(description="Convert and inspect packet workload files")
+    commands = parser.add_subparsers(dest="command")
+    convertParser = commands.add_parser("convert", help="write a CSV file of time,size rows as a workload file")
+    convertParser.add_argument("csv")
+    convertParser.add_argument("output")
+    convertParser.add_argument("--timeScale", type=float, default=1.0,
+                               help="ms in one unit of the CSV's times (default: 1)")
+    convertParser.add_argument("--sizeScale", type=float, default=1.0,
+                               help="kBs in one unit of the CSV's sizes (default: 1)")
+    infoParser = commands.add_parser("info", help="summarize a workload file")
+    infoParser.add_argument("file")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "convert":
+            count = convert(args.csv, args.output, args.timeScale, args.sizeScale)
+            sys.stdout.write("%i packets written to %s\n"%(count, args.output))
+        else:
+            info(PacketTrace(args.file), sys.stdout)
+    except (IOError, ValueError) as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+import os
+import sys
+
+# The simulator's modules live in src/ and import each other by name, as
+# its scripts do when run from there.  Run the tests with the simulator's
+# Python 2 from the repository's root:
+#   python -m pytest tests
+# Modules are imported on the kernel in SIM_KERNEL (SimPy by default).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
@@ -0,0 +1,83 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+from Engine import *
+from Data import IORequest
+from Simulation import Sim, Parameters
+
+# Returns the array and a requester of a prepared, unstarted simulation of
+# two disks.  Merging is off so every part stays a request of its own.
+def makeArray(raidMode):
+    params = Parameters()
+    params.seed = 1
+    params.numDisks = 2
+    params.raidMode = raidMode
+    params.stripeSize = 256
+    params.maxMergeSize = 0
+    sim = Sim(params)
+    initialize()
+    sim.prepare()
+    return params.array, sim.streams[0].requester
+
+def queued(hdd):
+    return [(IOReq.diskAddress, IOReq.size) for IOReq in hdd.cache.sched.newReqsQ]
+
+def testLocateStripesChunksRoundRobin():
+    array, requester = makeArray("stripe")
+    assert array.locate(0) == (0, 0)
+    assert array.locate(256) == (1, 0)
+    assert array.locate(300) == (1, 44)
+    assert array.locate(512) == (0, 256)
+    assert array.locate(1279) == (0, 767)
+
+# 1024 kBs from 128 are chunk 0 from 128, chunks 1 to 3 and chunk 4 to 128:
+# chunks 0, 2 and 4 on disk 0 from 128, chunks 1 and 3 on disk 1 from 0
+def testStripeSplitsIntoOnePartPerDisk():
+    array, requester = makeArray("stripe")
+    IOReq = IORequest(requester, 1024, 128)
+    array.add(IOReq)
+    assert queued(array.hdds[0]) == [(128, 512)]
+    assert queued(array.hdds[1]) == [(0, 512)]
+    assert IOReq.parts == 2
+
+def testRequestWithinOneChunkGoesToOneDisk():
+    array, requester = makeArray("stripe")
+    array.add(IORequest(requester, 128, 256 + 64))
+    assert queued(array.hdds[0]) == []
+    assert queued(array.hdds[1]) == [(64, 128)]
+
+def testStripedRequestCompletesAfterEveryPart():
+    array, requester = makeArray("stripe")
+    IOReq = IORequest(requester, 512, 0)
+    array.add(IOReq)
+    parts = [hdd.cache.sched.newReqsQ[0] for hdd in array.hdds]
+    parts[0].completeRequest()
+    assert requester.latency["total"].count == 0
+    assert not requester.requestComplete.occurred
+    parts[1].completeRequest()
+    assert requester.latency["total"].count == 1
+    assert requester.requestComplete.occurred
+
+def testMirrorWritesToEveryDisk():
+    array, requester = makeArray("mirror")
+    IOReq = IORequest(requester, 2048, 4096, write=1)
+    array.add(IOReq)
+    assert queued(array.hdds[0]) == queued(array.hdds[1]) == [(4096, 2048)]
+    assert IOReq.parts == 2
+
+def testMirrorReadsFromLeastLoadedDisk():
+    array, requester = makeArray("mirror")
+    array.hdds[0].cache.sched.add(IORequest(requester, 2048, 0))
+    IOReq = IORequest(requester, 2048, 4096)
+    array.add(IOReq)
+    assert queued(array.hdds[1]) == [(4096, 2048)]
+    assert array.hdds[1].cache.sched.newReqsQ[0] is IOReq
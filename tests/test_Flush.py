@@ -0,0 +1,99 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+from Engine import *
+from Data import IORequest
+from Simulation import Sim, Parameters
+
+# Returns the cache of a prepared, unstarted simulation's disk, its bus
+# transfers' sizes recorded in transfers, and a requester
+def makeCache(flushMode="batch", watermark=None, transfers=None):
+    params = Parameters()
+    params.seed = 1
+    params.flushMode = flushMode
+    params.flushMaxBatch = 8192
+    params.flushWatermark = watermark
+    sim = Sim(params)
+    initialize()
+    sim.prepare()
+    cache = params.array.hdds[0].cache
+    if transfers is not None:
+        processTime = params.rambus.processTime
+        def recordTransfer(numDatakBs):
+            transfers.append(numDatakBs)
+            return processTime(numDatakBs)
+        params.rambus.processTime = recordTransfer
+    return cache, sim.streams[0].requester
+
+class Kick(Process):
+    def run(self, event):
+        yield hold, self, 1
+        event.signal()
+
+# Queues completed requests of sizes, the reads' data in the cache, and
+# runs one flush of them
+def flush(cache, requester, sizes, write=1):
+    reqs = []
+    for size in sizes:
+        IOReq = IORequest(requester, size, 0, write)
+        IOReq.cached = IOReq.diskEnd = now()
+        if not write:
+            cache.buffer.nrBuffered += size
+        cache.closedReqs.append(IOReq)
+        reqs.append(IOReq)
+    activate(cache.flush, cache.flush.flushCache())
+    kick = Kick()
+    activate(kick, kick.run(cache.flushNow))
+    simulate(until=1000)
+    return reqs
+
+def testBatchFlushGroupsUpToMaxBatch():
+    transfers = []
+    cache, requester = makeCache("batch", transfers=transfers)
+    flush(cache, requester, [2048]*5 + [4096, 8192])
+    assert transfers == [8192, 6144, 8192]
+    assert not cache.closedReqs and not cache.flush.busy
+    assert requester.latency["total"].count == 7
+    assert requester.latency["flush"].count == 7
+
+def testSingleFlushMovesEveryRequestAlone():
+    transfers = []
+    cache, requester = makeCache("single", transfers=transfers)
+    flush(cache, requester, [2048, 1024, 512])
+    assert transfers == [2048, 1024, 512]
+    assert requester.latency["total"].count == 3
+
+def testBatchFlushFreesTheReadsData():
+    cache, requester = makeCache("batch")
+    flush(cache, requester, [2048, 2048], write=0)
+    assert cache.buffer.amount == 0
+    assert requester.latency["total"].count == 2
+
+def testWatermarkStartsFlush():
+    cache, requester = makeCache(watermark=0.5)
+    assert cache.watermark == 0.5*cache.size
+    cache.buffer.nrBuffered = 0.4*cache.size
+    cache.checkWatermark()
+    assert not cache.flushNow.occurred
+    cache.buffer.nrBuffered = 0.5*cache.size
+    cache.flush.busy = True
+    cache.checkWatermark()
+    assert not cache.flushNow.occurred
+    cache.flush.busy = False
+    cache.checkWatermark()
+    assert cache.flushNow.occurred
+
+def testNoWatermarkWaitsForFullOrIdle():
+    cache, requester = makeCache()
+    cache.buffer.nrBuffered = cache.size
+    cache.checkWatermark()
+    assert not cache.flushNow.occurred
@@ -0,0 +1,65 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+import math
+import random
+from Monitors import Histogram
+
+# Returns the value at or below which fraction p of the sorted values are
+def exactPercentile(values, p):
+    return values[max(1, int(math.ceil(p*len(values)))) - 1]
+
+# A value is known to within 1/2**(subBits-1) of itself, or 1 us
+def close(value, exact, subBits=8):
+    return abs(value - exact) <= max(exact/(1 << (subBits - 1)), 0.001)
+
+def makeValues(seed=1, n=20000):
+    rand = random.Random(seed)
+    # Latencies from a few us to tens of s
+    return [rand.lognormvariate(3, 2) for i in range(n)]
+
+def testPercentilesMatchSortedList():
+    values = makeValues()
+    hist = Histogram()
+    for ms in values:
+        hist.record(ms)
+    values.sort()
+    for p in (0.01, 0.1, 0.5, 0.9, 0.99, 0.999, 1.0):
+        assert close(hist.percentile(p), exactPercentile(values, p)), p
+    assert hist.count == len(values)
+    assert hist.max == values[-1]
+    assert abs(hist.mean() - sum(values)/len(values)) < 1e-9*hist.total
+
+def testMergeMatchesOneHistogram():
+    values = makeValues(2, 5000)
+    whole, first, second = Histogram(), Histogram(), Histogram()
+    for i, ms in enumerate(values):
+        whole.record(ms)
+        (first if i % 2 else second).record(ms)
+    first.merge(second)
+    assert first.counts == whole.counts
+    assert first.count == whole.count and first.max == whole.max
+    assert first.summary()["p99"] == whole.summary()["p99"]
+
+def testValuesAboveMaxMsAreCountedInLastBucket():
+    hist = Histogram(maxMs=10)
+    hist.record(5)
+    hist.record(50)
+    assert hist.counts[-1] == 1
+    assert hist.percentile(1.0) == 50
+
+def testEmptyHistogram():
+    hist = Histogram()
+    assert hist.percentile(0.5) is None and hist.mean() is None
+    hist.record(3)
+    hist.reset()
+    assert hist.count == 0 and hist.max is None
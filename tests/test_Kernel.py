@@ -0,0 +1,48 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+srcDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+
+# Seeded runs that go through the schedulers, the array, the flush modes,
+# merging, fluid streams and the stopping rule
+runs = [{"seed":1, "maxSimTime":20000},
+        {"seed":2, "maxSimTime":20000, "schedType":"edf", "flushMode":"batch", "flushWatermark":0.5},
+        {"seed":3, "maxSimTime":20000, "numDisks":2, "raidMode":"stripe", "numCores":2, "schedType":"clook"},
+        {"seed":4, "maxSimTime":20000, "numDisks":2, "raidMode":"mirror", "schedType":"deadline", "baseChanceATR":5},
+        {"seed":5, "maxSimTime":20000, "extentSize":256, "hddCapacity":65536, "numTuners":16},
+        {"seed":6, "maxSimTime":20000, "fluid":True},
+        {"seed":7, "stopRule":True, "numTuners":16}]
+
+# Returns the summaries of runs on kernel, each run in its own process
+def runOn(kernel, runsPath):
+    env = dict(os.environ, SIM_KERNEL=kernel)
+    out = subprocess.check_output([sys.executable, "-m", "Batch", "--runs", runsPath], cwd=srcDir, env=env)
+    return [json.loads(line) for line in out.decode("utf-8").splitlines()]
+
+def testSeededRunsMatchOnBothKernels(tmpdir):
+    try:
+        import SimPy
+    except ImportError:
+        pytest.skip("SimPy is not installed")
+    runsPath = tmpdir.join("runs.jsonl")
+    runsPath.write("".join(json.dumps(run) + "\n" for run in runs))
+    simpy = runOn("simpy", str(runsPath))
+    builtin = runOn("builtin", str(runsPath))
+    assert len(simpy) == len(builtin) == len(runs)
+    for run, a, b in zip(runs, simpy, builtin):
+        assert a == b, run
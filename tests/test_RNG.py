@@ -0,0 +1,49 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+import random
+import pytest
+import RNG
+from RNG import RandomStream, componentSeed
+
+# Both with and without NumPy, a stream draws what random.Random draws when
+# seeded with the component's seed, across several blocks
+@pytest.fixture(params=["numpy", "random"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        if RNG.numpy is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(RNG, "numpy", None)
+    return request.param
+
+def testUniformsMatchRandom(backend):
+    stream = RandomStream(1, "Tuner #0", blockSize=16)
+    gen = random.Random(componentSeed(1, "Tuner #0"))
+    assert [stream.random() for i in range(100)] == [gen.random() for i in range(100)]
+
+def testExponentialsMatchRandom(backend):
+    stream = RandomStream(7, "Output #1", blockSize=16)
+    gen = random.Random(componentSeed(7, "Output #1"))
+    for i in range(100):
+        assert stream.expovariate(0.5) == pytest.approx(gen.expovariate(0.5), rel=1e-12)
+
+def testReseedStartsOver(backend):
+    stream = RandomStream(3, "HDD", blockSize=8)
+    first = [stream.random() for i in range(20)]
+    stream.reseed(3)
+    assert [stream.random() for i in range(20)] == first
+
+def testComponentsDrawApart():
+    first = RandomStream(1, "Tuner #0")
+    second = RandomStream(1, "Tuner #1")
+    assert [first.random() for i in range(5)] != [second.random() for i in range(5)]
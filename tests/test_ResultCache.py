@@ -0,0 +1,38 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+from ResultCache import key, canonical
+from Simulation import Parameters
+import Trace
+
+def makeParams(**overrides):
+    params = Parameters()
+    params.seed = 1
+    params.update(overrides)
+    return params
+
+def testWholeFloatsMakeTheSameKey():
+    assert key(makeParams(maxSimTime=5000)) == key(makeParams(maxSimTime=5000.0))
+    assert key(makeParams(stopPrecision=0.1)) != key(makeParams(stopPrecision=0.2))
+
+def testCanonicalReachesListsAndDicts():
+    assert canonical([1.0, {"a":2.0, "b":[3.5]}]) == [1, {"a":2, "b":[3.5]}]
+    assert canonical(True) is True
+
+def testOutputParametersDoNotChangeTheKey():
+    base = key(makeParams())
+    for name, val in (("traceLevel", Trace.DEBUG), ("monitorDir", "/tmp"), ("liveInterval", 50), ("liveSlots", 16)):
+        assert key(makeParams(**{name:val})) == base, name
+
+def testResultParametersChangeTheKey():
+    assert key(makeParams(seed=2)) != key(makeParams())
+    assert key(makeParams(schedType="clook")) != key(makeParams())
@@ -0,0 +1,107 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+from Engine import *
+from Data import IORequest, stages
+from Monitors import Histogram
+from Schedule import Scheduler, makeScheduler
+from Simulation import Parameters
+import Trace
+
+# Stands in for a BufferControl: counts the completions it is signalled
+class StubRequester():
+    def __init__(self, name):
+        self.traceId = Trace.component(name)
+        self.latency = dict((stage, Histogram()) for stage in stages)
+        self.missed = 0
+        self.requestComplete = SimEvent(name="%s: HDD Request Complete"%name)
+
+    def computeDeadline(self):
+        return 1000
+
+def makeSched():
+    initialize()
+    sched = Scheduler()
+    sched.maxMergeSize = 4096
+    return sched
+
+def testBackMerge():
+    sched = makeSched()
+    first = IORequest(StubRequester("a"), 2048, 0, write=1)
+    second = IORequest(StubRequester("b"), 2048, 2048, write=1)
+    sched.add(first)
+    sched.add(second)
+    assert (sched.backMerges, sched.frontMerges) == (1, 0)
+    assert sched.newReqsQ == [first]
+    assert first.size == 4096 and first.merged == [second]
+    assert sched.byStart == {(1, 0):first}
+    assert sched.byEnd == {(1, 4096):first}
+
+def testMergesKeepDirectionsApart():
+    sched = makeSched()
+    sched.add(IORequest(StubRequester("a"), 2048, 0, write=1))
+    sched.add(IORequest(StubRequester("b"), 2048, 2048, write=0))
+    assert (sched.backMerges, sched.frontMerges) == (0, 0)
+    assert len(sched) == 2
+
+def testMergeIsNoLargerThanMaxMergeSize():
+    sched = makeSched()
+    sched.add(IORequest(StubRequester("a"), 2048, 0))
+    sched.add(IORequest(StubRequester("b"), 2048, 2048))
+    sched.add(IORequest(StubRequester("c"), 2048, 4096))
+    assert sched.backMerges == 1
+    assert len(sched) == 2
+
+# A front merge into a request that was already sorted must move it to its
+# new LBA in the sorted list
+def testFrontMergeResortsSortedRequest():
+    sched = makeSched()
+    other = IORequest(StubRequester("x"), 128, 9000)
+    front = IORequest(StubRequester("a"), 2048, 10000)
+    sched.add(other)
+    sched.add(front)
+    sched.schedule()
+    assert sched.sortedReqsQ == [other, front]
+
+    merged = IORequest(StubRequester("b"), 2048, 7952)
+    sched.add(merged)
+    assert (sched.backMerges, sched.frontMerges) == (0, 1)
+    assert front.diskAddress == 7952 and front.size == 4096
+    assert sched.sortedReqsQ == [front, other]
+    assert sched.byStart[(0, 7952)] is front and (0, 10000) not in sched.byStart
+    assert sched.byEnd[(0, 12048)] is front
+
+    sched.unindex(front)
+    assert (0, 7952) not in sched.byStart and (0, 12048) not in sched.byEnd
+
+def testCompletionFansOutToMergedRequests():
+    sched = makeSched()
+    requesters = [StubRequester("a"), StubRequester("b"), StubRequester("c")]
+    first = IORequest(requesters[0], 1024, 1024)
+    sched.add(first)
+    sched.add(IORequest(requesters[1], 1024, 2048))
+    sched.add(IORequest(requesters[2], 1024, 0))
+    assert (sched.backMerges, sched.frontMerges) == (1, 1)
+    assert len(first.merged) == 2
+
+    first.completeRequest()
+    for requester in requesters:
+        assert requester.latency["total"].count == 1
+        assert requester.requestComplete.occurred
+
+def testMakeSchedulerMerges():
+    params = Parameters()
+    assert makeScheduler(params).maxMergeSize == 4096
+    params.hddCacheSize = 2048
+    assert makeScheduler(params).maxMergeSize == 2048
+    params.maxMergeSize = 0
+    assert makeScheduler(params).maxMergeSize == 0
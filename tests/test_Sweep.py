@@ -0,0 +1,32 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+from Sweep import makeTasks, runTask, lookup
+
+def testSeedOfOverridesIsKeptWithoutSeeds():
+    tasks = makeTasks([{"numTuners":2}], base={"seed":7, "maxSimTime":2000})
+    assert tasks[0][2] is None
+    result = runTask(tasks[0])
+    assert result["seed"] == 7
+
+def testSeedsListOverridesSeedOfBase():
+    tasks = makeTasks([{}], seeds=[3], base={"seed":7, "maxSimTime":2000})
+    assert runTask(tasks[0])["seed"] == 3
+
+def testLookupKeepsSeedOfOverrides(tmpdir):
+    base = {"seed":7, "maxSimTime":2000, "resultCache":str(tmpdir)}
+    task = makeTasks([{}], base=base)[0]
+    first = runTask(task)
+    assert not first["cached"]
+    # Unseeded runs are never cached, so a hit means the seed was kept
+    hit = lookup(task)
+    assert hit is not None and hit["seed"] == 7
@@ -0,0 +1,39 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+import pytest
+import Trace
+
+# Records across several flushes of a small ring come back in order, with
+# LBAs past 32 bits intact
+def testRecordsComeBackInOrder(tmpdir):
+    path = str(tmpdir.join("run.trace"))
+    compId = Trace.component("Test Requester")
+    Trace.start(path, Trace.EVENT, numRecords=4)
+    for i in range(10):
+        Trace.record(float(i), compId, Trace.REQ_CREATE, i, 2048, i << 33)
+    Trace.stop()
+    records = list(Trace.readTrace(path))
+    assert len(records) == 10
+    assert records[3] == (3.0, "Test Requester", "REQ_CREATE", 3, 2048, 3 << 33)
+
+def testUnclosedTraceIsRejected(tmpdir):
+    path = tmpdir.join("open.trace")
+    path.write_binary(Trace.headerFormat.pack(Trace.MAGIC, Trace.VERSION, Trace.recordFormat.size) + b"\0"*64)
+    with pytest.raises(ValueError):
+        list(Trace.readTrace(str(path)))
+
+def testEmptyFileIsRejected(tmpdir):
+    path = tmpdir.join("empty.trace")
+    path.write_binary(b"")
+    with pytest.raises(ValueError):
+        list(Trace.readTrace(str(path)))
@@ -0,0 +1,40 @@
+# Header-------------------
+__author__ = "Philip Tyler"
+__copyright__ = "Copyright 2012, TiVo Corp."
+__credits__ = ["Philip Tyler", "David Platt", "Mukesh Patel"]
+__license__ = "TiVo Confidential"
+__version__ = "1.08-11"
+__maintainer__ = "Philip Tyler"
+__email__ = "ptyler@calpoly.edu"
+__status__ = "Developement"
+
+
+# Imports------------------
+import pytest
+from Workload import PacketTrace, headerFormat, recordFormat, MAGIC, VERSION
+
+# Writes (time, size) packets as a workload file, without convert's checks
+def writeTrace(path, packets):
+    with open(str(path), "wb") as f:
+        f.write(headerFormat.pack(MAGIC, VERSION))
+        for t, size in packets:
+            f.write(recordFormat.pack(t, size))
+    return str(path)
+
+def testPeriodIsOneGapAfterTheLastPacket(tmpdir):
+    trace = PacketTrace(writeTrace(tmpdir.join("ok.wkld"), [(0, 1), (10, 1), (20, 1)]))
+    assert trace.period == 30
+    assert [t for t, size in trace.packets(loop=False)] == [0, 10, 20]
+    trace.close()
+
+def testTimesAllZeroAreRejected(tmpdir):
+    with pytest.raises(ValueError):
+        PacketTrace(writeTrace(tmpdir.join("zero.wkld"), [(0, 1), (0, 1), (0, 1)]))
+
+def testDecreasingTimesAreRejected(tmpdir):
+    with pytest.raises(ValueError):
+        PacketTrace(writeTrace(tmpdir.join("back.wkld"), [(0, 1), (20, 1), (10, 1), (30, 1)]))
+
+def testFirstPacketMustBeAtZero(tmpdir):
+    with pytest.raises(ValueError):
+        PacketTrace(writeTrace(tmpdir.join("late.wkld"), [(5, 1), (10, 1)]))